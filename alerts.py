@@ -0,0 +1,436 @@
+"""Alert rules matched against the changes between consecutive scans.
+
+Rules are compiled into indexes instead of being checked one by one:
+
+    cross_above X      point X in the 'up' index of the field
+    cross_below X      point X in the 'down' index
+    enter_range lo-hi  lo in 'range_up', hi in 'range_down' (verified on match)
+    becomes V          hash bucket field -> V (recommendation, sector, grade)
+    enter / exit       final_results membership buckets
+
+A change prev -> new of a numeric field can only trigger the points it swept
+over, found by bisection: a crossing fires once the value moves past X
+(prev <= X < new going up), a range is entered on reaching its edge, so the cost per change is O(log rules + matches)
+and symbols whose values did not change cost nothing. Every index is kept per
+scope ('*', 'symbol:<S>', 'sector:<X>'), so rules restricted to one symbol
+are never looked at for another.
+
+Fired alerts go to a sink chosen per rule by URL: 'stream' (in-process event
+log, served by /alerts/events and the /alerts/stream SSE endpoint),
+'file:///path/alerts.jsonl', or an http(s) webhook URL. More sinks plug in
+through register_sink().
+"""
+import bisect
+import itertools
+import json
+import math
+import numbers
+import os
+import queue
+import threading
+from datetime import datetime
+
+import requests
+
+from eventlog import EventLog
+
+NUMERIC_FIELDS = ('rsi', 'technical_score', 'final_score', 'score', 'current_price')
+CATEGORICAL_FIELDS = ('recommendation', 'sector', 'grade')
+MEMBERSHIP_FIELD = 'final_results'
+POINT_INDEXES = ('up', 'down', 'range_up', 'range_down')
+
+NUMERIC_OPS = ('cross_above', 'cross_below', 'enter_range')
+OPS = {field: NUMERIC_OPS for field in NUMERIC_FIELDS}
+OPS.update({field: ('becomes',) for field in CATEGORICAL_FIELDS})
+OPS[MEMBERSHIP_FIELD] = ('enter', 'exit')
+
+
+class AlertRuleError(ValueError):
+    """Invalid alert rule"""
+
+
+def _finite(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class _PointIndex:
+    """Sorted (point, rule_id) pairs with range queries"""
+
+    def __init__(self):
+        self._points = []
+        self._ids = []
+
+    def add(self, point, rule_id):
+        i = bisect.bisect_right(self._points, point)
+        self._points.insert(i, point)
+        self._ids.insert(i, rule_id)
+
+    def remove(self, point, rule_id):
+        i = bisect.bisect_left(self._points, point)
+        while i < len(self._points) and self._points[i] == point:
+            if self._ids[i] == rule_id:
+                del self._points[i], self._ids[i]
+                return
+            i += 1
+
+    def above(self, low, high):
+        """Rules with low <= point < high: the points a rise low -> high moved past"""
+        return self._ids[bisect.bisect_left(self._points, low):bisect.bisect_left(self._points, high)]
+
+    def below(self, low, high):
+        """Rules with low < point <= high: the points a fall high -> low moved past"""
+        return self._ids[bisect.bisect_right(self._points, low):bisect.bisect_right(self._points, high)]
+
+    def reached(self, low, high, rising):
+        """Rules a move between low and high reached, the destination included: low < point <= high
+        for a rise, low <= point < high for a fall"""
+        return self.below(low, high) if rising else self.above(low, high)
+
+    def __len__(self):
+        return len(self._points)
+
+
+def validate_rule(rule):
+    """Normalized copy of a rule dict; raises AlertRuleError"""
+    field = rule.get('field')
+    op = rule.get('op')
+    if field not in OPS:
+        raise AlertRuleError(f"Unknown field '{field}', expected one of {', '.join(OPS)}")
+    if op not in OPS[field]:
+        raise AlertRuleError(f"Op for {field} must be one of {', '.join(OPS[field])}")
+    normalized = {
+        'field': field,
+        'op': op,
+        'owner': rule.get('owner') or 'default',
+        'symbols': sorted({s.upper().replace('.NS', '') for s in rule['symbols']}) if rule.get('symbols') else None,
+        'sector': rule.get('sector') or None,
+        'sink': rule.get('sink') or 'stream',
+        'note': rule.get('note')
+    }
+    try:
+        if op in ('cross_above', 'cross_below'):
+            normalized['value'] = float(rule['value'])
+        elif op == 'enter_range':
+            normalized['low'], normalized['high'] = float(rule['low']), float(rule['high'])
+        elif op == 'becomes':
+            normalized['value'] = str(rule['value'])
+    except (KeyError, TypeError, ValueError):
+        raise AlertRuleError(f"Rule {field} {op} needs {'low and high' if op == 'enter_range' else 'a value'}")
+    if op == 'enter_range' and normalized['low'] > normalized['high']:
+        raise AlertRuleError("low must not be above high")
+    create_sink(normalized['sink'])
+    return normalized
+
+
+def _scopes(rule):
+    if rule['symbols']:
+        return [f"symbol:{symbol}" for symbol in rule['symbols']]
+    if rule['sector']:
+        return [f"sector:{rule['sector']}"]
+    return ['*']
+
+
+def describe(rule):
+    if rule['op'] == 'enter_range':
+        return f"{rule['field']} entered {rule['low']:g}-{rule['high']:g}"
+    if rule['op'] in ('enter', 'exit'):
+        return f"{'entered' if rule['op'] == 'enter' else 'left'} final results"
+    words = {'cross_above': 'crossed above', 'cross_below': 'crossed below', 'becomes': 'became'}
+    value = rule['value'] if rule['op'] == 'becomes' else f"{rule['value']:g}"
+    return f"{rule['field']} {words[rule['op']]} {value}"
+
+
+class StreamSink:
+    """Alerts kept in an EventLog for cursor paging and server-sent events"""
+
+    def __init__(self, capacity=2000):
+        self.events = EventLog(capacity=capacity)
+
+    def deliver(self, alert):
+        fields = dict(alert)
+        self.events.info(fields.pop('message'), **fields)
+
+
+class FileSink:
+    """Alerts appended to a JSON-lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, alert):
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(alert) + '\n')
+
+
+class WebhookSink:
+    """Alerts POSTed as JSON to a URL"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, alert):
+        requests.post(self.url, json=alert, timeout=self.timeout).raise_for_status()
+
+
+stream_sink = StreamSink()
+
+SINKS = {
+    'stream': lambda url: stream_sink,
+    'file': lambda url: FileSink(url.partition('://')[2]),
+    'http': WebhookSink,
+    'https': WebhookSink,
+}
+_sink_instances = {}
+
+
+def register_sink(scheme, factory):
+    """Register factory(url) for sink URLs like '<scheme>://...'"""
+    SINKS[scheme] = factory
+
+
+def create_sink(url):
+    """Sink instance for a URL, one per distinct URL"""
+    if url not in _sink_instances:
+        scheme = url.partition('://')[0]
+        if scheme not in SINKS:
+            raise AlertRuleError(f"Unknown sink '{url}', expected one of {sorted(SINKS)}")
+        _sink_instances[url] = SINKS[scheme](url)
+    return _sink_instances[url]
+
+
+class AlertEngine:
+    """Rule indexes, the previous scan's values and asynchronous delivery.
+
+    Rules and the baseline are kept in a JSON file; a file changed by
+    another worker is reloaded before the next read or evaluation.
+    """
+
+    def __init__(self, path, on_delivery=None):
+        self.path = path
+        self.on_delivery = on_delivery
+        self._lock = threading.RLock()
+        self._rules = {}
+        self._baseline = {}
+        self._next_id = itertools.count(1)
+        self._mtime = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._reset_indexes()
+        self._reload()
+
+    # Persistence
+
+    def _reset_indexes(self):
+        self._points = {}      # (scope, field, 'up'|'down'|'range_up'|'range_down') -> _PointIndex
+        self._buckets = {}     # (scope, field, value) -> set of rule ids
+
+    def _reload(self):
+        """Load rules and baseline if the file changed since we last read it"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                data = json.load(f)
+            self._rules = {}
+            self._reset_indexes()
+            for rule in data.get('rules', []):
+                self._index(rule)
+            self._baseline = data.get('baseline', {})
+            self._next_id = itertools.count(max(self._rules, default=0) + 1)
+            self._mtime = mtime
+
+    def _save(self):
+        temp = f"{self.path}.tmp"
+        with open(temp, 'w') as f:
+            json.dump({'rules': list(self._rules.values()), 'baseline': self._baseline}, f)
+        os.replace(temp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    # Rules
+
+    def _index(self, rule):
+        self._rules[rule['id']] = rule
+        for scope in _scopes(rule):
+            for key, point in self._index_entries(rule, scope):
+                if key[2] in POINT_INDEXES:
+                    self._points.setdefault(key, _PointIndex()).add(point, rule['id'])
+                else:
+                    self._buckets.setdefault(key, set()).add(rule['id'])
+
+    def _unindex(self, rule):
+        self._rules.pop(rule['id'], None)
+        for scope in _scopes(rule):
+            for key, point in self._index_entries(rule, scope):
+                if key[2] in POINT_INDEXES:
+                    self._points[key].remove(point, rule['id'])
+                else:
+                    self._buckets[key].discard(rule['id'])
+
+    @staticmethod
+    def _index_entries(rule, scope):
+        field, op = rule['field'], rule['op']
+        if op == 'cross_above':
+            return [((scope, field, 'up'), rule['value'])]
+        if op == 'cross_below':
+            return [((scope, field, 'down'), rule['value'])]
+        if op == 'enter_range':
+            return [((scope, field, 'range_up'), rule['low']), ((scope, field, 'range_down'), rule['high'])]
+        if op == 'becomes':
+            return [((scope, field, f"={rule['value']}"), None)]
+        return [((scope, field, op), None)]
+
+    def add_rule(self, rule):
+        self._reload()
+        rule = validate_rule(rule)
+        with self._lock:
+            rule['id'] = next(self._next_id)
+            rule['created_at'] = datetime.now().isoformat(timespec='seconds')
+            self._index(rule)
+            self._save()
+        return rule
+
+    def remove_rule(self, rule_id):
+        self._reload()
+        with self._lock:
+            rule = self._rules.get(rule_id)
+            if rule is None:
+                return False
+            self._unindex(rule)
+            self._save()
+        return True
+
+    def rules(self, owner=None):
+        self._reload()
+        with self._lock:
+            return [dict(rule) for rule in self._rules.values() if owner is None or rule['owner'] == owner]
+
+    # Matching
+
+    def _candidates(self, scopes, field, previous, current):
+        """Rule ids whose boundaries the change previous -> current swept over"""
+        ids = []
+        rising = current > previous
+        low, high = (previous, current) if rising else (current, previous)
+        direction = 'up' if rising else 'down'
+        for scope in scopes:
+            index = self._points.get((scope, field, direction))
+            if index:
+                ids.extend(index.above(low, high) if rising else index.below(low, high))
+            index = self._points.get((scope, field, f"range_{direction}"))
+            if index:
+                ids.extend(index.reached(low, high, rising))
+        return ids
+
+    def _bucket(self, scopes, field, key):
+        ids = []
+        for scope in scopes:
+            ids.extend(self._buckets.get((scope, field, key), ()))
+        return ids
+
+    def _matches(self, rule, record, previous, current):
+        if rule['sector'] and record.get('sector') != rule['sector']:
+            return False
+        if rule['op'] == 'enter_range':
+            inside = rule['low'] <= current <= rule['high']
+            was_inside = rule['low'] <= previous <= rule['high']
+            return inside and not was_inside
+        return True
+
+    def match_changes(self, previous, current):
+        """Alerts for two {symbol: record} snapshots"""
+        fired = []
+        for symbol in current.keys() | previous.keys():
+            old, new = previous.get(symbol), current.get(symbol)
+            record = new or old
+            scopes = ['*', f"symbol:{symbol}", f"sector:{record.get('sector')}"]
+
+            if old is None or new is None:
+                op = 'enter' if old is None else 'exit'
+                for rule_id in self._bucket(scopes, MEMBERSHIP_FIELD, op):
+                    rule = self._rules[rule_id]
+                    if self._matches(rule, record, None, None):
+                        fired.append((rule, symbol, None, None))
+                continue
+
+            for field in NUMERIC_FIELDS:
+                before, after = old.get(field), new.get(field)
+                if not (_finite(before) and _finite(after)) or before == after:
+                    continue  # a missing or NaN value crosses nothing
+                for rule_id in self._candidates(scopes, field, before, after):
+                    rule = self._rules[rule_id]
+                    if self._matches(rule, new, before, after):
+                        fired.append((rule, symbol, before, after))
+
+            for field in CATEGORICAL_FIELDS:
+                before, after = old.get(field), new.get(field)
+                if before == after or after is None:
+                    continue
+                for rule_id in self._bucket(scopes, field, f"={after}"):
+                    rule = self._rules[rule_id]
+                    if self._matches(rule, new, before, after):
+                        fired.append((rule, symbol, before, after))
+        return fired
+
+    def evaluate(self, results, scan_id=None):
+        """Match a scan's final results against the previous scan and dispatch alerts"""
+        self._reload()
+        current = {record['symbol']: {field: record.get(field) for field in NUMERIC_FIELDS + CATEGORICAL_FIELDS}
+                   for record in results}
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            fired = self.match_changes(self._baseline, current) if self._rules else []
+            self._baseline = current
+            if os.path.exists(self.path) or self._rules:
+                self._save()
+
+        seen = set()
+        alerts = []
+        for rule, symbol, before, after in fired:
+            if (rule['id'], symbol) in seen:
+                continue  # a rule indexed in several scopes fires once per symbol
+            seen.add((rule['id'], symbol))
+            alert = {
+                'rule_id': rule['id'],
+                'owner': rule['owner'],
+                'symbol': symbol,
+                'field': rule['field'],
+                'op': rule['op'],
+                'previous': before,
+                'value': after,
+                'scan_id': scan_id,
+                'fired_at': now,
+                'message': f"🔔 {symbol} {describe(rule)}" + (f" ({before} → {after})" if before is not None else '')
+            }
+            alerts.append(alert)
+            self._dispatch(rule['sink'], alert)
+        return alerts
+
+    # Delivery
+
+    def _dispatch(self, sink_url, alert):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._deliver_loop, name='alert-delivery', daemon=True)
+            self._worker.start()
+        self._queue.put((sink_url, alert))
+
+    def _deliver_loop(self):
+        while True:
+            sink_url, alert = self._queue.get()
+            try:
+                create_sink(sink_url).deliver(alert)
+                result = 'delivered'
+            except Exception:
+                result = 'failed'
+            if self.on_delivery:
+                self.on_delivery(sink_url.partition('://')[0], result)
+            self._queue.task_done()
+
+    def flush(self):
+        """Wait until queued alerts are delivered"""
+        self._queue.join()
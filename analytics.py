@@ -0,0 +1,132 @@
+"""Cross-sectional sector analytics over a scanned universe.
+
+One pass over a (dates x symbols) close matrix plus the scan's per-symbol
+sector and scores: every aggregate is a grouped array operation (bincount
+for counts and breadth, one lexsort per sector median), so it stays cheap
+for thousands of symbols.
+
+Per sector: breadth (share of stocks above their SMA and HMA), median
+technical / fundamental / final scores, median return over the lookback and
+its relative strength versus the index. Per stock: return and relative
+strength versus its sector and the index. Relative strength is
+((1 + r) / (1 + r_reference) - 1) in percent, so 0 means in line.
+"""
+import numpy as np
+
+import indicators
+
+
+def group_median(groups, values, n_groups):
+    """Median of values per group id, ignoring NaN (NaN for empty groups)"""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    groups, values = groups[valid], values[valid]
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    medians = np.full(n_groups, np.nan)
+    present = counts > 0
+    low = starts[present] + (counts[present] - 1) // 2
+    high = starts[present] + counts[present] // 2
+    medians[present] = (values[low] + values[high]) / 2
+    return medians
+
+
+def group_share(groups, mask, valid, n_groups):
+    """Percent of valid members per group where mask holds (NaN if a group has none)"""
+    totals = np.bincount(groups, weights=valid, minlength=n_groups)
+    hits = np.bincount(groups, weights=mask & valid, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(totals > 0, hits / totals * 100, np.nan)
+
+
+def forward_fill(close):
+    """Carry each column's last close over missing bars"""
+    close = np.asarray(close, dtype=np.float64)
+    rows = np.where(np.isnan(close), 0, np.arange(len(close))[:, np.newaxis])
+    rows = np.maximum.accumulate(rows, axis=0)
+    return close[rows, np.arange(close.shape[1])]
+
+
+def relative_strength(returns, reference):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((1 + returns) / (1 + reference) - 1) * 100
+
+
+def _round(values, digits=2):
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def sector_analytics(symbols, sectors, close=None, scores=None, qualified=None, index_close=None,
+                     lookback=20, sma_period=20, hma_period=30):
+    """Sector and stock level analytics.
+
+    close is a (dates x symbols) matrix (NaN for missing bars) or None when no
+    price history is available - breadth and relative strength are then null.
+    scores maps a name (technical_score, score, final_score) to per-symbol
+    arrays with NaN where a symbol has no value; qualified is a per-symbol
+    mask counted per sector. index_close is the index's
+    closes; without it the index return is the universe's median return.
+    """
+    sector_names, groups = np.unique(np.asarray(sectors, dtype=object).astype(str), return_inverse=True)
+    n_groups, n_symbols = len(sector_names), len(symbols)
+    counts = np.bincount(groups, minlength=n_groups)
+
+    returns = above_sma = above_hma = np.full(n_symbols, np.nan)
+    has_sma = has_hma = np.zeros(n_symbols, dtype=bool)
+    index_return = np.nan
+    if close is not None and len(close) > lookback:
+        filled = forward_fill(close)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = filled[-1] / filled[-1 - lookback] - 1
+        tail = filled[-(hma_period + int(np.sqrt(hma_period)) + sma_period):]
+        sma = indicators.sma(tail, sma_period)[-1]
+        hma = indicators.hma(tail, hma_period)[-1]
+        has_sma, has_hma = ~np.isnan(sma), ~np.isnan(hma)
+        above_sma, above_hma = filled[-1] > sma, filled[-1] > hma
+        if index_close is not None and len(index_close) > lookback:
+            index_close = np.asarray(index_close, dtype=np.float64)
+            index_return = index_close[-1] / index_close[-1 - lookback] - 1
+        else:
+            index_return = np.nanmedian(returns) if np.any(~np.isnan(returns)) else np.nan
+
+    sector_returns = group_median(groups, returns, n_groups)
+    stock_rs_sector = relative_strength(returns, sector_returns[groups])
+    stock_rs_index = relative_strength(returns, index_return)
+    sector_rs_index = relative_strength(sector_returns, index_return)
+    medians = {name: group_median(groups, values, n_groups) for name, values in (scores or {}).items()}
+    breadth_sma = group_share(groups, np.asarray(above_sma, dtype=bool), has_sma, n_groups)
+    breadth_hma = group_share(groups, np.asarray(above_hma, dtype=bool), has_hma, n_groups)
+
+    columns = {
+        'pct_above_sma': _round(breadth_sma, 1),
+        'pct_above_hma': _round(breadth_hma, 1),
+        'median_return_pct': _round(sector_returns * 100),
+        'rs_vs_index': _round(sector_rs_index),
+        **{f'median_{score}': _round(values, 1) for score, values in medians.items()},
+    }
+    if qualified is not None:
+        columns['qualified'] = np.bincount(groups, weights=np.asarray(qualified, dtype=bool), minlength=n_groups).astype(int).tolist()
+    sector_rows = [{'sector': name, 'stocks': int(counts[i]), **{key: values[i] for key, values in columns.items()}}
+                   for i, name in enumerate(sector_names)]
+    sector_rows.sort(key=lambda row: -np.inf if row['rs_vs_index'] is None else row['rs_vs_index'], reverse=True)
+
+    stock_returns = _round(returns * 100)
+    rs_sector, rs_index = _round(stock_rs_sector), _round(stock_rs_index)
+    stock_rows = [{
+        'symbol': symbol,
+        'sector': sector_names[groups[i]],
+        'return_pct': stock_returns[i],
+        'rs_vs_sector': rs_sector[i],
+        'rs_vs_index': rs_index[i],
+        'above_sma': bool(above_sma[i]) if has_sma[i] else None,
+        'above_hma': bool(above_hma[i]) if has_hma[i] else None,
+    } for i, symbol in enumerate(symbols)]
+
+    return {
+        'lookback': lookback,
+        'index_return_pct': None if np.isnan(index_return) else round(float(index_return) * 100, 2),
+        'sectors': sector_rows,
+        'stocks': stock_rows,
+    }
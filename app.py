@@ -3,26 +3,268 @@ import pandas as pd
 import numpy as np
 import requests
 from datetime import datetime, timedelta
-from fastapi import FastAPI, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, BackgroundTasks, Body, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+import asyncio
+import csv
+import io
+import os
 import time
 import json
+import math
 import random
+import uuid
 import warnings
+import zlib
+from eventlog import EventLog
+from alerts import AlertEngine, AlertRuleError, stream_sink
+from analytics import sector_analytics
+import scoring
+from pricecache import PriceCache
+import provenance
+from provenance import DataUnavailable, IncompleteData
+from ranking import RankIndex
+from ratelimit import RateController, RateLimited, run_with_retries
+from screens import Screen, ScreenError, ScreenStore, ScreenTable
+from serialization import CompressionMiddleware, EncodedCache, JSONResponse, dumps
+from timeframes import TIMEFRAMES, TimeframeCache, resample, stack_frames
+from portfolio import Portfolio, PortfolioError
+from live import LiveSession, LiveWatchlist, SimulatedQuoteSource, YahooQuoteSource, MARKET_TZ, NSE_HOLIDAYS, market_date, trading_session
+from metrics import (ALERTS, API_LATENCY, CACHE_REQUESTS, FETCH_ERRORS, FETCH_LATENCY, FETCH_RETRIES, FETCH_THROTTLED,
+                     LIVE_QUOTES, LIVE_TICK_DURATION, QUEUE_DEPTH, REQUEST_PACING, SCANS, STAGE_DURATION, SYMBOL_DURATION,
+                     CONTENT_TYPE, render_prometheus)
+from state_store import WORKER_ID, LeasedLock, LeaseLost, LeaderElector, SharedScanState, create_state_backend
 warnings.filterwarnings('ignore')
 
-app = FastAPI(title="Stock Scanner Pro - Bulletproof")
+app = FastAPI(title="Stock Scanner Pro - Bulletproof", default_response_class=JSONResponse)
+app.add_middleware(CompressionMiddleware)
 
 # Configuration
 CONFIG = {
     'min_market_cap_cr': 10,
     'fundamental_score_threshold': 4,
     'technical_score_threshold': 40,
-    'request_delay': 0.3
+    'buy_score': 70,  # technical score for a BUY recommendation
+    'sma_period': 20,
+    'rsi_period': 14,
+    'range_period': 20,  # rolling high/low window for price position
+    'request_delay': 0.3,  # starting gap between upstream requests; rate_controller adapts it from 429s and latency
+    'request_concurrency': 2,  # starting window of concurrent upstream requests
+    'max_request_concurrency': 8,  # also the scan's fetch thread count
+    'request_target_latency': 2.0,  # seconds; slower responses shrink the window before Yahoo starts refusing
+    'fetch_retries': 4,  # attempts after the first for a throttled symbol, with jittered exponential backoff
+    'retry_base_delay': 1.0,  # seconds, doubled per attempt (capped at 60)
+    'strict_real_data': os.environ.get('STRICT_REAL_DATA', '').lower() in ('1', 'true', 'yes'),  # no sample/generated data
+    'strict_min_score_fields': 4,  # strict mode: real values needed among the six fundamental score inputs
+    'max_bar_age_days': 5,  # strict mode: business days before a last bar is too stale to score, None = any age
+    'event_log_size': 2000,
+    'log_to_stdout': False,  # echo scan events to stdout (noisy at full-market scale)
+    'state_url': os.environ.get('SCAN_STATE_URL', 'memory'),  # sqlite:///path for multiple workers
+    'scan_lock_ttl': 60,
+    'scan_shards': int(os.environ.get('SCAN_SHARDS', 1)),  # local worker processes, 1 = no sharding
+    'shard_workers': [url for url in os.environ.get('SCAN_SHARD_WORKERS', '').split(',') if url],  # remote /shard/score nodes
+    'shard_timeout': 600,
+    'live_source': 'yahoo',  # yahoo, simulated, or push (prices POSTed to /live/quotes)
+    'live_interval': 1.0,  # seconds between quote polls
+    'live_history_workers': 8,
+    'market_holidays': NSE_HOLIDAYS,  # weekday dates without a session; live mode doesn't roll to a new bar on them
+    'portfolio_path': os.environ.get('PORTFOLIO_DB', 'portfolio.db'),
+    'price_max_age': 900,  # seconds before a cached price is refreshed for /portfolio?refresh=true
+    'alerts_path': os.environ.get('ALERTS_FILE', 'alerts.json'),  # alert rules and the last scan's values
+    'screens_path': os.environ.get('SCREENS_FILE', 'screens.json'),  # saved screen expressions
+    'screen_history_bars': 260,  # daily closes behind close/sma<N>/hma<N>/... in screens (needs the price store)
+    'price_store_path': os.environ.get('PRICE_STORE_DB'),  # daily bar store with split/dividend adjustment, None = off
+    'price_store_max_age': 3600,  # seconds before a symbol's stored bars are topped up
+    'price_matrix_path': os.environ.get('PRICE_MATRIX_FILE'),  # memory-mapped snapshot of the store, None = off
+    'price_matrix_bars': 260,  # daily bars kept in the snapshot
+    'fundamentals_store_path': os.environ.get('FUNDAMENTALS_DB'),  # point-in-time fundamentals log, None = off
+    'timeframe_period': '1y',  # daily history behind the weekly/monthly bars
+    'index_symbol': '^NSEI',  # benchmark for relative strength
+    'rs_lookback': 20,  # bars for sector returns and relative strength
+    'batch_max_symbols': 1000,  # per POST /analyze/batch request
+    'batch_chunk': 50,  # symbols scored together (and streamed together as NDJSON)
+    'data_source': os.environ.get('SCAN_DATA_SOURCE', 'yfinance')  # or synthetic:<symbols>[:<seed>[:<days>]], record:<path>, replay:<path>
 }
 
-# Global storage
-scan_data = {
+# Bounded scan event log, paged through /debug?since=
+event_log = EventLog(capacity=CONFIG['event_log_size'], echo=CONFIG['log_to_stdout'])
+
+# Adaptive pacing shared by every upstream request in this process (see ratelimit.py)
+rate_controller = RateController(delay=CONFIG['request_delay'], concurrency=CONFIG['request_concurrency'],
+                                 max_concurrency=CONFIG['max_request_concurrency'],
+                                 target_latency=CONFIG['request_target_latency'])
+
+# Data source hook - yf.Ticker in production, offline fixtures in benchmarks
+ticker_factory = yf.Ticker
+
+def get_ticker(symbol):
+    """Create a ticker object through the active data source"""
+    return ticker_factory(symbol)
+
+def set_ticker_factory(factory=None):
+    """Swap the ticker data source, None restores yfinance"""
+    global ticker_factory
+    ticker_factory = factory or yf.Ticker
+
+def configure_data_source(spec):
+    """Select the data source from a spec string - 'yfinance', 'synthetic:<symbols>[:<seed>[:<days>]]',
+    'record:<path>' (yfinance, saved to an archive after each scan) or 'replay:<path>'"""
+    if spec == 'yfinance':
+        set_ticker_factory(None)
+    elif spec.startswith('synthetic'):
+        from synthetic import parse_spec
+        set_ticker_factory(parse_spec(spec))
+        CONFIG['request_delay'] = 0  # nothing to rate limit
+    elif spec.startswith('record:'):
+        from replay import RecordingSource
+        set_ticker_factory(RecordingSource(path=spec.split(':', 1)[1]))
+    elif spec.startswith('replay:'):
+        from replay import ReplaySource
+        set_ticker_factory(ReplaySource(spec.split(':', 1)[1]))
+        CONFIG['request_delay'] = 0
+    else:
+        raise ValueError(f"Unknown data source: {spec}")
+    CONFIG['data_source'] = spec
+    rate_controller.reset(delay=CONFIG['request_delay'])
+
+def default_universe():
+    """Symbols scanned when none are given - the whole synthetic market or archive, else the sample set"""
+    symbols = getattr(ticker_factory, 'symbols', None)
+    return list(symbols) if symbols else list(SAMPLE_STOCK_DATA.keys())[:10]
+
+if CONFIG['data_source'] != 'yfinance':
+    configure_data_source(CONFIG['data_source'])
+
+# Optional daily bar store under the history fetches (per process, opened on first use)
+_price_store = None
+
+def get_price_store():
+    global _price_store
+    if _price_store is None and CONFIG['price_store_path']:
+        from pricestore import PriceStore
+        _price_store = PriceStore(CONFIG['price_store_path'], snapshot_path=CONFIG['price_matrix_path'])
+    return _price_store
+
+# Optional point-in-time fundamentals log, appended from every yfinance info fetch
+_fundamentals_store = None
+
+def get_fundamentals_store():
+    global _fundamentals_store
+    if _fundamentals_store is None and CONFIG['fundamentals_store_path']:
+        from fundamentals import FundamentalsStore
+        _fundamentals_store = FundamentalsStore(CONFIG['fundamentals_store_path'])
+    return _fundamentals_store
+
+def record_fundamentals(stock_data):
+    """Log today's fundamentals for the symbol; only changed values are written, and fields yfinance
+    did not report are logged as missing rather than as their 0 defaults"""
+    store = get_fundamentals_store()
+    if store is None:
+        return
+    real = set(provenance.real_fields(stock_data))
+    values = {field: stock_data.get(field) if field in real else None for field in provenance.FIELDS}
+    try:
+        store.record(stock_data['symbol'], values, market_date())
+    except Exception as e:
+        event_log.warning(f"Could not record fundamentals for {stock_data['symbol']}: {e}",
+                          symbol=stock_data['symbol'], stage='fundamental')
+
+def download_history(symbol_ns, period):
+    """Daily bars straight from the data source, paced by rate_controller"""
+    with rate_controller.request():
+        return get_ticker(symbol_ns).history(period=period, interval="1d")
+
+def last_bar_date(history):
+    return pd.Timestamp(history.index[-1]).date()
+
+def stale_history(history):
+    """Why history is too old to score (last bar more than CONFIG['max_bar_age_days'] business days
+    before today), or None"""
+    if CONFIG['max_bar_age_days'] is None:
+        return None
+    last = last_bar_date(history)
+    age = int(np.busday_count(np.datetime64(last), np.datetime64(market_date())))
+    if age > CONFIG['max_bar_age_days']:
+        return f"last bar {last} is {age} business days old"
+    return None
+
+def fetch_history(symbol_ns, period="3mo"):
+    """Daily bars for symbol - from the price store (split/dividend adjusted, topped up incrementally)
+    when one is configured, else straight from the data source"""
+    store = get_price_store()
+    if store is None:
+        return download_history(symbol_ns, period)
+    from pricestore import PERIOD_BARS
+    symbol = symbol_ns.replace('.NS', '')
+    bars = PERIOD_BARS.get(period)
+    last = store.last_date(symbol)
+    fetched_at, fetched_bars = store.last_fetch(symbol)
+    if fetched_at is None or fetched_bars < (bars or 0):  # first fetch, or backfill for a longer period
+        CACHE_REQUESTS.inc(cache='price_store', result='miss')
+        store.ingest(symbol, download_history(symbol_ns, period), requested_bars=bars or 0)
+    elif time.time() - fetched_at > CONFIG['price_store_max_age']:  # today's bar too, while it is still forming
+        CACHE_REQUESTS.inc(cache='price_store', result='miss')
+        fetch_period = period
+        if last is not None:  # fetch just the missing bars (plus the last stored one)
+            gap = np.busday_count(last, np.datetime64(market_date()))
+            fetch_period = next((name for name, count in PERIOD_BARS.items() if count > gap), period)
+        store.ingest(symbol, download_history(symbol_ns, fetch_period))
+    else:
+        CACHE_REQUESTS.inc(cache='price_store', result='hit')
+    return store.window(symbol, bars)
+
+def fetch_histories(symbols, period="3mo"):
+    """{symbol: daily bars} for many symbols - one batch download when yfinance is the data source and
+    there is no price store, else fetch_history per symbol on a thread pool"""
+    histories = {}
+    if ticker_factory is yf.Ticker and get_price_store() is None:
+        try:
+            with FETCH_LATENCY.time(source='yfinance_batch'), rate_controller.request():
+                frame = yf.download([f"{symbol}.NS" for symbol in symbols], period=period, interval="1d",
+                                    group_by='ticker', auto_adjust=True, progress=False, threads=True)
+            for symbol in symbols:
+                bars = frame[f"{symbol}.NS"] if isinstance(frame.columns, pd.MultiIndex) else frame
+                histories[symbol] = bars.dropna(how='all')
+            return histories
+        except Exception as e:
+            FETCH_ERRORS.inc(source='yfinance_batch')
+            event_log.warning(f"Batch history download failed, fetching per symbol: {e}", stage='analyze')
+
+    def fetch(symbol):
+        try:
+            return fetch_history(f"{symbol}.NS", period)
+        except RateLimited:
+            FETCH_THROTTLED.inc(source='yfinance_technical')
+            raise  # back on the retry queue
+        except Exception:
+            FETCH_ERRORS.inc(source='yfinance_technical')
+            return None
+    fetched, _ = run_with_retries(symbols, fetch, **retry_settings('analyze'))
+    histories.update((symbol, fetched.get(symbol)) for symbol in symbols)
+    return histories
+
+def retry_settings(stage, name=lambda item: item):
+    """run_with_retries() arguments for upstream fetches from CONFIG, logging each retry"""
+    def retrying(item, error, attempt, delay):
+        symbol = name(item)
+        FETCH_RETRIES.inc(stage=stage)
+        event_log.warning(f"⏳ {symbol} {'throttled upstream' if isinstance(error, RateLimited) else 'unavailable'}, retry {attempt}/{CONFIG['fetch_retries']} in {delay:.1f}s",
+                          stage=stage, symbol=symbol, attempt=attempt)
+    return {'workers': CONFIG['max_request_concurrency'], 'retries': CONFIG['fetch_retries'],
+            'base_delay': CONFIG['retry_base_delay'], 'on_retry': retrying,
+            'retry_on': (RateLimited, DataUnavailable)}
+
+# Alert rules, matched against each scan's changes
+alert_engine = AlertEngine(CONFIG['alerts_path'],
+                           on_delivery=lambda sink, result: ALERTS.inc(sink=sink, result=result))
+
+# Latest known price per symbol, fed by scans, live mode and /analyze
+price_cache = PriceCache()
+
+# Scan state, shared between workers when state_url points at a shared backend
+SCAN_LOCK = 'scan'
+state_backend = create_state_backend(CONFIG['state_url'])
+scan_data = SharedScanState(state_backend, defaults={
     "status": "idle",
     "stage": "ready",
     "progress": 0,
@@ -32,9 +274,11 @@ scan_data = {
     "fundamental_results": [],
     "final_results": [],
     "last_update": None,
-    "debug_info": [],
-    "data_sources_tested": {}
-}
+    "log_cursor": 0,
+    "scan_id": None,
+    "data_sources_tested": {},
+    "failed_symbols": []  # symbols left out of the results: throttled, unavailable, incomplete (strict) or errors
+})
 
 # Test stocks with sample data for demo
 SAMPLE_STOCK_DATA = {
@@ -306,7 +550,7 @@ def test_data_sources():
     
     # Test yfinance methods
     try:
-        ticker = yf.Ticker(test_symbol)
+        ticker = get_ticker(test_symbol)
         
         # Method 1: Standard info
         try:
@@ -351,61 +595,96 @@ def test_data_sources():
         test_results["error_log"].append(f"yfinance general error: {e}")
         print(f"❌ yfinance general error: {e}")
     
-    # Sample data is always available
-    test_results["working_sources"].append("sample_data")
+    # Sample data is always available, except in strict mode
+    if CONFIG['strict_real_data']:
+        test_results["sample_data"] = False
+    else:
+        test_results["working_sources"].append("sample_data")
     
     print(f"🔧 Test complete. Working sources: {test_results['working_sources']}")
     return test_results
 
-def get_stock_data_bulletproof(symbol):
+def get_stock_data_bulletproof(symbol, data_sources=None):
     """Get stock data using multiple fallback methods"""
     symbol_clean = symbol.replace('.NS', '')
     
-    # First try sample data (which we know works)
-    if symbol_clean in SAMPLE_STOCK_DATA:
-        print(f"✅ Using sample data for {symbol_clean}")
-        return SAMPLE_STOCK_DATA[symbol_clean].copy()
+    strict = CONFIG['strict_real_data']
+    
+    # First try sample data (which we know works) - never in strict mode
+    if symbol_clean in SAMPLE_STOCK_DATA and not strict:
+        CACHE_REQUESTS.inc(cache='sample_data', result='hit')
+        event_log.debug(f"✅ Using sample data for {symbol_clean}", symbol=symbol_clean, source='sample_data')
+        return provenance.stamp(SAMPLE_STOCK_DATA[symbol_clean].copy(), 'sample_data')
+    CACHE_REQUESTS.inc(cache='sample_data', result='miss')
     
     # Try yfinance methods
-    data_sources = scan_data.get('data_sources_tested', {})
+    if data_sources is None:
+        data_sources = scan_data.get('data_sources_tested', {})
     working_sources = data_sources.get('working_sources', [])
+    errors = []
     
     for source in working_sources:
         if source == "sample_data":
             continue
             
         try:
-            ticker = yf.Ticker(symbol)
-            time.sleep(CONFIG['request_delay'])
+            ticker = get_ticker(symbol)
             
             if source == "yfinance_info":
-                info = ticker.info
+                with FETCH_LATENCY.time(source=source), rate_controller.request():
+                    info = ticker.info
                 if info and info.get('currentPrice'):
-                    return parse_yfinance_info(info, symbol_clean)
+                    stock_data = parse_yfinance_info(info, symbol_clean)
+                    record_fundamentals(stock_data)
+                    return stock_data
             
             elif source == "yfinance_fast_info":
-                fast_info = ticker.fast_info
+                with FETCH_LATENCY.time(source=source), rate_controller.request():
+                    fast_info = ticker.fast_info
                 if fast_info and hasattr(fast_info, 'last_price'):
-                    return parse_yfinance_fast_info(fast_info, symbol_clean)
+                    return price_only(parse_yfinance_fast_info(fast_info, symbol_clean), errors)
             
             elif source == "yfinance_history":
-                history = ticker.history(period="1mo")
+                with FETCH_LATENCY.time(source=source), rate_controller.request():
+                    history = ticker.history(period="1mo")
                 if not history.empty:
-                    return parse_yfinance_history(history, symbol_clean)
-        
+                    return price_only(parse_yfinance_history(history, symbol_clean), errors)
+        
+        except DataUnavailable:
+            raise
+        except RateLimited:
+            # The other sources are the same host - retry the symbol later rather than fall back to sample data
+            FETCH_THROTTLED.inc(source=source)
+            event_log.warning(f"⏳ {source} throttled for {symbol}", symbol=symbol_clean, source=source)
+            raise
         except Exception as e:
-            print(f"❌ {source} failed for {symbol}: {e}")
+            FETCH_ERRORS.inc(source=source)
+            event_log.warning(f"❌ {source} failed for {symbol}: {e}", symbol=symbol_clean, source=source)
+            errors.append(f"{source}: {e}")
             continue
     
+    if strict:
+        # Defer a symbol whose fetches failed; one the sources simply have nothing for is skipped
+        if errors:
+            raise DataUnavailable(symbol_clean, f"every source failed ({'; '.join(errors)})")
+        raise IncompleteData(symbol_clean, "no real data from any working source")
+    
     # If no real data available, generate realistic sample data
     if symbol_clean not in SAMPLE_STOCK_DATA:
         return generate_sample_data(symbol_clean)
     
     return None
 
+def price_only(stock_data, errors):
+    """A record from a price-only source - unless, in strict mode, a fuller source failed first,
+    in which case the symbol is deferred rather than scored on price alone"""
+    if CONFIG['strict_real_data'] and errors:
+        raise DataUnavailable(stock_data['symbol'], f"only {stock_data['data_source']} answered ({'; '.join(errors)})")
+    return stock_data
+
 def parse_yfinance_info(info, symbol):
     """Parse yfinance info data"""
-    return {
+    return provenance.stamp({
         'symbol': symbol,
         'company_name': info.get('longName', info.get('shortName', symbol)),
         'sector': info.get('sector', 'Unknown'),
@@ -429,11 +708,13 @@ def parse_yfinance_info(info, symbol):
         '52_week_high': info.get('fiftyTwoWeekHigh', 0) or 0,
         '52_week_low': info.get('fiftyTwoWeekLow', 0) or 0,
         'data_source': 'yfinance_info'
-    }
+    }, 'yfinance_info', provenance.info_fields(info), as_of=market_date())
 
 def parse_yfinance_fast_info(fast_info, symbol):
-    """Parse yfinance fast_info data"""
-    return {
+    """Parse yfinance fast_info data; only the price and market cap are real"""
+    real = [field for field, attr in (('current_price', 'last_price'), ('market_cap_cr', 'market_cap'))
+            if getattr(fast_info, attr, None)]
+    return provenance.stamp({
         'symbol': symbol,
         'company_name': symbol,
         'sector': 'Unknown',
@@ -457,12 +738,12 @@ def parse_yfinance_fast_info(fast_info, symbol):
         '52_week_high': 0,
         '52_week_low': 0,
         'data_source': 'yfinance_fast_info'
-    }
+    }, 'yfinance_fast_info', real, as_of=market_date())
 
 def parse_yfinance_history(history, symbol):
-    """Parse yfinance history data"""
+    """Parse yfinance history data; only the price and the high/low range are real"""
     current_price = float(history['Close'].iloc[-1])
-    return {
+    return provenance.stamp({
         'symbol': symbol,
         'company_name': symbol,
         'sector': 'Unknown',
@@ -486,39 +767,40 @@ def parse_yfinance_history(history, symbol):
         '52_week_high': float(history['High'].max()),
         '52_week_low': float(history['Low'].min()),
         'data_source': 'yfinance_history'
-    }
+    }, 'yfinance_history', ('current_price', '52_week_high', '52_week_low'), as_of=last_bar_date(history))
 
 def generate_sample_data(symbol):
     """Generate realistic sample data for demonstration"""
-    # Base values with some randomization for realism
-    base_price = random.uniform(100, 3000)
-    market_cap = random.uniform(1000, 500000)  # 1000 cr to 5 lakh cr
+    # Base values with some randomization for realism, seeded per symbol so reruns match
+    rng = random.Random(zlib.crc32(symbol.encode()))
+    base_price = rng.uniform(100, 3000)
+    market_cap = rng.uniform(1000, 500000)  # 1000 cr to 5 lakh cr
     
-    return {
+    return provenance.stamp({
         'symbol': symbol,
         'company_name': f'{symbol} Limited',
-        'sector': random.choice(['IT', 'Banking', 'FMCG', 'Auto', 'Pharma', 'Energy']),
+        'sector': rng.choice(['IT', 'Banking', 'FMCG', 'Auto', 'Pharma', 'Energy']),
         'industry': 'Mixed Industry',
         'current_price': round(base_price, 2),
         'market_cap_cr': round(market_cap, 1),
-        'pe_ratio': round(random.uniform(12, 35), 1),
-        'pb_ratio': round(random.uniform(1, 8), 1),
-        'roe': round(random.uniform(8, 25), 1),
-        'roa': round(random.uniform(3, 15), 1),
-        'debt_to_equity': round(random.uniform(0.1, 2.0), 2),
-        'current_ratio': round(random.uniform(0.8, 2.5), 1),
-        'revenue_growth': round(random.uniform(-5, 20), 1),
-        'earnings_growth': round(random.uniform(-10, 30), 1),
-        'profit_margin': round(random.uniform(5, 25), 1),
-        'operating_margin': round(random.uniform(8, 30), 1),
-        'dividend_yield': round(random.uniform(0, 4), 1),
-        'beta': round(random.uniform(0.6, 1.5), 1),
-        'eps': round(base_price * random.uniform(0.02, 0.08), 2),
-        'book_value': round(base_price * random.uniform(0.3, 0.8), 1),
-        '52_week_high': round(base_price * random.uniform(1.05, 1.25), 2),
-        '52_week_low': round(base_price * random.uniform(0.75, 0.95), 2),
+        'pe_ratio': round(rng.uniform(12, 35), 1),
+        'pb_ratio': round(rng.uniform(1, 8), 1),
+        'roe': round(rng.uniform(8, 25), 1),
+        'roa': round(rng.uniform(3, 15), 1),
+        'debt_to_equity': round(rng.uniform(0.1, 2.0), 2),
+        'current_ratio': round(rng.uniform(0.8, 2.5), 1),
+        'revenue_growth': round(rng.uniform(-5, 20), 1),
+        'earnings_growth': round(rng.uniform(-10, 30), 1),
+        'profit_margin': round(rng.uniform(5, 25), 1),
+        'operating_margin': round(rng.uniform(8, 30), 1),
+        'dividend_yield': round(rng.uniform(0, 4), 1),
+        'beta': round(rng.uniform(0.6, 1.5), 1),
+        'eps': round(base_price * rng.uniform(0.02, 0.08), 2),
+        'book_value': round(base_price * rng.uniform(0.3, 0.8), 1),
+        '52_week_high': round(base_price * rng.uniform(1.05, 1.25), 2),
+        '52_week_low': round(base_price * rng.uniform(0.75, 0.95), 2),
         'data_source': 'generated_sample'
-    }
+    }, 'generated_sample')
 
 def calculate_fundamental_score_bulletproof(data):
     """Calculate fundamental score with realistic thresholds"""
@@ -627,6 +909,28 @@ def calculate_fundamental_score_bulletproof(data):
             'reason': f'Scoring error: {e}'
         }
 
+def calculate_sma(close, period=20):
+    """Simple moving average of a close series"""
+    return close.rolling(period).mean()
+
+def calculate_rsi(close, period=14):
+    """RSI using simple rolling averages of gains and losses"""
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+def calculate_price_position(close, period=20):
+    """Position of the last close within its rolling high/low range (0-100)"""
+    high = close.rolling(period).max().iloc[-1]
+    low = close.rolling(period).min().iloc[-1]
+    if high == low:
+        return None
+    return (close.iloc[-1] - low) / (high - low) * 100
+
+TECHNICAL_FIELDS = ('technical_score', 'rsi')
+
 def calculate_technical_score_bulletproof(symbol):
     """Generate technical score using price data"""
     try:
@@ -634,28 +938,26 @@ def calculate_technical_score_bulletproof(symbol):
         
         # Try to get real technical data first
         try:
-            ticker = yf.Ticker(symbol_ns)
-            data = ticker.history(period="3mo", interval="1d")
+            with FETCH_LATENCY.time(source='yfinance_technical'):
+                data = fetch_history(symbol_ns, period="3mo")
             
-            if not data.empty and len(data) >= 20:
+            if not data.empty and len(data) >= max(CONFIG['sma_period'], CONFIG['range_period']):
+                stale = stale_history(data) if CONFIG['strict_real_data'] else None
+                if stale:
+                    raise IncompleteData(symbol.replace('.NS', ''), stale, ['technical_score'])
                 close = data['Close']
                 current_price = close.iloc[-1]
                 
                 # Calculate real technical indicators
-                sma_20 = close.rolling(20).mean()
+                sma = calculate_sma(close, CONFIG['sma_period'])
                 tech_score = 50  # Base score
                 
                 # Trend analysis
-                if current_price > sma_20.iloc[-1]:
+                if current_price > sma.iloc[-1]:
                     tech_score += 15
                 
                 # RSI calculation
-                delta = close.diff()
-                gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-                rs = gain / loss
-                rsi = 100 - (100 / (1 + rs))
-                current_rsi = rsi.iloc[-1]
+                current_rsi = calculate_rsi(close, CONFIG['rsi_period']).iloc[-1]
                 
                 if 40 <= current_rsi <= 60:
                     tech_score += 20
@@ -663,16 +965,13 @@ def calculate_technical_score_bulletproof(symbol):
                     tech_score += 10
                 
                 # Price position
-                high_20 = close.rolling(20).max().iloc[-1]
-                low_20 = close.rolling(20).min().iloc[-1]
-                if high_20 != low_20:
-                    price_pos = (current_price - low_20) / (high_20 - low_20) * 100
-                    if 40 <= price_pos <= 80:
-                        tech_score += 15
+                price_pos = calculate_price_position(close, CONFIG['range_period'])
+                if price_pos is not None and 40 <= price_pos <= 80:
+                    tech_score += 15
                 
-                recommendation = 'BUY' if tech_score >= 70 else 'HOLD' if tech_score >= 50 else 'AVOID'
+                recommendation = 'BUY' if tech_score >= CONFIG['buy_score'] else 'HOLD' if tech_score >= 50 else 'AVOID'
                 
-                return {
+                return provenance.stamp({
                     'symbol': symbol.replace('.NS', ''),
                     'technical_score': min(tech_score, 100),
                     'recommendation': recommendation,
@@ -680,16 +979,35 @@ def calculate_technical_score_bulletproof(symbol):
                     'rsi': round(current_rsi, 1),
                     'qualified': tech_score >= CONFIG['technical_score_threshold'],
                     'data_source': 'yfinance_technical'
-                }
+                }, 'yfinance_technical', fields=TECHNICAL_FIELDS, as_of=last_bar_date(data))
+        except RateLimited:
+            FETCH_THROTTLED.inc(source='yfinance_technical')
+            raise
+        except IncompleteData:
+            raise
         except:
-            pass
+            FETCH_ERRORS.inc(source='yfinance_technical')
+            if CONFIG['strict_real_data']:
+                raise DataUnavailable(symbol.replace('.NS', ''), "price history fetch failed", ['technical_score'])
+        
+        if CONFIG['strict_real_data']:
+            raise IncompleteData(symbol.replace('.NS', ''), "not enough real price history", ['technical_score'])
+        return generated_technical_score(symbol)
         
+    except (RateLimited, IncompleteData):
+        raise
+    except Exception as e:
+        return None
+
+def generated_technical_score(symbol):
+    """Technical result for symbols without usable price history"""
+    try:
         # Generate realistic technical score based on symbol
         hash_value = sum(ord(c) for c in symbol) % 100
         base_score = 30 + (hash_value % 40)  # 30-70 range
         
-        # Add some randomness for realism
-        tech_score = base_score + random.randint(-10, 15)
+        # Add some (per-symbol deterministic) randomness for realism
+        tech_score = base_score + random.Random(zlib.crc32(symbol.encode())).randint(-10, 15)
         tech_score = max(20, min(95, tech_score))  # Clamp between 20-95
         
         rsi_value = 30 + (hash_value % 40)  # 30-70 RSI range
@@ -703,7 +1021,7 @@ def calculate_technical_score_bulletproof(symbol):
         else:
             recommendation = 'AVOID'
         
-        return {
+        return provenance.stamp({
             'symbol': symbol.replace('.NS', ''),
             'technical_score': tech_score,
             'recommendation': recommendation,
@@ -711,116 +1029,508 @@ def calculate_technical_score_bulletproof(symbol):
             'rsi': rsi_value,
             'qualified': tech_score >= CONFIG['technical_score_threshold'],
             'data_source': 'generated_technical'
-        }
+        }, 'generated_technical', fields=TECHNICAL_FIELDS)
         
     except Exception as e:
         return None
 
-def run_bulletproof_scan():
-    """Run scan with bulletproof data sources"""
-    global scan_data
+def scan_lock_owner(scan_id):
+    return f"{WORKER_ID}:{scan_id}"
+
+# Lease on the scan lock while this process runs a scan; stages stop once it is lost
+scan_lease = None
+
+def check_scan_lease():
+    """Raise LeaseLost if this process's scan no longer holds the scan lock"""
+    if scan_lease is not None:
+        scan_lease.check()
+
+def run_bulletproof_scan(symbols=None, scan_id=None):
+    """Run scan with bulletproof data sources, holding the shared scan lock"""
+    global scan_lease
+    scan_id = scan_id or uuid.uuid4().hex[:12]
+    lease = LeasedLock(state_backend, SCAN_LOCK, owner=scan_lock_owner(scan_id), ttl=CONFIG['scan_lock_ttl'],
+                       log=lambda message: event_log.error(message, stage='scan_lock'))
+    if not lease.acquire():
+        event_log.warning(f"Scan {scan_id} skipped, lock held by {state_backend.lock_holder(SCAN_LOCK)}")
+        return
+    scan_lease = lease
+    try:
+        _run_bulletproof_scan(symbols, scan_id)
+    finally:
+        scan_lease = None
+        lease.release()
+
+def require_real_fundamentals(stock_data):
+    """Strict mode: IncompleteData unless the price and at least CONFIG['strict_min_score_fields'] of the
+    score inputs are real, so the 0 defaults of unreported fields are never scored"""
+    if not CONFIG['strict_real_data']:
+        return stock_data
+    real = provenance.real_fields(stock_data, ('current_price',) + provenance.SCORE_FIELDS)
+    if 'current_price' not in real:
+        raise IncompleteData(stock_data['symbol'], "no real price", ['current_price'])
+    missing = [field for field in provenance.SCORE_FIELDS if field not in real]
+    if len(provenance.SCORE_FIELDS) - len(missing) < CONFIG['strict_min_score_fields']:
+        raise IncompleteData(stock_data['symbol'], f"only {len(provenance.SCORE_FIELDS) - len(missing)} real score "
+                             f"inputs (missing {', '.join(missing)})", missing)
+    return stock_data
+
+def score_fundamental(symbol, data_sources=None):
+    """Fetch and fundamentally score one symbol; the combined record if it passes, else None"""
+    stock_data = get_stock_data_bulletproof(f"{symbol}.NS", data_sources)
+    if not stock_data:
+        event_log.warning(f"❌ {symbol} no data", stage='fundamental', symbol=symbol)
+        return None
+    require_real_fundamentals(stock_data)
+    
+    fund_score = calculate_fundamental_score_bulletproof(stock_data)
+    if fund_score.get('passed', False):
+        event_log.info(f"✅ {symbol} passed: {fund_score['score']}/10", stage='fundamental',
+                       symbol=symbol, passed=True, score=fund_score['score'])
+        return {**stock_data, **fund_score}
+    
+    event_log.info(f"❌ {symbol} failed: {fund_score['reason']}", stage='fundamental',
+                   symbol=symbol, passed=False, score=fund_score['score'])
+    return None
+
+def score_technical(fund_stock):
+    """Technically score a fundamental pass; the merged record (with final_score if it qualified),
+    or None without a technical result"""
+    symbol = fund_stock['symbol']
+    tech_result = calculate_technical_score_bulletproof(symbol)
     
-    scan_data['status'] = 'running'
-    scan_data['stage'] = 'data_source_test'
-    scan_data['progress'] = 0
-    scan_data['debug_info'] = []
+    if tech_result and tech_result.get('qualified', False):
+        # Update price from fundamental data
+        tech_result['current_price'] = fund_stock['current_price']
+        
+        event_log.info(f"✅ {symbol} passed both filters", stage='technical', symbol=symbol,
+                       passed=True, score=tech_result['technical_score'])
+        return {
+            **fund_stock,
+            **tech_result,
+            **provenance.merge(fund_stock, tech_result),
+            'final_score': round((fund_stock['score'] * 10 + tech_result['technical_score']) / 2, 1)
+        }
+    
+    tech_score = tech_result.get('technical_score', 0) if tech_result else 0
+    event_log.info(f"❌ {symbol} failed technical: {tech_score}", stage='technical', symbol=symbol,
+                   passed=False, score=tech_score)
+    if not tech_result:
+        return None
+    return {**fund_stock, **tech_result, **provenance.merge(fund_stock, tech_result)}
+
+def split_technical(scored):
+    """Qualified records of a technical stage, and {symbol: recommendation} for every symbol it gave a
+    real technical score - symbols that failed or only got a generated score are left out"""
+    qualified = [stock for stock in scored if stock.get('qualified')]
+    recommendations = {stock['symbol']: stock['recommendation'] for stock in scored
+                       if provenance.is_real(stock.get('data_source'))}
+    return qualified, recommendations
+
+def run_stage(items, work, stage, progress=None, on_result=None):
+    """work(item) for every symbol (or fundamental record) on CONFIG['max_request_concurrency'] threads,
+    paced by rate_controller. Items throttled upstream go back on a retry queue with jittered backoff;
+    returns (truthy results in item order, failures). progress=(start, end) maps completion onto
+    scan_data['progress'], on_result sees each truthy result as it completes."""
+    symbols = [item if isinstance(item, str) else item['symbol'] for item in items]
+    completed = []
+    failures = []
+    QUEUE_DEPTH.set(len(items), stage=stage)
+    
+    def timed(i):
+        check_scan_lease()
+        symbol_start = time.perf_counter()
+        try:
+            return work(items[i])
+        finally:
+            SYMBOL_DURATION.observe(time.perf_counter() - symbol_start, stage=stage)
+    
+    def finished(i, result=None):
+        completed.append(i)
+        QUEUE_DEPTH.set(len(items) - len(completed), stage=stage)
+        if progress:
+            scan_data['progress'] = progress[0] + int(len(completed) / len(items) * (progress[1] - progress[0]))
+        if result and on_result:
+            on_result(result)
+    
+    def failed(i, error, attempts):
+        finished(i)
+        if isinstance(error, LeaseLost):
+            return
+        if isinstance(error, (RateLimited, DataUnavailable)):
+            kind = 'throttled' if isinstance(error, RateLimited) else 'unavailable'
+            event_log.error(f"❌ {symbols[i]} still {kind} after {attempts} attempts, left out of the results",
+                            stage=stage, symbol=symbols[i], attempts=attempts)
+        elif isinstance(error, IncompleteData):
+            kind = 'incomplete'
+            event_log.info(f"⏭️ {symbols[i]} skipped, {error.reason}", stage=stage, symbol=symbols[i],
+                           fields=error.fields)
+        else:
+            kind = 'error'
+            event_log.error(f"Error {symbols[i]}: {error}", stage=stage, symbol=symbols[i])
+        failures.append({'symbol': symbols[i], 'stage': stage, 'kind': kind,
+                         'error': error.reason if isinstance(error, IncompleteData) else str(error),
+                         'attempts': attempts})
+    
+    results, _ = run_with_retries(range(len(items)), timed, on_result=finished, on_failure=failed,
+                                  **retry_settings(stage, name=lambda i: symbols[i]))
+    QUEUE_DEPTH.set(0, stage=stage)
+    check_scan_lease()
+    return [results[i] for i in range(len(items)) if results.get(i)], failures
+
+def score_shard(symbols, data_sources=None):
+    """Shard worker: run both filters over a slice of the universe, ranked by final_score"""
+    fundamental_stocks, errors = run_stage(symbols, lambda symbol: score_fundamental(symbol, data_sources), 'shard')
+    scored, technical_errors = run_stage(fundamental_stocks, score_technical, 'shard')
+    final_stocks, recommendations = split_technical(scored)
+    errors += technical_errors
+    
+    final_stocks.sort(key=lambda x: x.get('final_score', 0), reverse=True)
+    return {
+        'processed': len(symbols),
+        'fundamental_results': fundamental_stocks,
+        'final_results': final_stocks,
+        'recommendations': recommendations,
+        'errors': errors
+    }
+
+def _run_bulletproof_scan(symbols, scan_id):
+    """Scan stages - call through run_bulletproof_scan"""
+    scan_data.update({
+        'scan_id': scan_id,
+        'status': 'running',
+        'stage': 'data_source_test',
+        'progress': 0,
+        'log_cursor': event_log.last_seq
+    })
+    for index in rank_indexes.values():
+        index.reset((scan_id, 'live'))
     
     try:
         # Test data sources
         print("🔧 Testing all data sources...")
-        data_sources_test = test_data_sources()
+        with STAGE_DURATION.time(stage='source_test'):
+            data_sources_test = test_data_sources()
         scan_data['data_sources_tested'] = data_sources_test
-        scan_data['debug_info'].append(f"✅ Working sources: {data_sources_test['working_sources']}")
+        event_log.info(f"✅ Working sources: {data_sources_test['working_sources']}", stage='data_source_test')
         
         # Prepare stock list
-        stock_symbols = list(SAMPLE_STOCK_DATA.keys())[:10]  # Use our sample data
+        stock_symbols = list(symbols) if symbols else default_universe()
         scan_data['total_stocks'] = len(stock_symbols)
-        scan_data['stage'] = 'fundamental_filtering'
         
-        fundamental_stocks = []
+        if CONFIG['scan_shards'] > 1 or CONFIG['shard_workers']:
+            from sharding import run_sharded_scan
+            fundamental_stocks, final_stocks, recommendations = run_sharded_scan(stock_symbols, data_sources_test)
+        else:
+            fundamental_stocks, final_stocks, recommendations = _run_local_stages(stock_symbols)
+        check_scan_lease()  # a sharded scan's coordinator has no stage of its own to stop
         
-        for i, symbol in enumerate(stock_symbols):
-            try:
-                scan_data['progress'] = int((i / len(stock_symbols)) * 50)
-                print(f"\n📊 Processing {i+1}/{len(stock_symbols)}: {symbol}")
-                
-                stock_data = get_stock_data_bulletproof(f"{symbol}.NS")
-                if stock_data:
-                    fund_score = calculate_fundamental_score_bulletproof(stock_data)
-                    combined = {**stock_data, **fund_score}
-                    
-                    if fund_score.get('passed', False):
-                        fundamental_stocks.append(combined)
-                        scan_data['debug_info'].append(f"✅ {symbol} passed: {fund_score['score']}/10")
-                        print(f"✅ {symbol} PASSED fundamental: {fund_score['score']}/10")
-                    else:
-                        scan_data['debug_info'].append(f"❌ {symbol} failed: {fund_score['reason']}")
-                        print(f"❌ {symbol} failed: {fund_score['reason']}")
-                else:
-                    scan_data['debug_info'].append(f"❌ {symbol} no data")
-                
+        scan_data['technical_qualified'] = len(final_stocks)
+        scan_data['final_results'] = final_stocks
+        cache_scan_prices(fundamental_stocks)
+        try:
+            flag_portfolio_signals(recommendations, final_stocks, scan_id)
+        except Exception as e:
+            event_log.error(f"Portfolio signal update failed: {e}", stage='portfolio')
+        try:
+            fired = alert_engine.evaluate(final_stocks, scan_id)
+            if fired:
+                event_log.info(f"🔔 {len(fired)} alerts fired", stage='alerts')
+        except Exception as e:
+            event_log.error(f"Alert evaluation failed: {e}", stage='alerts')
+        if get_price_store() is not None and CONFIG['price_matrix_path']:
+            try:  # one mapped copy of the store for every process on the machine
+                with STAGE_DURATION.time(stage='price_matrix'):
+                    written, bars = get_price_store().write_snapshot(bars=CONFIG['price_matrix_bars'])
+                event_log.info(f"🗺️ Price matrix snapshot: {written} symbols x {bars} bars", stage='price_matrix')
             except Exception as e:
-                scan_data['debug_info'].append(f"Error {symbol}: {e}")
-                continue
-        
-        scan_data['fundamental_passed'] = len(fundamental_stocks)
-        scan_data['fundamental_results'] = fundamental_stocks
-        
-        # Technical analysis
-        scan_data['stage'] = 'technical_analysis'
-        final_stocks = []
-        
-        for i, fund_stock in enumerate(fundamental_stocks):
+                event_log.error(f"Price matrix snapshot failed: {e}", stage='price_matrix')
+        try:
+            run_sector_analytics(fundamental_stocks, final_stocks, scan_id)
+        except Exception as e:
+            event_log.error(f"Sector analytics failed: {e}", stage='analytics')
+        if get_price_store() is not None:  # weekly/monthly bars from stored daily bars, no extra downloads
             try:
-                scan_data['progress'] = 50 + int((i / len(fundamental_stocks)) * 50)
-                
-                symbol = fund_stock['symbol']
-                tech_result = calculate_technical_score_bulletproof(symbol)
-                
-                if tech_result and tech_result.get('qualified', False):
-                    # Update price from fundamental data
-                    tech_result['current_price'] = fund_stock['current_price']
-                    
-                    combined = {
-                        **fund_stock,
-                        **tech_result,
-                        'final_score': round((fund_stock['score'] * 10 + tech_result['technical_score']) / 2, 1)
-                    }
-                    final_stocks.append(combined)
-                    scan_data['debug_info'].append(f"✅ {symbol} passed both filters")
-                else:
-                    tech_score = tech_result.get('technical_score', 0) if tech_result else 0
-                    scan_data['debug_info'].append(f"❌ {symbol} failed technical: {tech_score}")
-                    
+                refresh_timeframes([stock['symbol'] for stock in final_stocks])
             except Exception as e:
-                scan_data['debug_info'].append(f"Technical error {fund_stock['symbol']}: {e}")
-                continue
-        
-        # Finalize
-        final_stocks.sort(key=lambda x: x.get('final_score', 0), reverse=True)
-        
-        scan_data['technical_qualified'] = len(final_stocks)
-        scan_data['final_results'] = final_stocks
+                event_log.error(f"Timeframe refresh failed: {e}", stage='timeframes')
+        if getattr(ticker_factory, 'path', None) and hasattr(ticker_factory, 'save'):
+            ticker_factory.save(symbols=stock_symbols)  # record:<path> data source
+            event_log.info(f"💾 Recorded responses saved to {ticker_factory.path}", stage='completed')
         scan_data['status'] = 'completed'
         scan_data['stage'] = 'completed'
         scan_data['progress'] = 100
         scan_data['last_update'] = datetime.now().isoformat()
+        SCANS.inc(outcome='completed')
         
         print(f"\n🎉 BULLETPROOF SCAN COMPLETE!")
         print(f"📊 Total processed: {len(stock_symbols)}")
         print(f"✅ Fundamental passed: {len(fundamental_stocks)}")
         print(f"🎯 Final qualified: {len(final_stocks)}")
-        
+        event_log.info(f"🎉 Scan complete: {len(stock_symbols)} processed, {len(fundamental_stocks)} "
+                       f"fundamental passed, {len(final_stocks)} qualified", stage='completed')
+        
+    except LeaseLost as e:
+        # Another worker may own the lock and the shared state by now, so leave both alone
+        event_log.error(f"Scan {scan_id} stopped, {e}", stage=scan_data.get('stage'))
+        SCANS.inc(outcome='error')
+        print(f"❌ Scan {scan_id} stopped, {e}")
     except Exception as e:
         error_msg = f"Bulletproof scan error: {e}"
-        scan_data['debug_info'].append(error_msg)
+        event_log.error(error_msg, stage=scan_data.get('stage'))
         scan_data['status'] = 'error'
+        SCANS.inc(outcome='error')
         print(f"❌ {error_msg}")
 
+def _run_local_stages(stock_symbols):
+    """Fundamental then technical filtering in this process"""
+    scan_data['stage'] = 'fundamental_filtering'
+    stage_start = time.perf_counter()
+    fundamental_stocks, failures = run_stage(stock_symbols, score_fundamental, 'fundamental', progress=(0, 50),
+                                             on_result=rank_indexes['fundamental'].add)
+    STAGE_DURATION.observe(time.perf_counter() - stage_start, stage='fundamental')
+    scan_data['fundamental_passed'] = len(fundamental_stocks)
+    scan_data['fundamental_results'] = fundamental_stocks
+    
+    # Technical analysis
+    scan_data['stage'] = 'technical_analysis'
+    stage_start = time.perf_counter()
+    def rank_qualified(stock):
+        if stock.get('qualified'):
+            rank_indexes['final'].add(stock)
+    scored, technical_failures = run_stage(fundamental_stocks, score_technical, 'technical', progress=(50, 100),
+                                           on_result=rank_qualified)
+    final_stocks, recommendations = split_technical(scored)
+    STAGE_DURATION.observe(time.perf_counter() - stage_start, stage='technical')
+    scan_data['failed_symbols'] = failures + technical_failures
+    if scan_data['failed_symbols']:
+        event_log.warning(f"⚠️ {len(scan_data['failed_symbols'])} symbols skipped or failed, missing from the results",
+                          stage='technical_analysis')
+    
+    # Finalize
+    final_stocks.sort(key=lambda x: x.get('final_score', 0), reverse=True)
+    return fundamental_stocks, final_stocks, recommendations
+
+# Top-N rank indexes over the results; the scanning process fills them as symbols finish
+rank_indexes = {'fundamental': RankIndex(), 'final': RankIndex()}
+
+def current_rank_index(results):
+    """This process's index for the current scan, or one rebuilt from the stored results
+    (another worker ran the scan, or the process restarted)"""
+    index = rank_indexes[results]
+    scan_id = scan_data.get('scan_id')
+    if index.key == (scan_id, 'live'):
+        return index
+    rows = scan_data.get(f'{results}_results', [])
+    key = (scan_id, scan_data.get('status'), len(rows))
+    if index.key != key:
+        index.reset(key)
+        index.add_many(rows)
+    return index
+
+def recover_stale_scan():
+    """Leader duty: a 'running' scan whose lock lapsed died with its worker"""
+    if scan_data.get('status') == 'running' and state_backend.lock_holder(SCAN_LOCK) is None:
+        scan_data['status'] = 'error'
+        event_log.error(f"Scan {scan_data.get('scan_id')} lost its worker, marked as error")
+
+leader = LeaderElector(state_backend, on_leader=recover_stale_scan)
+
+# Live mode - rescoring of the qualified watchlist from intraday quotes (per process)
+live_session = None
+
+def load_live_history(symbol):
+    """Completed daily closes for live mode - the current session's bar is replaced by live prices"""
+    history = fetch_history(f"{symbol}.NS", period="3mo")
+    if history.empty:
+        return np.array([])
+    index = history.index.tz_convert(MARKET_TZ) if history.index.tz is not None else history.index
+    session = trading_session(holidays=CONFIG['market_holidays'])
+    return history['Close'][index.date < session].to_numpy(dtype=np.float64)
+
+def record_live_tick(seconds, quotes, rescored):
+    price_cache.update(quotes, source='live')
+    LIVE_TICK_DURATION.observe(seconds)
+    LIVE_QUOTES.inc(rescored, result='rescored')
+    LIVE_QUOTES.inc(len(quotes) - rescored, result='unchanged')
+
+def start_live_session(source=None, interval=None):
+    """Load history for the current final_results and start rescoring them from live quotes"""
+    global live_session
+    stop_live_session()
+    records = scan_data.get('final_results', [])
+    symbols = [record['symbol'] for record in records]
+    histories, failures = run_with_retries(symbols, load_live_history,
+                                           **{**retry_settings('live'), 'workers': CONFIG['live_history_workers']})
+    if failures:
+        event_log.warning(f"Live mode: history fetch failed for {', '.join(failures)}", stage='live')
+    
+    watchlist = LiveWatchlist(CONFIG['sma_period'], CONFIG['rsi_period'], CONFIG['range_period'],
+                              CONFIG['buy_score'], CONFIG['technical_score_threshold'])
+    skipped = [symbol for symbol in watchlist.load(records, histories) if symbol not in failures]
+    if skipped:
+        event_log.warning(f"Live mode: not enough history for {', '.join(skipped)}", stage='live')
+    
+    source = source or CONFIG['live_source']
+    quote_source = {
+        'yahoo': YahooQuoteSource,
+        'simulated': lambda: SimulatedQuoteSource(watchlist.prices()),
+        'push': lambda: None
+    }[source]()
+    live_session = LiveSession(watchlist, quote_source, interval or CONFIG['live_interval'],
+                               log_size=CONFIG['event_log_size'], on_tick=record_live_tick,
+                               holidays=CONFIG['market_holidays']).start()
+    event_log.info(f"📡 Live mode started: {len(watchlist.symbols)} symbols from {source}", stage='live')
+    return live_session
+
+def stop_live_session():
+    global live_session
+    if live_session is not None:
+        live_session.stop()
+        live_session = None
+        event_log.info("Live mode stopped", stage='live')
+
+# Portfolio - trades persisted in CONFIG['portfolio_path'], opened on first use
+_portfolio = None
+
+def get_portfolio():
+    global _portfolio
+    if _portfolio is None:
+        _portfolio = Portfolio(CONFIG['portfolio_path'], price_cache)
+    return _portfolio
+
+def cache_prices(records, default_source='scan'):
+    """Put the records' prices in the price cache under the source each price came from; sample and
+    generated prices are left out, so the portfolio never values holdings at made-up prices"""
+    by_source = {}
+    for record in records:
+        source = record.get('provenance', {}).get('current_price') or record.get('data_source', default_source)
+        if provenance.is_real(source):
+            by_source.setdefault(source, {})[record['symbol']] = record.get('current_price')
+    for source, prices in by_source.items():
+        price_cache.update(prices, source=source)
+
+def cache_scan_prices(stocks):
+    cache_prices(stocks)
+
+def flag_portfolio_signals(recommendations, final_stocks, scan_id=None):
+    """Record the scan's recommendations and warn about held symbols that flipped to AVOID.
+    recommendations holds the symbols the technical stage actually scored, so a symbol it could not
+    score (throttled, unavailable, incomplete, errors) keeps its previous recommendation"""
+    if _portfolio is None and not os.path.exists(CONFIG['portfolio_path']):
+        return []  # no trades recorded yet
+    recommendations = dict(recommendations)
+    recommendations.update({stock['symbol']: stock['recommendation'] for stock in final_stocks})
+    flipped = get_portfolio().update_recommendations(recommendations, scan_id)
+    for flip in flipped:
+        event_log.warning(f"⚠️ Held {flip['symbol']} flipped to AVOID (was {flip['previous'] or 'unscored'})",
+                          stage='portfolio', symbol=flip['symbol'])
+    return flipped
+
+def lookup_sector(symbol):
+    """Sector from the latest scan or the sample data, if known"""
+    for stock in scan_data.get('fundamental_results', []):
+        if stock['symbol'] == symbol:
+            return stock.get('sector')
+    return SAMPLE_STOCK_DATA.get(symbol, {}).get('sector')
+
+def refresh_portfolio_prices():
+    """One batch quote download for held symbols with missing or stale cached prices"""
+    stale = price_cache.stale(get_portfolio().symbols(), CONFIG['price_max_age'])
+    if stale:
+        try:
+            with FETCH_LATENCY.time(source='yfinance_batch'):
+                price_cache.update(YahooQuoteSource().quotes(stale), source='yfinance_batch')
+        except Exception as e:
+            FETCH_ERRORS.inc(source='yfinance_batch')
+            event_log.warning(f"Portfolio price refresh failed: {e}", stage='portfolio')
+    return stale
+
+# Weekly/monthly bars for the last scan's qualified symbols (per process)
+timeframe_cache = None
+
+def refresh_timeframes(symbols):
+    """Resample the symbols' daily bars; only bars from the last cached day on are merged, so just the
+    current partial week and month are rebuilt (everything if stored history was re-adjusted)"""
+    global timeframe_cache
+    symbols = sorted({symbol.replace('.NS', '') for symbol in symbols})
+    frames = {}
+    for symbol in symbols:
+        try:
+            history = fetch_history(f"{symbol}.NS", CONFIG['timeframe_period'])
+            if not history.empty:
+                frames[symbol] = history
+        except Exception as e:
+            FETCH_ERRORS.inc(source='timeframes')
+            event_log.warning(f"History for {symbol} failed: {e}", symbol=symbol, stage='timeframes')
+    dates, daily = stack_frames(frames, symbols)
+    cache = timeframe_cache
+    if cache is not None and cache.symbols == symbols and len(cache.dates) and len(dates):
+        overlap = np.isin(cache.dates[:-1], dates)
+        rows = np.searchsorted(dates, cache.dates[:-1][overlap])
+        if np.allclose(cache.daily[:-1][overlap], daily[rows], equal_nan=True):
+            fresh = dates >= cache.dates[-1]
+            dates, daily = dates[fresh], daily[fresh]
+        else:
+            cache = None  # a split or dividend re-based older bars
+    else:
+        cache = None
+    if cache is None:
+        cache = TimeframeCache(symbols)
+    rebuilt = cache.update(dates, daily)
+    timeframe_cache = cache
+    event_log.info(f"📅 Timeframes refreshed for {len(symbols)} symbols", stage='timeframes', rebuilt=rebuilt)
+    return cache
+
+# Sector breadth, median scores and relative strength for the last scan (per process)
+sector_analytics_result = None
+
+def run_sector_analytics(fundamental_stocks, final_stocks, scan_id=None):
+    """One cross-sectional pass over the scanned universe; the price columns use stored bars only"""
+    global sector_analytics_result
+    final = {stock['symbol']: stock for stock in final_stocks}
+    symbols = [stock['symbol'] for stock in fundamental_stocks]
+    close = index_close = None
+    store = get_price_store()
+    if store is not None and symbols:
+        bars = CONFIG['rs_lookback'] + 60  # enough for the SMA/HMA breadth too
+        close = store.matrix(symbols, bars)[1][..., 3]
+        try:
+            index_close = get_ticker(CONFIG['index_symbol']).history(period="3mo", interval="1d")['Close'].to_numpy()
+        except Exception:
+            FETCH_ERRORS.inc(source='index')  # falls back to the universe median
+    scores = {name: np.array([final.get(symbol, {}).get(name, np.nan) for symbol in symbols], dtype=np.float64)
+              for name in ('technical_score', 'final_score')}
+    scores['score'] = np.array([stock.get('score', np.nan) for stock in fundamental_stocks], dtype=np.float64)
+    result = sector_analytics(symbols, [stock.get('sector') or 'Unknown' for stock in fundamental_stocks], close,
+                              scores, qualified=[symbol in final for symbol in symbols], index_close=index_close,
+                              lookback=CONFIG['rs_lookback'], sma_period=CONFIG['sma_period'])
+    sector_analytics_result = {'scan_id': scan_id, 'computed_at': datetime.now().isoformat(), **result}
+    return sector_analytics_result
+
 # API Endpoints
+@app.on_event("startup")
+def start_leader_election():
+    leader.start()
+
+@app.on_event("shutdown")
+def stop_leader_election():
+    leader.stop()
+    stop_live_session()
+
+@app.middleware("http")
+async def record_api_latency(request, call_next):
+    """Record request latency per route template"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    API_LATENCY.observe(time.perf_counter() - start, method=request.method,
+                        path=route.path if route else 'unmatched', status=response.status_code)
+    return response
+
 @app.get("/health")
 def health():
-    return JSONResponse({"status": "ok", "version": "BULLETPROOF"})
+    return JSONResponse({"status": "ok", "version": "BULLETPROOF", "worker": WORKER_ID, "leader": leader.is_leader})
 
 @app.get("/test-sources")
 def test_sources():
@@ -829,11 +1539,14 @@ def test_sources():
 
 @app.post("/start-scan")
 def start_scan(background_tasks: BackgroundTasks):
-    if scan_data["status"] == "running":
-        return JSONResponse({"status": "already_running"}, status_code=202)
+    # The lock, not the status field, decides - it is shared by every worker
+    scan_id = uuid.uuid4().hex[:12]
+    if not state_backend.acquire_lock(SCAN_LOCK, scan_lock_owner(scan_id), CONFIG['scan_lock_ttl']):
+        return JSONResponse({"status": "already_running", "scan_id": scan_data.get('scan_id')}, status_code=202)
     
     # Reset scan data
     scan_data.update({
+        "scan_id": scan_id,
         "status": "idle",
         "stage": "ready",
         "progress": 0,
@@ -841,31 +1554,443 @@ def start_scan(background_tasks: BackgroundTasks):
         "technical_qualified": 0,
         "fundamental_results": [],
         "final_results": [],
-        "debug_info": [],
-        "data_sources_tested": {}
+        "data_sources_tested": {},
+        "failed_symbols": []
     })
     
-    background_tasks.add_task(run_bulletproof_scan)
-    return JSONResponse({"status": "scan_started"}, status_code=202)
+    background_tasks.add_task(run_bulletproof_scan, None, scan_id)
+    return JSONResponse({"status": "scan_started", "scan_id": scan_id}, status_code=202)
+
+@app.post("/shard/score")
+def shard_score(payload: dict = Body(...)):
+    """Score one shard for a coordinator running a sharded scan"""
+    symbols = payload.get('symbols') or []
+    return JSONResponse(score_shard(symbols, payload.get('data_sources')))
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics for scans, data fetches and the API"""
+    pacing = rate_controller.snapshot()
+    REQUEST_PACING.set(pacing['delay'], setting='delay')
+    REQUEST_PACING.set(pacing['concurrency'], setting='concurrency')
+    return Response(render_prometheus(), media_type=CONTENT_TYPE)
 
 @app.get("/scan-status")
 def get_scan_status():
-    return JSONResponse(scan_data)
+    return JSONResponse(scan_data.snapshot())
 
 @app.get("/debug")
-def get_debug_info():
+def get_debug_info(since: int = 0, level: str = "DEBUG", limit: int = 200,
+                   stage: str = None, symbol: str = None):
+    """Scan events after the `since` cursor, filtered by minimum level"""
+    page = event_log.since(since, level=level, limit=max(1, min(limit, 1000)), stage=stage, symbol=symbol)
     return JSONResponse({
-        "debug_info": scan_data.get('debug_info', []),
-        "data_sources_tested": scan_data.get('data_sources_tested', {})
+        **page,
+        "data_sources_tested": scan_data.get('data_sources_tested', {}),
+        "failed_symbols": scan_data.get('failed_symbols', []),
+        "request_pacing": rate_controller.snapshot()
     })
 
+# A completed scan's results never change, so their encoded bytes are kept until the next scan
+results_cache = EncodedCache()
+
 @app.get("/results")
-def get_results():
+def get_results(request: Request):
+    key = (scan_data.get('scan_id'), scan_data.get('status'))
+    encoded = results_cache.get(key)
+    if encoded is None:
+        body = dumps({
+            "fundamental_results": scan_data.get('fundamental_results', []),
+            "final_results": scan_data.get('final_results', [])
+        })
+        # Only cache if no scan started while the results were read
+        if key[1] == 'completed' and key == (scan_data.get('scan_id'), scan_data.get('status')):
+            encoded = results_cache.put(key, body)
+        else:
+            return Response(body, media_type="application/json")
+    return results_cache.response(request, encoded)
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+def export_lines(rows, export_format, columns=None, chunk_size=65536):
+    """Encode result rows as NDJSON or CSV, yielding ~chunk_size pieces; CSV columns default to the first row's keys"""
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if export_format == 'ndjson':
+            buffer.write(json.dumps({key: row.get(key) for key in columns} if columns else row, default=str) + "\n")
+        else:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=columns or list(row), extrasaction='ignore')
+                writer.writeheader()
+            writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_parquet(rows, columns=None, row_group=5000):
+    """Parquet file written a row group at a time (needs pyarrow); yields the bytes as they are produced"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sink = io.BytesIO()
+    writer, schema, batch = None, None, []
+
+    def flush():
+        nonlocal writer, schema
+        table = pa.Table.from_pylist(batch, schema=schema)
+        if writer is None:
+            schema = table.schema
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_table(table)
+        batch.clear()
+
+    for row in rows:
+        batch.append({key: row.get(key) for key in columns} if columns else row)
+        if len(batch) >= row_group:
+            flush()
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    if batch or writer is None:
+        flush()
+    writer.close()
+    yield sink.getvalue()
+
+@app.get("/results/export")
+def export_results(format: str = "ndjson", results: str = "final", columns: str = None):
+    """Stream scan results row by row from the state store - ndjson, csv or parquet.
+    results=final|fundamental; columns is an optional comma separated list."""
+    if format not in EXPORT_FORMATS:
+        return JSONResponse({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status_code=400)
+    if results not in ('final', 'fundamental'):
+        return JSONResponse({"error": "results must be final or fundamental"}, status_code=400)
+    columns = [column.strip() for column in columns.split(',') if column.strip()] if columns else None
+    rows = scan_data.iter_list(f"{results}_results")
+    if format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return JSONResponse({"error": "Parquet export needs pyarrow installed"}, status_code=501)
+        chunks = export_parquet(rows, columns)
+    else:
+        chunks = export_lines(rows, format, columns)
+
+    headers = {"Content-Disposition": f'attachment; filename="{results}_results.{format}"'}
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers=headers)
+
+# Screens - expressions compiled once and run over a column table of the latest scan
+screen_store = ScreenStore(CONFIG['screens_path'])
+_screen_table = {'key': None, 'table': None}
+
+def current_screen_table():
+    """The latest scan's results as a ScreenTable - the fundamental passes, qualified rows carrying
+    their technical fields - with stored daily closes when there is a price store; rebuilt only when
+    the results change. Symbols that failed the fundamental filter are not kept, so screens never see them."""
+    fundamental = scan_data.get('fundamental_results', [])
+    final = scan_data.get('final_results', [])
+    key = (scan_data.get('scan_id'), scan_data.get('status'), len(fundamental), len(final))
+    if _screen_table['key'] == key:
+        return _screen_table['table']
+    rows = {row['symbol']: row for row in fundamental}
+    for row in final:
+        rows[row['symbol']] = {**rows.get(row['symbol'], {}), **row}
+    store = get_price_store()
+    close = None
+    if store is not None and rows:
+        # Loaded on first use of a price column, so screens on the results alone never touch the store
+        close = lambda: store.matrix(list(rows), CONFIG['screen_history_bars'])[1][..., 3]
+    table = ScreenTable(rows.values(), close)
+    _screen_table.update(key=key, table=table)
+    return table
+
+def run_screen(screen, sort=None, limit=100):
+    """Matching rows, best first by sort (default final_score, or score before any stock qualified)"""
+    start = time.perf_counter()
+    table = current_screen_table()
+    sort = sort or ('final_score' if 'final_score' in table else 'score')
+    mask = screen(table)
+    results = table.select(mask, sort=sort, limit=max(1, min(limit, 5000)), columns=screen.names)
+    return {
+        "expression": screen.expression,
+        "universe": len(table),
+        "matches": int(mask.sum()),
+        "scan_id": scan_data.get('scan_id'),
+        "results": results,
+        "seconds": round(time.perf_counter() - start, 4)
+    }
+
+@app.get("/screens")
+def get_screens(owner: str = None):
+    return JSONResponse({"screens": screen_store.screens(owner)})
+
+@app.post("/screens")
+def save_screen(screen: dict = Body(...)):
+    """Save a screen: name, expression, optional description and owner"""
+    try:
+        return JSONResponse(screen_store.save(screen), status_code=201)
+    except ScreenError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@app.delete("/screens/{name}")
+def delete_screen(name: str):
+    if not screen_store.remove(name):
+        return JSONResponse({"error": f"No screen {name}"}, status_code=404)
+    return JSONResponse({"deleted": name})
+
+@app.post("/screens/run")
+def run_adhoc_screen(request: dict = Body(...)):
+    """Run an expression without saving it: {"expression": ..., "sort": column, "limit": 100}.
+    Screens cover the latest scan's fundamental passes, not the whole scanned universe."""
+    try:
+        return JSONResponse(run_screen(Screen(request.get('expression')), request.get('sort'),
+                                       int(request.get('limit', 100))))
+    except ScreenError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@app.get("/screens/{name}/run")
+def run_saved_screen(name: str, sort: str = None, limit: int = 100):
+    saved = screen_store.get(name)
+    if saved is None:
+        return JSONResponse({"error": f"No screen {name}"}, status_code=404)
+    try:
+        return JSONResponse({"screen": saved[0]['name'], **run_screen(saved[1], sort, limit)})
+    except ScreenError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@app.get("/fundamentals/{symbol}")
+def get_fundamentals(symbol: str, as_of: str = None):
+    """Point-in-time fundamentals: the values in effect on as_of (default today) and every recorded change"""
+    store = get_fundamentals_store()
+    if store is None:
+        return JSONResponse({"error": "No fundamentals store configured (set FUNDAMENTALS_DB)"}, status_code=404)
+    symbol = symbol.upper().replace('.NS', '')
+    try:
+        values = store.as_of(as_of or market_date(), [symbol])
+    except (ValueError, TypeError) as e:
+        return JSONResponse({"error": f"Invalid as_of date: {e}"}, status_code=400)
+    history = store.history(symbol)
+    return JSONResponse({
+        "symbol": symbol,
+        "as_of": str(as_of or market_date()),
+        "values": {field: None if np.isnan(value[0]) else float(value[0]) for field, value in values.items()},
+        "changes": [{"date": str(date.date()), **{field: value for field, value in row.items() if value == value}}
+                    for date, row in history.iterrows()]
+    })
+
+@app.get("/top")
+def top_results(by: str = "final_score", n: int = 20, results: str = "final", order: str = "desc"):
+    """Top n results by any numeric column - also while a scan is running"""
+    if results not in rank_indexes:
+        return JSONResponse({"error": "results must be final or fundamental"}, status_code=400)
+    index = current_rank_index(results)
+    try:
+        rows = index.top(by, max(1, min(n, 1000)), ascending=order == 'asc')
+    except KeyError:
+        return JSONResponse({"error": f"Cannot rank by {by}", "columns": index.columns()}, status_code=400)
+    return JSONResponse({
+        "scan_id": scan_data.get('scan_id'),
+        "status": scan_data.get('status'),
+        "by": by,
+        "ranked": len(index),
+        "results": rows
+    })
+
+@app.post("/live/start")
+def live_start(payload: dict = Body(default={})):
+    """Start live rescoring of the current final_results watchlist"""
+    source = payload.get('source', CONFIG['live_source'])
+    if source not in ('yahoo', 'simulated', 'push'):
+        return JSONResponse({"error": f"Unknown live source: {source}"}, status_code=400)
+    if not scan_data.get('final_results'):
+        return JSONResponse({"error": "No qualified stocks yet - run a scan first"}, status_code=409)
+    session = start_live_session(source, payload.get('interval'))
+    return JSONResponse(session.status())
+
+@app.post("/live/stop")
+def live_stop():
+    stop_live_session()
+    return JSONResponse({"running": False})
+
+@app.post("/live/quotes")
+def live_quotes(quotes: dict = Body(...)):
+    """Push {symbol: price} quotes from an external feed"""
+    if live_session is None:
+        return JSONResponse({"error": "Live mode is not running"}, status_code=409)
+    prices, invalid = {}, []
+    for symbol, price in quotes.items():
+        try:
+            value = float(price) if not isinstance(price, bool) else math.nan
+        except (TypeError, ValueError):
+            value = math.nan
+        if math.isfinite(value) and value > 0:
+            prices[symbol.replace('.NS', '')] = value
+        else:
+            invalid.append(symbol)
+    if invalid:
+        return JSONResponse({"error": "Prices must be positive numbers", "invalid": invalid}, status_code=400)
+    changes = live_session.apply(prices)
+    return JSONResponse({"changes": changes})
+
+@app.get("/live/changes")
+def live_changes(since: int = 0, limit: int = 500):
+    """Score and recommendation changes after the `since` cursor, plus the latest prices"""
+    if live_session is None:
+        return JSONResponse({"running": False, "events": [], "next_cursor": since, "truncated": False, "prices": {}})
+    page = live_session.changes.since(since, limit=max(1, min(limit, 1000)))
+    return JSONResponse({
+        **live_session.status(),
+        **page,
+        "prices": live_session.watchlist.prices()
+    })
+
+@app.get("/live/watchlist")
+def live_watchlist():
+    if live_session is None:
+        return JSONResponse({"running": False, "results": []})
+    return JSONResponse({**live_session.status(), "results": live_session.watchlist.snapshot()})
+
+@app.get("/analytics/sectors")
+def get_sector_analytics(sector: str = None, stocks: bool = False):
+    """Sector breadth, median scores and relative strength from the last scan (?stocks=true for per-stock rows)"""
+    result = sector_analytics_result
+    if result is None:
+        return JSONResponse({"error": "No scan analytics yet"}, status_code=404)
+    sectors = [row for row in result['sectors'] if not sector or row['sector'].lower() == sector.lower()]
+    response = {key: value for key, value in result.items() if key != 'stocks'}
+    response['sectors'] = sectors
+    if stocks:
+        names = {row['sector'] for row in sectors}
+        response['stocks'] = [row for row in result['stocks'] if row['sector'] in names]
+    return JSONResponse(response)
+
+def rate_limited_response(error, symbol):
+    """503 for a request the upstream throttled, retrying after its hint or the controller's pause"""
+    retry_in = max(error.retry_after or rate_controller.snapshot()['paused_for'], 1)
+    return JSONResponse({"error": f"Upstream rate limit reached for {symbol}, retry in {retry_in:.0f}s"},
+                        status_code=503, headers={"Retry-After": str(int(math.ceil(retry_in)))})
+
+@app.get("/bars/{symbol}")
+def get_bars(symbol: str, timeframe: str = 'weekly', bars: int = 52):
+    """Daily, weekly or monthly OHLCV - from the timeframe cache for the last scan's symbols"""
+    if timeframe not in TIMEFRAMES:
+        return JSONResponse({"error": f"timeframe must be one of {', '.join(TIMEFRAMES)}"}, status_code=400)
+    symbol = symbol.upper().replace('.NS', '')
+    cache = timeframe_cache
+    if cache is not None and symbol in cache.symbols:
+        frame = cache.frame(symbol, timeframe, bars)
+    else:
+        try:
+            history = fetch_history(f"{symbol}.NS", CONFIG['timeframe_period'])
+        except RateLimited as e:
+            return rate_limited_response(e, symbol)
+        if history.empty:
+            return JSONResponse({"error": f"No history for {symbol}"}, status_code=404)
+        dates, values = resample(*stack_frames({symbol: history}, [symbol]), timeframe)
+        frame = pd.DataFrame(values[-bars:, 0], index=dates[-bars:], columns=['Open', 'High', 'Low', 'Close', 'Volume'])
     return JSONResponse({
-        "fundamental_results": scan_data.get('fundamental_results', []),
-        "final_results": scan_data.get('final_results', [])
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "bars": [{"date": str(date.date()), **{column.lower(): None if np.isnan(value) else round(float(value), 4)
+                                               for column, value in row.items()}}
+                 for date, row in frame.iterrows()]
     })
 
+@app.get("/portfolio")
+def get_portfolio_valuation(refresh: bool = False):
+    """Positions marked to the cached prices, P&L and sector exposure"""
+    refreshed = refresh_portfolio_prices() if refresh else []
+    return JSONResponse({**get_portfolio().valuation(), "refreshed": refreshed})
+
+@app.get("/portfolio/trades")
+def get_portfolio_trades(symbol: str = None):
+    return JSONResponse({"trades": get_portfolio().trades(symbol.upper() if symbol else None)})
+
+@app.post("/portfolio/trades")
+def add_portfolio_trade(trade: dict = Body(...)):
+    """Record a BUY or SELL: symbol, side, quantity, price, optional fees, traded_at, sector, note"""
+    try:
+        symbol = str(trade['symbol']).upper().replace('.NS', '')
+        recorded = get_portfolio().add_trade(
+            symbol, trade.get('side', 'BUY'), float(trade['quantity']), float(trade['price']),
+            fees=float(trade.get('fees', 0)), traded_at=trade.get('traded_at'),
+            sector=trade.get('sector') or lookup_sector(symbol), note=trade.get('note'))
+    except KeyError as e:
+        return JSONResponse({"error": f"Missing field: {e}"}, status_code=400)
+    except (PortfolioError, ValueError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    event_log.info(f"💼 {recorded['side']} {recorded['quantity']:g} {symbol} @ ₹{recorded['price']}",
+                   stage='portfolio', symbol=symbol)
+    return JSONResponse(recorded, status_code=201)
+
+@app.delete("/portfolio/trades/{trade_id}")
+def delete_portfolio_trade(trade_id: int):
+    try:
+        if not get_portfolio().delete_trade(trade_id):
+            return JSONResponse({"error": f"No trade {trade_id}"}, status_code=404)
+    except PortfolioError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    return JSONResponse({"deleted": trade_id})
+
+@app.get("/portfolio/lots")
+def get_portfolio_lots(symbol: str = None):
+    return JSONResponse({"lots": get_portfolio().lots(symbol.upper() if symbol else None)})
+
+@app.post("/portfolio/flags/{symbol}/clear")
+def clear_portfolio_flag(symbol: str):
+    """Acknowledge an AVOID flag"""
+    if not get_portfolio().clear_flag(symbol.upper()):
+        return JSONResponse({"error": f"No signal for {symbol}"}, status_code=404)
+    return JSONResponse({"symbol": symbol.upper(), "flagged": False})
+
+@app.get("/alerts/rules")
+def get_alert_rules(owner: str = None):
+    return JSONResponse({"rules": alert_engine.rules(owner)})
+
+@app.post("/alerts/rules")
+def add_alert_rule(rule: dict = Body(...)):
+    """Add a rule: field, op, value (or low/high), optional owner, symbols, sector, sink"""
+    try:
+        return JSONResponse(alert_engine.add_rule(rule), status_code=201)
+    except AlertRuleError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@app.delete("/alerts/rules/{rule_id}")
+def delete_alert_rule(rule_id: int):
+    if not alert_engine.remove_rule(rule_id):
+        return JSONResponse({"error": f"No rule {rule_id}"}, status_code=404)
+    return JSONResponse({"deleted": rule_id})
+
+@app.get("/alerts/events")
+def get_alert_events(since: int = 0, owner: str = None, limit: int = 200):
+    """Alerts delivered to the 'stream' sink after the `since` cursor"""
+    return JSONResponse(stream_sink.events.since(since, limit=max(1, min(limit, 1000)), owner=owner))
+
+@app.get("/alerts/stream")
+async def stream_alerts(request: Request, owner: str = None, since: int = None):
+    """Server-sent events for the 'stream' sink (resumes from Last-Event-ID)"""
+    cursor = since if since is not None else int(request.headers.get('last-event-id') or stream_sink.events.last_seq)
+    
+    async def events():
+        nonlocal cursor
+        idle = 0
+        while not await request.is_disconnected():
+            page = stream_sink.events.since(cursor, limit=500, owner=owner)
+            cursor = page['next_cursor']
+            for event in page['events']:
+                yield f"id: {event['seq']}\nevent: alert\ndata: {json.dumps(event)}\n\n"
+            if page['events']:
+                idle = 0
+                continue
+            idle += 1
+            if idle % 15 == 0:
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(1)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/analyze/{symbol}")
 def analyze_stock_bulletproof(symbol: str):
     """Bulletproof individual stock analysis"""
@@ -873,7 +1998,6 @@ def analyze_stock_bulletproof(symbol: str):
         if not symbol.endswith('.NS'):
             symbol += '.NS'
         
-        print(f"\n🔍 BULLETPROOF ANALYSIS: {symbol}")
         
         # Get stock data
         stock_data = get_stock_data_bulletproof(symbol)
@@ -883,14 +2007,20 @@ def analyze_stock_bulletproof(symbol: str):
             }, status_code=404)
         
         # Calculate scores
+        require_real_fundamentals(stock_data)
         fund_score = calculate_fundamental_score_bulletproof(stock_data)
-        tech_result = calculate_technical_score_bulletproof(symbol.replace('.NS', ''))
+        try:
+            tech_result = calculate_technical_score_bulletproof(symbol.replace('.NS', ''))
+            technical_reason = None
+        except IncompleteData as e:  # strict mode: no real (or fresh) price history
+            tech_result, technical_reason = None, e.reason
         
         # Combine results
         result = {**stock_data, **fund_score}
         if tech_result:
             tech_result['current_price'] = stock_data['current_price']  # Use fundamental price
             result.update(tech_result)
+            result.update(provenance.merge(stock_data, tech_result))
             result['final_score'] = round((fund_score['score'] * 10 + tech_result['technical_score']) / 2, 1)
         else:
             result.update({
@@ -899,19 +2029,160 @@ def analyze_stock_bulletproof(symbol: str):
                 'recommendation': 'NO_TECHNICAL_DATA',
                 'final_score': fund_score['score'] * 10
             })
+            if technical_reason:
+                result['technical_reason'] = technical_reason
         
-        print(f"✅ Bulletproof analysis complete for {symbol}")
-        print(f"   Source: {result.get('data_source', 'Unknown')}")
-        print(f"   Price: ₹{result['current_price']:.2f}")
-        print(f"   Score: {result['score']}/10")
+        cache_prices([result])
+        event_log.info(f"🔍 Analysis complete for {symbol}: source {result.get('data_source', 'Unknown')}, "
+                       f"price ₹{result['current_price']:.2f}, score {result['score']}/10",
+                       stage='analyze', symbol=symbol.replace('.NS', ''))
         
         return JSONResponse(result)
         
+    except RateLimited as e:
+        return rate_limited_response(e, symbol)
+    except DataUnavailable as e:
+        return JSONResponse({"error": f"No source returned data for {symbol}, try again later: {e.reason}"},
+                            status_code=503)
+    except IncompleteData as e:
+        return JSONResponse({"error": f"No real data for {symbol}: {e.reason}", "missing": e.fields}, status_code=404)
     except Exception as e:
         return JSONResponse({
             "error": f"Bulletproof analysis failed for {symbol}: {str(e)}"
         }, status_code=500)
 
+BATCH_FUNDAMENTAL_FIELDS = ('current_price', 'pe_ratio', 'roe', 'debt_to_equity', 'current_ratio',
+                           'revenue_growth', 'profit_margin')
+
+def score_technical_batch(symbols, histories):
+    """Technical results for many symbols from one vectorized pass; symbols without enough history
+    get the generated fallback, like calculate_technical_score_bulletproof (in strict mode, no result)"""
+    needed = max(CONFIG['sma_period'], CONFIG['range_period'])
+    strict = CONFIG['strict_real_data']
+    closes, as_of = {}, {}
+    for symbol in symbols:
+        history = histories.get(symbol)
+        if history is not None and not history.empty:
+            history = history[history['Close'].notna()]  # e.g. a partial intraday bar with only Volume
+        if history is not None and len(history) >= needed:
+            if strict and stale_history(history):
+                continue
+            closes[symbol] = history['Close'].to_numpy(dtype=np.float64)
+            as_of[symbol] = last_bar_date(history)
+    results = {} if strict else {symbol: generated_technical_score(symbol) for symbol in symbols if symbol not in closes}
+    if not closes:
+        return results
+
+    # Right-align each symbol's own bars so every column is scored exactly as its series alone would be
+    width = max(len(close) for close in closes.values())
+    matrix = np.full((width, len(closes)), np.nan)
+    for column, close in enumerate(closes.values()):
+        matrix[width - len(close):, column] = close
+    technical = scoring.technical_scores(matrix, threshold=CONFIG['technical_score_threshold'],
+                                         sma_period=CONFIG['sma_period'], rsi_period=CONFIG['rsi_period'],
+                                         range_period=CONFIG['range_period'], buy_score=CONFIG['buy_score'])
+    scores = technical['technical_score'][-1]
+    rsis = technical['rsi'][-1]
+    for column, symbol in enumerate(closes):
+        if not np.isfinite([scores[column], rsis[column], matrix[-1, column]]).all():
+            if not strict:  # no usable technical data for this symbol alone
+                results[symbol] = generated_technical_score(symbol)
+            continue
+        tech_score = int(scores[column])
+        results[symbol] = provenance.stamp({
+            'symbol': symbol,
+            'technical_score': tech_score,
+            'recommendation': 'BUY' if tech_score >= CONFIG['buy_score'] else 'HOLD' if tech_score >= 50 else 'AVOID',
+            'current_price': round(float(matrix[-1, column]), 2),
+            'rsi': round(float(rsis[column]), 1),
+            'qualified': tech_score >= CONFIG['technical_score_threshold'],
+            'data_source': 'yfinance_technical'
+        }, 'yfinance_technical', fields=TECHNICAL_FIELDS, as_of=as_of[symbol])
+    return results
+
+def analyze_batch(symbols):
+    """Results for a chunk of symbols, as GET /analyze/{symbol} would return them, plus errors.
+    Fundamentals are fetched concurrently, histories in one batch, and both scorers run vectorized."""
+    def fetch(symbol):
+        stock_data = get_stock_data_bulletproof(f"{symbol}.NS")
+        return require_real_fundamentals(stock_data) if stock_data else stock_data
+
+    def describe(symbol, error):
+        if isinstance(error, RateLimited):
+            return f"Upstream rate limit reached for {symbol}, retry later"
+        if isinstance(error, IncompleteData):
+            return f"No real data for {symbol}: {error.reason}"
+        return f"Could not fetch data for {symbol}"
+
+    fetched, failures = run_with_retries(symbols, fetch, **retry_settings('analyze'))
+    stock_data = {symbol: fetched.get(symbol) for symbol in symbols}
+    errors = [{"symbol": symbol, "error": describe(symbol, failures.get(symbol))}
+              for symbol, data in stock_data.items() if not data]
+    found = [symbol for symbol, data in stock_data.items() if data]
+    if not found:
+        return [], errors
+
+    fields = {name: np.array([stock_data[symbol].get(name, 0) or 0 for symbol in found], dtype=np.float64)
+              for name in BATCH_FUNDAMENTAL_FIELDS}
+    fundamental = scoring.fundamental_scores(fields, threshold=CONFIG['fundamental_score_threshold'])
+    technical = score_technical_batch(found, fetch_histories(found))
+
+    results = []
+    for i, symbol in enumerate(found):
+        score = float(fundamental['score'][i])
+        has_data = bool(fields['current_price'][i])
+        result = {**stock_data[symbol],
+                  'score': score if has_data else 0,
+                  'grade': str(fundamental['grade'][i]),
+                  'passed': bool(fundamental['passed'][i]),
+                  'reason': f"Score: {score:.1f}/10" if has_data else 'No valid data'}
+        tech_result = technical.get(symbol)
+        if tech_result:
+            result.update({**tech_result, 'current_price': stock_data[symbol]['current_price'],
+                           **provenance.merge(stock_data[symbol], tech_result)})
+            result['final_score'] = round((result['score'] * 10 + tech_result['technical_score']) / 2, 1)
+        else:
+            result.update({'technical_score': 0, 'rsi': 0, 'recommendation': 'NO_TECHNICAL_DATA',
+                           'final_score': result['score'] * 10})
+        results.append(result)
+    cache_prices(results)
+    return results, errors
+
+@app.post("/analyze/batch")
+def analyze_stocks_batch(request: dict = Body(...)):
+    """Analyze many symbols in one request: {"symbols": [...], "fields": [...] (optional subset of keys),
+    "format": "json" (default) or "ndjson" (one result per line, streamed chunk by chunk)}"""
+    symbols = request.get('symbols') if isinstance(request, dict) else None
+    if not isinstance(symbols, list) or not symbols:
+        return JSONResponse({"error": "symbols must be a non-empty list"}, status_code=400)
+    symbols = list(dict.fromkeys(str(symbol).upper().replace('.NS', '') for symbol in symbols))
+    if len(symbols) > CONFIG['batch_max_symbols']:
+        return JSONResponse({"error": f"At most {CONFIG['batch_max_symbols']} symbols per request"}, status_code=400)
+    fields = request.get('fields')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        return JSONResponse({"error": "fields must be a list of strings"}, status_code=400)
+    project = (lambda result: {key: result.get(key) for key in ['symbol', *fields] if key in result}) if fields else (lambda result: result)
+    chunks = [symbols[i:i + CONFIG['batch_chunk']] for i in range(0, len(symbols), CONFIG['batch_chunk'])]
+    start = time.perf_counter()
+
+    if request.get('format') == 'ndjson':
+        def lines():
+            for chunk in chunks:
+                results, errors = analyze_batch(chunk)
+                for row in [project(result) for result in results] + errors:
+                    yield json.dumps(row, default=str) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results, errors = [], []
+    for chunk in chunks:
+        chunk_results, chunk_errors = analyze_batch(chunk)
+        results.extend(project(result) for result in chunk_results)
+        errors.extend(chunk_errors)
+    event_log.info(f"🔍 Batch analysis of {len(symbols)} symbols in {time.perf_counter() - start:.2f}s",
+                   stage='analyze', symbols=len(symbols), errors=len(errors))
+    return JSONResponse({"count": len(results), "results": results, "errors": errors,
+                         "seconds": round(time.perf_counter() - start, 3)})
+
 @app.get("/", response_class=HTMLResponse)
 def homepage():
     available_stocks = ", ".join(SAMPLE_STOCK_DATA.keys())
@@ -1264,6 +2535,7 @@ def homepage():
         <div class="controls">
             <button class="btn btn-secondary" onclick="testSources()">Test Data Sources</button>
             <button class="btn btn-primary" onclick="startScan()" id="scanBtn">Start Bulletproof Scan</button>
+            <button class="btn btn-secondary" onclick="toggleLive()" id="liveBtn">Start Live Mode</button>
             <button class="btn btn-secondary" onclick="showTab('fundamental')">View Results</button>
             <button class="btn btn-secondary" onclick="showDebug()">Debug Info</button>
         </div>
@@ -1296,6 +2568,7 @@ def homepage():
                 <div class="tab active" onclick="showTab('final')">Final Results</div>
                 <div class="tab" onclick="showTab('fundamental')">Fundamental Results</div>
                 <div class="tab" onclick="showTab('analyze')">Analyze Stock</div>
+                <div class="tab" onclick="showTab('portfolio'); loadPortfolio()">Portfolio</div>
             </div>
 
             <div id="final" class="tab-content active">
@@ -1338,6 +2611,16 @@ def homepage():
                     </div>
                 </div>
             </div>
+
+            <div id="portfolio" class="tab-content">
+                <h2>Portfolio</h2>
+                <div id="portfolio-content">
+                    <div class="empty-state">
+                        <div class="empty-icon">💼</div>
+                        <p>Record trades with POST /portfolio/trades to track positions</p>
+                    </div>
+                </div>
+            </div>
         </div>
 
         <div id="debug-info" class="debug-section" style="display: none;">
@@ -1348,6 +2631,9 @@ def homepage():
 
     <script>
         let scanInterval;
+        let liveInterval;
+        let liveCursor = 0;
+        let finalStocks = [];
 
         function showTab(tabName) {{
             document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
@@ -1428,6 +2714,9 @@ def homepage():
                 case 'technical_analysis':
                     stageText = 'Stage 2: Bulletproof Technical Analysis';
                     break;
+                case 'sharded_scan':
+                    stageText = 'Sharded Scan: Fundamental + Technical Analysis';
+                    break;
                 case 'completed':
                     stageText = 'Bulletproof Scan Complete';
                     break;
@@ -1457,7 +2746,8 @@ def homepage():
 
         async function showDebug() {{
             try {{
-                const response = await fetch('/debug');
+                const status = await (await fetch('/scan-status')).json();
+                const response = await fetch(`/debug?since=${{status.log_cursor || 0}}&limit=1000`);
                 const data = await response.json();
                 
                 const debugSection = document.getElementById('debug-info');
@@ -1465,8 +2755,9 @@ def homepage():
                 
                 let debugText = 'Data Sources Test:\\n';
                 debugText += JSON.stringify(data.data_sources_tested, null, 2);
-                debugText += '\\n\\nScan Debug Info:\\n';
-                debugText += data.debug_info.join('\\n');
+                debugText += '\\n\\nScan Events:\\n';
+                if (data.truncated) debugText += '(older events dropped)\\n';
+                debugText += data.events.map(e => `[${{e.level}}] ${{e.message}}`).join('\\n');
                 
                 debugContent.textContent = debugText;
                 debugSection.style.display = debugSection.style.display === 'none' ? 'block' : 'none';
@@ -1475,7 +2766,62 @@ def homepage():
             }}
         }}
 
+        async function toggleLive() {{
+            const liveBtn = document.getElementById('liveBtn');
+            
+            if (liveInterval) {{
+                clearInterval(liveInterval);
+                liveInterval = null;
+                await fetch('/live/stop', {{method: 'POST'}});
+                liveBtn.textContent = 'Start Live Mode';
+                return;
+            }}
+            
+            try {{
+                const response = await fetch('/live/start', {{
+                    method: 'POST',
+                    headers: {{'Content-Type': 'application/json'}},
+                    body: '{{}}'
+                }});
+                const data = await response.json();
+                if (!response.ok) {{
+                    document.getElementById('progress-text').textContent = data.error;
+                    return;
+                }}
+                
+                liveCursor = data.cursor;
+                liveBtn.textContent = 'Stop Live Mode';
+                liveInterval = setInterval(pollLive, 1000);
+            }} catch (error) {{
+                console.error('Live start error:', error);
+            }}
+        }}
+
+        async function pollLive() {{
+            try {{
+                const response = await fetch(`/live/changes?since=${{liveCursor}}`);
+                const data = await response.json();
+                liveCursor = data.next_cursor;
+                
+                // Prices every tick, score fields only for symbols that crossed a rule boundary
+                const bySymbol = Object.fromEntries(finalStocks.map(stock => [stock.symbol, stock]));
+                Object.entries(data.prices || {{}}).forEach(([symbol, price]) => {{
+                    if (bySymbol[symbol]) bySymbol[symbol].current_price = price;
+                }});
+                data.events.forEach(e => {{
+                    if (bySymbol[e.symbol]) Object.assign(bySymbol[e.symbol], e.change);
+                }});
+                
+                displayFinalResults(finalStocks);
+                document.getElementById('progress-text').textContent =
+                    `Live: ${{data.symbols || 0}} symbols, ${{data.events.length}} changes, last tick ${{data.last_tick || '-'}}`;
+            }} catch (error) {{
+                console.error('Live error:', error);
+            }}
+        }}
+
         function displayFinalResults(stocks) {{
+            finalStocks = stocks || [];
             const content = document.getElementById('final-content');
             
             if (!stocks || stocks.length === 0) {{
@@ -1582,6 +2928,77 @@ def homepage():
             content.innerHTML = html;
         }}
 
+        async function loadPortfolio() {{
+            try {{
+                const response = await fetch('/portfolio?refresh=true');
+                const data = await response.json();
+                displayPortfolio(data);
+            }} catch (error) {{
+                console.error('Error loading portfolio:', error);
+            }}
+        }}
+
+        function displayPortfolio(data) {{
+            const content = document.getElementById('portfolio-content');
+            
+            if (!data.positions || data.positions.length === 0) {{
+                content.innerHTML = `
+                    <div class="empty-state">
+                        <div class="empty-icon">💼</div>
+                        <p>No open positions</p>
+                    </div>
+                `;
+                return;
+            }}
+
+            const totals = data.totals;
+            let html = `<p style="margin-bottom: 1rem; color: var(--gray-600);">
+                Value ₹${{totals.market_value.toLocaleString()}} · Unrealized ₹${{totals.unrealized_pnl.toLocaleString()}}
+                (${{totals.unrealized_pct}}%) · Realized ₹${{totals.realized_pnl.toLocaleString()}}</p>`;
+            if (data.flags.length) {{
+                html += `<p style="margin-bottom: 1rem; color: var(--danger);">⚠️ Flipped to AVOID: ${{data.flags.map(f => f.symbol).join(', ')}}</p>`;
+            }}
+            html += `
+                <div class="table-container">
+                    <table>
+                        <thead>
+                            <tr>
+                                <th>Stock</th>
+                                <th>Sector</th>
+                                <th>Qty</th>
+                                <th>Avg Cost</th>
+                                <th>Price</th>
+                                <th>Value</th>
+                                <th>Unrealized</th>
+                                <th>Weight</th>
+                                <th>Recommendation</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+            `;
+
+            data.positions.forEach(position => {{
+                const recClass = getRecommendationClass(position.recommendation);
+                
+                html += `
+                    <tr>
+                        <td><strong>${{position.symbol}}</strong>${{position.flagged ? ' ⚠️' : ''}}</td>
+                        <td>${{position.sector}}</td>
+                        <td>${{position.quantity}}</td>
+                        <td>₹${{position.avg_cost.toLocaleString()}}</td>
+                        <td>${{position.price === null ? 'n/a' : '₹' + position.price.toLocaleString()}}</td>
+                        <td>₹${{position.market_value.toLocaleString()}}</td>
+                        <td>₹${{position.unrealized_pnl.toLocaleString()}} (${{position.unrealized_pct}}%)</td>
+                        <td>${{position.weight}}%</td>
+                        <td><span class="badge ${{recClass}}">${{position.recommendation || 'N/A'}}</span></td>
+                    </tr>
+                `;
+            }});
+
+            html += '</tbody></table></div>';
+            content.innerHTML = html;
+        }}
+
         async function analyzeStock() {{
             const symbol = document.getElementById('stock-symbol').value.trim().toUpperCase();
             if (!symbol) {{
@@ -0,0 +1,227 @@
+"""Vectorized backtest of the scan's screening rules.
+
+Replays the technical rules (and optionally a fundamental pass mask) over a
+whole (dates x symbols) close matrix at once - no per-day or per-symbol
+loop - and reports forward returns, hit rates and drawdowns per signal.
+
+    python backtest.py --synthetic 500 --years 10
+    python backtest.py --symbols RELIANCE,TCS,INFY --years 5 --timeframe weekly
+"""
+import argparse
+import os
+import time
+import zlib
+
+import numpy as np
+
+import indicators
+import scoring
+import timeframes
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+TRADING_DAYS = 252
+
+
+def load_close_matrix(symbols, years=10, cache_dir=CACHE_DIR, refresh=False):
+    """Daily closes for symbols from Yahoo in one batch download, cached as .npz"""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = f"closes_{years}y_{zlib.crc32(','.join(sorted(symbols)).encode()):08x}.npz"
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(path) and not refresh:
+        cached = np.load(path, allow_pickle=False)
+        return cached['dates'], list(cached['symbols']), cached['close']
+
+    import yfinance as yf
+    tickers = [s if s.endswith('.NS') else f"{s}.NS" for s in symbols]
+    frame = yf.download(tickers, period=f"{years}y", interval='1d', auto_adjust=True,
+                        group_by='column', progress=False, threads=True)
+    closes = frame['Close']
+    if closes.ndim == 1:
+        closes = closes.to_frame(tickers[0])
+    closes = closes.reindex(columns=tickers)
+    dates = closes.index.values.astype('datetime64[D]')
+    close = closes.to_numpy(dtype=np.float64)
+    clean = [t.replace('.NS', '') for t in tickers]
+    np.savez_compressed(path, dates=dates, symbols=np.array(clean), close=close)
+    return dates, clean, close
+
+
+def load_price_matrix(path, symbols=None):
+    """Closes from a price store snapshot (see pricematrix.py) - mapped, not loaded"""
+    from pricematrix import PriceMatrix
+    matrix = PriceMatrix(path)
+    dates, daily = matrix.matrix(symbols)
+    return dates, list(symbols or matrix.symbols), daily[..., 3]
+
+
+def to_weekly(dates, close):
+    """Last close of each Monday-Sunday week (normally the Friday close)"""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    week = timeframes.period_keys(dates, 'weekly')
+    last_of_week = np.flatnonzero(np.append(week[1:] != week[:-1], True))
+    return dates[last_of_week], np.asarray(close)[last_of_week]
+
+
+def forward_returns(close, horizon):
+    """close[t + horizon] / close[t] - 1, NaN where the future is unknown"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return indicators.shift(close, -horizon) / close - 1
+
+
+def forward_drawdown(close, horizon):
+    """Worst close over the next horizon bars relative to close[t] (adverse excursion)"""
+    future_low = indicators.shift(indicators.rolling_min(close, horizon), -horizon)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.minimum(future_low / close - 1, 0)
+
+
+def signal_masks(close, fundamental_pass=None, threshold=40, buy_score=70, chunk=None, **score_params):
+    """Boolean (dates x symbols) masks for each recommendation bucket; chunk scores that many symbols at a time"""
+    if chunk:
+        from compact import technical_scores_chunked
+        technical = technical_scores_chunked(close, chunk, threshold=threshold, buy_score=buy_score, **score_params)
+    else:
+        technical = scoring.technical_scores(close, threshold=threshold, buy_score=buy_score, **score_params)
+    score = technical['technical_score']
+    valid = ~np.isnan(score)
+    with np.errstate(invalid='ignore'):
+        masks = {
+            'ALL': valid,
+            'BUY': technical['buy'],
+            'HOLD': (score >= 50) & (score < buy_score),
+            'AVOID': valid & (score < 50),
+            'QUALIFIED': technical['qualified'],
+        }
+    if fundamental_pass is not None:
+        # One pass flag per symbol, or a point-in-time (dates x symbols) mask
+        fundamental_pass = np.asarray(fundamental_pass, dtype=bool)
+        masks['QUALIFIED'] = masks['QUALIFIED'] & (fundamental_pass if fundamental_pass.ndim == 2 else fundamental_pass[np.newaxis, :])
+    return masks
+
+
+def portfolio_equity(close, mask):
+    """Equal-weight portfolio rebalanced every bar into the symbols flagged at the close"""
+    next_return = forward_returns(close, 1)
+    held = mask & ~np.isnan(next_return)
+    positions = held.sum(axis=1)
+    gross = np.where(held, next_return, 0.0).sum(axis=1)
+    period_return = np.divide(gross, positions, out=np.zeros_like(gross), where=positions > 0)
+    return np.cumprod(1 + period_return), positions
+
+
+def max_drawdown(equity):
+    peak = np.maximum.accumulate(equity)
+    return float(np.max(1 - equity / peak)) if len(equity) else 0.0
+
+
+def run_backtest(dates, symbols, close, horizons=(5, 20, 60), fundamental_pass=None, threshold=40,
+                 buy_score=70, bars_per_year=TRADING_DAYS, compact=False, **score_params):
+    """Forward returns, hit rates and drawdowns for each signal bucket.
+
+    compact keeps closes in float32 and scores them in blocks of symbols
+    (see compact.py), for universes that do not fit in memory as float64.
+    """
+    close = np.asarray(close, dtype=np.float32 if compact else np.float64)
+    masks = signal_masks(close, fundamental_pass, threshold, buy_score, chunk=256 if compact else None,
+                         **score_params)
+    forward = {h: forward_returns(close, h) for h in horizons}
+    adverse = {h: forward_drawdown(close, h) for h in horizons}
+
+    signals = {}
+    for name, mask in masks.items():
+        stats = {'observations': int(mask.sum())}
+        for h in horizons:
+            selected = forward[h][mask]
+            selected = selected[~np.isnan(selected)]
+            excursion = adverse[h][mask]
+            excursion = excursion[~np.isnan(excursion)]
+            stats[f'{h}'] = {
+                'count': int(selected.size),
+                'mean_return': float(selected.mean()) if selected.size else None,
+                'median_return': float(np.median(selected)) if selected.size else None,
+                'hit_rate': float((selected > 0).mean()) if selected.size else None,
+                'mean_adverse_excursion': float(excursion.mean()) if excursion.size else None,
+            }
+        equity, positions = portfolio_equity(close, mask)
+        years = len(equity) / bars_per_year
+        stats['portfolio'] = {
+            'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+            'cagr': float(equity[-1] ** (1 / years) - 1) if len(equity) and years > 0 else 0.0,
+            'max_drawdown': max_drawdown(equity),
+            'avg_positions': float(positions.mean()) if len(positions) else 0.0,
+        }
+        signals[name] = stats
+
+    return {
+        'symbols': len(symbols),
+        'bars': len(dates),
+        'start': str(dates[0]) if len(dates) else None,
+        'end': str(dates[-1]) if len(dates) else None,
+        'horizons': list(horizons),
+        'signals': signals,
+    }
+
+
+def print_report(report):
+    print(f"\n📊 Backtest: {report['symbols']} symbols x {report['bars']} bars ({report['start']} → {report['end']})")
+    for name, stats in report['signals'].items():
+        portfolio = stats['portfolio']
+        print(f"\n{name}: {stats['observations']} signals, portfolio {portfolio['total_return']:+.1%} "
+              f"(CAGR {portfolio['cagr']:+.1%}, max DD {portfolio['max_drawdown']:.1%}, "
+              f"{portfolio['avg_positions']:.0f} avg positions)")
+        for h in report['horizons']:
+            row = stats[f'{h}']
+            if not row['count']:
+                continue
+            print(f"   {h:>3} bars: mean {row['mean_return']:+.2%}  median {row['median_return']:+.2%}  "
+                  f"hit {row['hit_rate']:.1%}  adverse {row['mean_adverse_excursion']:+.2%}  (n={row['count']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vectorized backtest of the scan rules")
+    parser.add_argument('--synthetic', type=int, help="number of synthetic symbols instead of Yahoo data")
+    parser.add_argument('--matrix', help="price store snapshot (PRICE_MATRIX_FILE) instead of Yahoo data")
+    parser.add_argument('--symbols', help="comma separated NSE symbols")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--timeframe', choices=['daily', 'weekly'], default='daily')
+    parser.add_argument('--horizons', default='5,20,60', help="forward horizons in bars")
+    parser.add_argument('--threshold', type=float, default=40)
+    parser.add_argument('--refresh', action='store_true', help="re-download instead of using the cache")
+    parser.add_argument('--fundamentals', help="fundamentals store (FUNDAMENTALS_DB) for a point-in-time fundamental pass")
+    parser.add_argument('--compact', action='store_true', help="float32 closes, scored in blocks of symbols")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        from synthetic import SyntheticMarket
+        dates, symbols, close = SyntheticMarket(args.synthetic, days=args.years * TRADING_DAYS, seed=7).close_matrix()
+    elif args.matrix:
+        dates, symbols, close = load_price_matrix(args.matrix, args.symbols.split(',') if args.symbols else None)
+    else:
+        import app
+        symbols = args.symbols.split(',') if args.symbols else list(app.SAMPLE_STOCK_DATA.keys())
+        dates, symbols, close = load_close_matrix(symbols, args.years, refresh=args.refresh)
+
+    bars_per_year = TRADING_DAYS
+    if args.timeframe == 'weekly':
+        dates, close = to_weekly(dates, close)
+        bars_per_year = 52
+
+    fundamental_pass = None
+    if args.fundamentals:
+        from fundamentals import FundamentalsStore
+        # Pass/fail on each date from the fundamentals known that day, never later ones
+        fundamental_pass = FundamentalsStore(args.fundamentals).scores_as_of(dates[:, np.newaxis], symbols, close)['passed']
+
+    start = time.perf_counter()
+    report = run_backtest(dates, symbols, close, tuple(int(h) for h in args.horizons.split(',')),
+                          fundamental_pass=fundamental_pass, threshold=args.threshold, bars_per_year=bars_per_year,
+                          compact=args.compact)
+    elapsed = time.perf_counter() - start
+    print_report(report)
+    print(f"\n⏱️  {elapsed:.2f}s for {close.size:,} symbol-bars")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,340 @@
+"""Offline benchmark harness for the scan pipeline.
+
+Runs run_bulletproof_scan, the scoring functions, the indicator helpers and
+the main API endpoints against synthetic (or recorded) OHLCV and fundamentals
+fixtures instead of yfinance, and compares the numbers with a stored baseline.
+
+    python benchmark.py                      # run and compare with baseline
+    python benchmark.py --save-baseline      # run and store a new baseline
+    python benchmark.py --symbols 500 --fixtures recorded.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+from functools import partial
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import app
+from synthetic import SyntheticMarket
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+PERIOD_DAYS = {'5d': 5, '1mo': 22, '3mo': 66, '6mo': 130, '1y': 252, '2y': 504, '5y': 1260}
+
+def _symbol_seed(symbol):
+    """Stable per-symbol seed so fixtures are identical between runs"""
+    return zlib.crc32(symbol.replace('.NS', '').encode())
+
+
+def make_fixture(symbol, days=260):
+    """History and yfinance-style info for one symbol, from a one-symbol SyntheticMarket seeded by the
+    symbol, so a fixture does not depend on which other symbols are benchmarked"""
+    market = SyntheticMarket(1, days=days, seed=_symbol_seed(symbol))
+    return {'history': market.history(symbol, period='max'), 'info': market.info(symbol)}
+
+
+class FixtureTicker:
+    """Drop-in stand-in for yf.Ticker backed by fixture data"""
+
+    def __init__(self, symbol, fixtures):
+        self.symbol = symbol
+        record = fixtures.get(symbol)
+        if record is None:
+            record = fixtures[symbol] = make_fixture(symbol)
+        self._record = record
+
+    @property
+    def info(self):
+        return dict(self._record['info'])
+
+    @property
+    def fast_info(self):
+        info = self._record['info']
+        return SimpleNamespace(last_price=info.get('currentPrice'), market_cap=info.get('marketCap'))
+
+    def history(self, period='1mo', interval='1d'):
+        bars = self._record['history']
+        return bars.iloc[-PERIOD_DAYS.get(period, len(bars)):].copy()
+
+
+def load_fixtures(path):
+    """Load fixtures recorded by record_fixtures()"""
+    with open(path) as f:
+        raw = json.load(f)
+    fixtures = {}
+    for symbol, record in raw.items():
+        history = pd.DataFrame(record['history']['data'], columns=record['history']['columns'],
+                               index=pd.to_datetime(record['history']['index']))
+        fixtures[symbol] = {'info': record['info'], 'history': history}
+    return fixtures
+
+
+def record_fixtures(symbols, path, period='1y'):
+    """Record live yfinance info and history for symbols into a fixture file"""
+    raw = {}
+    for symbol in symbols:
+        symbol_ns = symbol if symbol.endswith('.NS') else f"{symbol}.NS"
+        try:
+            ticker = app.yf.Ticker(symbol_ns)
+            with app.rate_controller.request():
+                history = ticker.history(period=period, interval='1d')
+            if history.empty:
+                print(f"❌ {symbol_ns}: no history")
+                continue
+            history = history[['Open', 'High', 'Low', 'Close', 'Volume']]
+            with app.rate_controller.request():
+                info = ticker.info
+            raw[symbol_ns] = {
+                'info': {k: v for k, v in info.items() if isinstance(v, (int, float, str, bool))},
+                'history': {
+                    'columns': list(history.columns),
+                    'index': [ts.isoformat() for ts in history.index],
+                    'data': history.values.tolist(),
+                },
+            }
+            print(f"✅ Recorded {symbol_ns}")
+        except Exception as e:
+            print(f"❌ {symbol_ns}: {e}")
+    with open(path, 'w') as f:
+        json.dump(raw, f)
+    return len(raw)
+
+
+@contextmanager
+def offline_fixtures(fixtures):
+    """Route all ticker lookups to fixtures and disable request pacing"""
+    saved_delay = app.CONFIG['request_delay']
+    app.set_ticker_factory(partial(FixtureTicker, fixtures=fixtures))  # picklable for shard processes
+    app.CONFIG['request_delay'] = 0
+    app.rate_controller.reset(delay=0)
+    try:
+        yield fixtures
+    finally:
+        app.set_ticker_factory(None)
+        app.CONFIG['request_delay'] = saved_delay
+        app.rate_controller.reset(delay=saved_delay)
+
+
+@contextmanager
+def quiet():
+    """Silence the scan's stdout chatter while timing"""
+    saved = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = saved
+
+
+def fixture_symbols(count):
+    """Symbols that are not in SAMPLE_STOCK_DATA, so the yfinance path is exercised"""
+    return [f"FIX{i:05d}" for i in range(count)]
+
+
+def bench_stages(symbols):
+    """Symbols/sec for each scan stage plus the end-to-end scan"""
+    results = {}
+
+    start = time.perf_counter()
+    app.scan_data['data_sources_tested'] = app.test_data_sources()
+    results['source_test_sec'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fundamentals = []
+    for symbol in symbols:
+        stock_data = app.get_stock_data_bulletproof(f"{symbol}.NS")
+        fundamentals.append({**stock_data, **app.calculate_fundamental_score_bulletproof(stock_data)})
+    elapsed = time.perf_counter() - start
+    results['fundamental_symbols_per_sec'] = len(symbols) / elapsed
+
+    start = time.perf_counter()
+    for symbol in symbols:
+        app.calculate_technical_score_bulletproof(symbol)
+    elapsed = time.perf_counter() - start
+    results['technical_symbols_per_sec'] = len(symbols) / elapsed
+
+    start = time.perf_counter()
+    app.run_bulletproof_scan(symbols)
+    elapsed = time.perf_counter() - start
+    results['scan_symbols_per_sec'] = len(symbols) / elapsed
+
+    # Separate run - tracemalloc slows allocation-heavy code considerably
+    tracemalloc.start()
+    app.run_bulletproof_scan(symbols)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results['scan_peak_memory_mb'] = peak / 1024 / 1024
+    return results
+
+
+def bench_indicators(symbols, fixtures, repeat=3):
+    """Per-indicator microseconds per symbol on 3 months of daily bars"""
+    closes = [FixtureTicker(f"{s}.NS", fixtures).history(period='3mo')['Close'] for s in symbols]
+    indicators = {
+        'sma_20': lambda close: app.calculate_sma(close, 20),
+        'rsi_14': lambda close: app.calculate_rsi(close, 14),
+        'price_position_20': lambda close: app.calculate_price_position(close, 20),
+    }
+    results = {}
+    for name, func in indicators.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for close in closes:
+                func(close)
+            best = min(best, time.perf_counter() - start)
+        results[f'{name}_us_per_symbol'] = best / len(closes) * 1e6
+    return results
+
+
+def _endpoint_client():
+    """TestClient when httpx is installed, otherwise direct handler calls"""
+    try:
+        from fastapi.testclient import TestClient
+        client = TestClient(app.app)
+        return lambda path: client.get(path)
+    except (ImportError, RuntimeError, TypeError):
+        routes = {
+            '/results': app.get_results,
+            '/scan-status': app.get_scan_status,
+        }
+
+        def call(path):
+            if path.startswith('/analyze/'):
+                return app.analyze_stock_bulletproof(path.rsplit('/', 1)[1])
+            return routes[path]()
+        return call
+
+
+def bench_endpoints(symbols, requests_per_endpoint=200):
+    """p50/p99 latency in milliseconds for the main read endpoints"""
+    get = _endpoint_client()
+    results = {}
+    paths = {
+        'analyze': [f"/analyze/{symbols[i % len(symbols)]}" for i in range(requests_per_endpoint)],
+        'results': ['/results'] * requests_per_endpoint,
+        'scan_status': ['/scan-status'] * requests_per_endpoint,
+    }
+    for name, urls in paths.items():
+        timings = []
+        for url in urls:
+            start = time.perf_counter()
+            get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[f'{name}_p50_ms'] = float(np.percentile(timings, 50))
+        results[f'{name}_p99_ms'] = float(np.percentile(timings, 99))
+    return results
+
+
+def run_benchmarks(symbol_count=200, fixtures=None, endpoint_requests=200, fixture_set='synthetic'):
+    """Run every benchmark group against offline fixtures; fixture_set names them for the baseline"""
+    symbols = fixture_symbols(symbol_count) if fixtures is None else [s.replace('.NS', '') for s in fixtures]
+    with offline_fixtures(fixtures if fixtures is not None else {}) as active, quiet():
+        for symbol in symbols:
+            FixtureTicker(f"{symbol}.NS", active)  # build fixtures outside the timed sections
+        results = {}
+        results.update(bench_stages(symbols))
+        results.update(bench_indicators(symbols[:100], active))
+        results.update(bench_endpoints(symbols, endpoint_requests))
+    return {'symbols': len(symbols), 'fixtures': fixture_set, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'metrics': results}
+
+
+def higher_is_better(metric):
+    return metric.endswith('_per_sec')
+
+
+def compare_with_baseline(current, baseline, tolerance=0.2):
+    """Return (rows, regressions) comparing each metric with the baseline; raises ValueError for a
+    baseline taken over a different symbol count or fixture set, whose numbers are not comparable"""
+    for key, default in (('symbols', None), ('fixtures', 'synthetic')):
+        if current.get(key, default) != baseline.get(key, default):
+            raise ValueError(f"Baseline was run with {key}={baseline.get(key, default)}, this run has "
+                             f"{key}={current.get(key, default)}; rerun with the same settings or --save-baseline")
+    rows, regressions = [], []
+    for metric, value in current['metrics'].items():
+        base = baseline.get('metrics', {}).get(metric)
+        if not base:
+            rows.append((metric, value, None, None))
+            continue
+        change = (value - base) / base
+        worse = -change if higher_is_better(metric) else change
+        rows.append((metric, value, base, change))
+        if worse > tolerance:
+            regressions.append(metric)
+    return rows, regressions
+
+
+def print_report(current, baseline=None, tolerance=0.2):
+    print(f"\n📊 Benchmark: {current['symbols']} symbols")
+    if not baseline:
+        for metric, value in current['metrics'].items():
+            print(f"   {metric:<36} {value:>12.3f}")
+        return []
+    rows, regressions = compare_with_baseline(current, baseline, tolerance)
+    print(f"   {'metric':<36} {'current':>12} {'baseline':>12} {'change':>9}")
+    for metric, value, base, change in rows:
+        if base is None:
+            print(f"   {metric:<36} {value:>12.3f} {'-':>12} {'-':>9}")
+            continue
+        flag = ' ❌' if metric in regressions else ''
+        print(f"   {metric:<36} {value:>12.3f} {base:>12.3f} {change:>+8.1%}{flag}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {tolerance:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"\n✅ No regressions beyond {tolerance:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scan benchmarks")
+    parser.add_argument('--symbols', type=int, default=200, help="number of synthetic symbols")
+    parser.add_argument('--fixtures', help="recorded fixture file (see --record)")
+    parser.add_argument('--record', help="record live yfinance fixtures for the sample symbols to this file")
+    parser.add_argument('--requests', type=int, default=200, help="requests per endpoint")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.record:
+        count = record_fixtures(list(app.SAMPLE_STOCK_DATA.keys()), args.record)
+        print(f"✅ Recorded {count} symbols to {args.record}")
+        return 0
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    current = run_benchmarks(args.symbols, fixtures, args.requests,
+                             os.path.basename(args.fixtures) if args.fixtures else 'synthetic')
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print_report(current)
+        print(f"\n✅ Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    try:
+        regressions = print_report(current, baseline, args.tolerance)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return 1
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Compact in-memory bars for large universes.
+
+Per-symbol float64 frames cost 48 bytes per bar (five columns plus a
+DatetimeIndex each) before any indicator series are added. CompactBars keeps
+a universe as one shared date axis plus (dates x symbols) arrays: float32
+open/high/low/close and int32 volume - 20 bytes per bar - and
+technical_scores_chunked() scores it a block of symbols at a time through
+one reused float64 buffer, so indicator temporaries are the size of a block,
+not of the universe. accuracy_report() measures what float32 storage costs
+against the float64 path.
+
+    python compact.py --synthetic 5000 --years 10
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import scoring
+
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+MISSING_VOLUME = -1
+MAX_VOLUME = np.iinfo(np.int32).max
+
+PANDAS_BYTES_PER_BAR = 6 * 8  # OHLCV float64 + int64 index, per symbol frame
+
+
+def compact_volume(volume):
+    """int32 volume, MISSING_VOLUME for NaN and saturated at the int32 maximum"""
+    volume = np.asarray(volume, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return np.where(np.isnan(volume), MISSING_VOLUME, np.minimum(np.rint(volume), MAX_VOLUME)).astype(np.int32)
+
+
+class CompactBars:
+    """A universe's daily bars: shared dates, float32 prices and int32 volume as (dates x symbols) arrays"""
+
+    def __init__(self, dates, symbols, open, high, low, close, volume):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.open, self.high, self.low, self.close = (np.asarray(values, dtype=np.float32)
+                                                      for values in (open, high, low, close))
+        self.volume = np.asarray(volume, dtype=np.int32)
+        self.saturated = int((self.volume == MAX_VOLUME).sum())
+
+    @classmethod
+    def from_matrix(cls, dates, symbols, daily):
+        """From a (dates x symbols x OHLCV) array, e.g. PriceStore.matrix() or timeframes.stack_frames()"""
+        daily = np.asarray(daily)
+        return cls(dates, symbols, *(daily[..., i] for i in range(4)), compact_volume(daily[..., 4]))
+
+    @classmethod
+    def from_frames(cls, frames, symbols=None):
+        """From per-symbol OHLCV frames (ticker.history()), aligned on the union of their dates;
+        filled one symbol at a time, so no float64 copy of the universe is made"""
+        symbols = list(frames) if symbols is None else list(symbols)
+        days = {}
+        for symbol in symbols:
+            if symbol in frames:
+                index = pd.DatetimeIndex(frames[symbol].index)
+                days[symbol] = (index.tz_localize(None) if index.tz is not None else index).values.astype('datetime64[D]')
+        dates = np.unique(np.concatenate(list(days.values()))) if days else np.array([], dtype='datetime64[D]')
+        shape = (len(dates), len(symbols))
+        prices = [np.full(shape, np.nan, dtype=np.float32) for _ in range(4)]
+        volume = np.full(shape, MISSING_VOLUME, dtype=np.int32)
+        for column, symbol in enumerate(symbols):
+            if symbol not in days:
+                continue
+            rows = np.searchsorted(dates, days[symbol])
+            values = frames[symbol].reindex(columns=list(COLUMNS)).to_numpy(dtype=np.float64)
+            for i in range(4):
+                prices[i][rows, column] = values[:, i]
+            volume[rows, column] = compact_volume(values[:, 4])
+        return cls(dates, symbols, *prices, volume)
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + sum(values.nbytes for values in (self.open, self.high, self.low, self.close,
+                                                                     self.volume))
+
+    def frame(self, symbol):
+        """One symbol's bars as a float64 OHLCV frame, like ticker.history()"""
+        i = self.index[symbol]
+        present = ~np.isnan(self.close[:, i])
+        volume = self.volume[present, i].astype(np.float64)
+        volume[volume == MISSING_VOLUME] = np.nan
+        return pd.DataFrame({
+            'Open': self.open[present, i].astype(np.float64),
+            'High': self.high[present, i].astype(np.float64),
+            'Low': self.low[present, i].astype(np.float64),
+            'Close': self.close[present, i].astype(np.float64),
+            'Volume': volume,
+        }, index=pd.DatetimeIndex(self.dates[present], name='Date'))
+
+
+def technical_scores_chunked(close, chunk=256, **score_params):
+    """scoring.technical_scores over a (dates x symbols) close matrix, chunk symbols at a time.
+
+    Each block is widened into the same float64 buffer, so temporaries stay
+    block-sized; scores and RSI come back as float32, masks as bool.
+    """
+    close = np.asarray(close)
+    n_dates, n_symbols = close.shape
+    result = {
+        'technical_score': np.empty(close.shape, dtype=np.float32),
+        'rsi': np.empty(close.shape, dtype=np.float32),
+        'buy': np.empty(close.shape, dtype=bool),
+        'qualified': np.empty(close.shape, dtype=bool),
+    }
+    buffer = np.empty((n_dates, min(chunk, n_symbols)), dtype=np.float64)
+    for start in range(0, n_symbols, chunk):
+        stop = min(start + chunk, n_symbols)
+        block = buffer[:, :stop - start]
+        block[...] = close[:, start:stop]
+        scores = scoring.technical_scores(block, **score_params)
+        for name, values in result.items():
+            values[:, start:stop] = scores[name]
+    return result
+
+
+def accuracy_report(close, **score_params):
+    """How far scores from float32-stored closes drift from the float64 path, over every date and symbol"""
+    close = np.asarray(close, dtype=np.float64)
+    exact = scoring.technical_scores(close, **score_params)
+    compact = technical_scores_chunked(close.astype(np.float32), **score_params)
+    scored = ~np.isnan(exact['technical_score'])
+    with np.errstate(invalid='ignore'):
+        price_error = np.nanmax(np.abs(close.astype(np.float32) - close) / np.abs(close)) if close.size else 0.0
+        rsi_error = np.abs(compact['rsi'] - exact['rsi'])
+    return {
+        'observations': int(scored.sum()),
+        'max_price_relative_error': float(price_error),
+        'max_rsi_error': float(np.nanmax(rsi_error)) if np.any(~np.isnan(rsi_error)) else 0.0,
+        'score_mismatches': int((compact['technical_score'][scored] != exact['technical_score'][scored]).sum()),
+        'qualified_mismatches': int((compact['qualified'] != exact['qualified']).sum()),
+        'buy_mismatches': int((compact['buy'] != exact['buy']).sum()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory and accuracy of the compact bar representation")
+    parser.add_argument('--synthetic', type=int, default=1000, help="number of synthetic symbols")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--chunk', type=int, default=256)
+    args = parser.parse_args(argv)
+
+    from synthetic import SyntheticMarket
+    market = SyntheticMarket(args.synthetic, days=args.years * 252, seed=1)
+    data = market.data
+    daily = np.stack([data['open'], data['high'], data['low'], data['close'], data['volume']], axis=-1)
+    bars = CompactBars.from_matrix(data['dates'].values, market.symbols, daily)
+    del daily
+    n_dates, n_symbols = bars.close.shape
+    pandas_bytes = n_symbols * n_dates * PANDAS_BYTES_PER_BAR
+    print(f"📦 {n_symbols} symbols x {n_dates} bars: float64 frames {pandas_bytes / 2**20:,.0f} MiB, "
+          f"compact {bars.nbytes / 2**20:,.0f} MiB ({pandas_bytes / bars.nbytes:.1f}x smaller)"
+          + (f", {bars.saturated} volumes saturated" if bars.saturated else ""))
+
+    for name, run in (('float64 universe', lambda: scoring.technical_scores(bars.close.astype(np.float64))),
+                      (f'compact, {args.chunk}-symbol blocks', lambda: technical_scores_chunked(bars.close, args.chunk))):
+        tracemalloc.start()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"   scoring, {name}: {elapsed:.2f}s, peak {peak / 2**20:,.0f} MiB")
+
+    report = accuracy_report(data['close'])
+    print(f"🎯 Accuracy vs float64 over {report['observations']:,} scored bars: "
+          f"price error {report['max_price_relative_error']:.1e} (relative), RSI error {report['max_rsi_error']:.1e}, "
+          f"{report['score_mismatches']} score / {report['qualified_mismatches']} qualified / "
+          f"{report['buy_mismatches']} BUY mismatches")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
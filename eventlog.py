@@ -0,0 +1,97 @@
+"""Bounded structured event log.
+
+Keeps the most recent scan events in a ring buffer with monotonically
+increasing sequence numbers, so clients page with a cursor (`since`) instead
+of re-downloading the whole history. Printing to stdout is opt-in.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+
+def level_value(level):
+    """Numeric value for a level name (unknown names count as INFO)"""
+    return LEVELS.get(str(level).upper(), LEVELS['INFO'])
+
+
+class EventLog:
+    """Ring buffer of event dicts: seq, time, level, message plus any fields"""
+
+    def __init__(self, capacity=2000, echo=False, echo_level='INFO'):
+        self.capacity = capacity
+        self.echo = echo
+        self.echo_level = echo_level
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def log(self, level, message, **fields):
+        """Append an event and return it"""
+        level = str(level).upper()
+        with self._lock:
+            self._seq += 1
+            event = {'seq': self._seq, 'time': round(time.time(), 3), 'level': level, 'message': message}
+            event.update({k: v for k, v in fields.items() if v is not None})
+            self._events.append(event)
+        if self.echo and level_value(level) >= level_value(self.echo_level):
+            print(message)
+        return event
+
+    def debug(self, message, **fields):
+        return self.log('DEBUG', message, **fields)
+
+    def info(self, message, **fields):
+        return self.log('INFO', message, **fields)
+
+    def warning(self, message, **fields):
+        return self.log('WARNING', message, **fields)
+
+    def error(self, message, **fields):
+        return self.log('ERROR', message, **fields)
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def since(self, cursor=0, level='DEBUG', limit=200, **filters):
+        """Events after cursor at or above level, oldest first.
+
+        Returns a page dict with the events, the cursor to pass next time and
+        whether events between the cursor and the oldest retained one were
+        dropped from the buffer.
+        """
+        min_level = level_value(level)
+        with self._lock:
+            if cursor > self._seq:
+                cursor = 0  # cursor from before a restart
+            if not self._events:
+                return {'events': [], 'next_cursor': self._seq, 'truncated': False}
+            first_seq = self._events[0]['seq']
+            start = max(0, cursor - first_seq + 1)
+            candidates = list(itertools.islice(self._events, start, None))
+        truncated = cursor + 1 < first_seq
+        events = []
+        next_cursor = cursor
+        for event in candidates:
+            next_cursor = event['seq']
+            if level_value(event['level']) < min_level:
+                continue
+            if any(event.get(key) != value for key, value in filters.items() if value is not None):
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                break
+        if len(events) < limit and candidates:
+            next_cursor = candidates[-1]['seq']
+        return {'events': events, 'next_cursor': max(next_cursor, cursor), 'truncated': truncated}
+
+    def clear(self):
+        """Drop buffered events; sequence numbers keep increasing"""
+        with self._lock:
+            self._events.clear()
+
+    def __len__(self):
+        return len(self._events)
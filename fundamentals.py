@@ -0,0 +1,179 @@
+"""Point-in-time fundamentals: every observed value with the date it took effect.
+
+parse_yfinance_info only ever sees today's ratios. FundamentalsStore keeps
+them as a change log - (symbol, field, effective date, value), appended only
+when a value differs from the one in effect - so past values are never
+overwritten. as_of() answers "what was known on this date" for a whole
+universe (or a dates x symbols grid) with one binary search per field over
+sorted (symbol, date) keys. A value only counts from its effective date on,
+so historical screens and backtests cannot see the future.
+
+    store = FundamentalsStore('fundamentals.db')
+    store.record('TCS', {'pe_ratio': 28.4, 'roe': 46.1}, '2024-05-02')
+    store.as_of('2024-06-30', ['TCS', 'INFY'])['pe_ratio']   # array([28.4, nan])
+"""
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+import scoring
+from state_store import Transaction
+
+FIELDS = ('market_cap_cr', 'pe_ratio', 'pb_ratio', 'roe', 'roa', 'debt_to_equity', 'current_ratio',
+          'revenue_growth', 'earnings_growth', 'profit_margin', 'operating_margin', 'dividend_yield',
+          'beta', 'eps', 'book_value')
+
+# What scoring.fundamental_scores reads besides the price
+SCORE_FIELDS = ('pe_ratio', 'roe', 'debt_to_equity', 'current_ratio', 'revenue_growth', 'profit_margin')
+
+# Composite search key: symbol code in the high bits, day number (offset to stay positive) in the low bits
+_DAY_BITS = 32
+_DAY_OFFSET = 1 << 31
+
+
+def _day(value):
+    """Date or array of dates as datetime64[D]"""
+    if np.ndim(value):
+        values = np.asarray(value)
+        return pd.to_datetime(values.ravel()).values.astype('datetime64[D]').reshape(values.shape)
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+def _keys(codes, days):
+    return (np.asarray(codes, dtype=np.int64) << _DAY_BITS) + (days.astype(np.int64) + _DAY_OFFSET)
+
+
+class FundamentalsStore:
+    """Append-only fundamentals change log in SQLite, with vectorized as-of lookups"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None  # (symbol codes, {field: (sorted keys, values)}), dropped whenever any worker writes
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS fundamentals (symbol TEXT NOT NULL, field TEXT NOT NULL, "
+                     "effective_date TEXT NOT NULL, value REAL, PRIMARY KEY (symbol, field, effective_date))")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    def _conn(self):
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Writes
+
+    def record(self, symbol, values, effective_date=None):
+        """Append the fields of values that differ from what was in effect on effective_date (default today).
+
+        Values are taken as known from that date on. A NaN or None value is
+        recorded as missing, so a field that stops being reported does not
+        carry its last value forward. Returns the fields written.
+        """
+        day = str(_day(effective_date if effective_date is not None else pd.Timestamp.now()))
+        fields = {field: values[field] for field in FIELDS if field in values}
+        changed = []
+        conn = self._conn()
+        with Transaction(conn):
+            for field, value in fields.items():
+                value = None if value is None or value != value else float(value)
+                row = conn.execute("SELECT value FROM fundamentals WHERE symbol = ? AND field = ? "
+                                   "AND effective_date <= ? ORDER BY effective_date DESC LIMIT 1",
+                                   (symbol, field, day)).fetchone()
+                if row is not None and row[0] == value:
+                    continue
+                if row is None and value is None:
+                    continue
+                conn.execute("INSERT OR REPLACE INTO fundamentals (symbol, field, effective_date, value) "
+                             "VALUES (?, ?, ?, ?)", (symbol, field, day, value))
+                changed.append(field)
+            if changed:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        return changed
+
+    # Reads
+
+    def _load(self):
+        """Symbol codes and per-field sorted (symbol, date) keys with their values, cached until the next write"""
+        conn = self._conn()
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        with self._lock:
+            if self._version == version and self._index is not None:
+                return self._index
+        rows = conn.execute("SELECT field, symbol, effective_date, value FROM fundamentals "
+                            "ORDER BY field, symbol, effective_date").fetchall()
+        codes, index = {}, {}
+        if rows:
+            fields, symbols, days, values = zip(*rows)
+            names, symbol_codes = np.unique(np.array(symbols), return_inverse=True)
+            codes = {str(name): code for code, name in enumerate(names)}
+            fields = np.array(fields)
+            keys = _keys(symbol_codes, np.array(days, dtype='datetime64[D]'))
+            values = np.array(values, dtype=np.float64)  # None (missing) becomes NaN
+            starts = np.flatnonzero(np.append(True, fields[1:] != fields[:-1]))
+            for first, last in zip(starts, np.append(starts[1:], len(fields))):
+                index[str(fields[first])] = (keys[first:last], values[first:last])
+        with self._lock:
+            self._version, self._index = version, (codes, index)
+        return codes, index
+
+    def as_of(self, dates, symbols, fields=FIELDS):
+        """{field: values in effect on dates} for symbols, NaN where nothing was known yet.
+
+        dates is one date or an array broadcastable against len(symbols) -
+        one date per symbol, or a (dates, 1) column for a dates x symbols panel.
+        """
+        codes, index = self._load()
+        symbol_codes = np.array([codes.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+        days, symbol_codes = np.broadcast_arrays(_day(dates), symbol_codes)
+        wanted = _keys(symbol_codes, days)
+        result = {}
+        for field in fields:
+            keys, values = index.get(field, (np.empty(0, dtype=np.int64), np.empty(0)))
+            # Last change on or before the date, if it belongs to the same symbol
+            found = np.searchsorted(keys, wanted, side='right') - 1
+            valid = (found >= 0) & (symbol_codes >= 0)
+            found = np.maximum(found, 0)
+            if len(keys):
+                valid &= (keys[found] >> _DAY_BITS) == symbol_codes
+                result[field] = np.where(valid, values[found], np.nan)
+            else:
+                result[field] = np.full(symbol_codes.shape, np.nan)
+        return result
+
+    def panel(self, dates, symbols, fields=FIELDS):
+        """{field: dates x symbols matrix} of the values in effect on each date"""
+        return self.as_of(_day(dates)[:, np.newaxis], symbols, fields)
+
+    def scores_as_of(self, dates, symbols, prices, threshold=4):
+        """Fundamental score, grade and pass arrays as they would have been computed on dates.
+
+        dates and prices broadcast as in as_of(); prices are the closes on those
+        dates. Without a price or any fundamentals known yet there is no score,
+        as in the live scan.
+        """
+        fields = self.as_of(dates, symbols, SCORE_FIELDS)
+        known = np.any([~np.isnan(values) for values in fields.values()], axis=0)
+        prices = np.where(known, np.broadcast_to(np.asarray(prices, dtype=np.float64), known.shape), 0.0)
+        return scoring.fundamental_scores({**fields, 'current_price': prices}, threshold=threshold)
+
+    def history(self, symbol, fields=FIELDS):
+        """Every recorded change for symbol as a frame indexed by effective date, one column per field"""
+        rows = self._conn().execute("SELECT effective_date, field, value FROM fundamentals WHERE symbol = ? "
+                                    "ORDER BY effective_date", (symbol,)).fetchall()
+        frame = pd.DataFrame(rows, columns=['date', 'field', 'value'])
+        frame = frame[frame['field'].isin(fields)].pivot(index='date', columns='field', values='value')
+        frame.index = pd.DatetimeIndex(frame.index, name='Date')
+        return frame.reindex(columns=[field for field in fields if field in frame.columns])
+
+    def symbols(self):
+        return [row[0] for row in self._conn().execute("SELECT DISTINCT symbol FROM fundamentals ORDER BY symbol")]
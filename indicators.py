@@ -0,0 +1,144 @@
+"""Vectorized technical indicators.
+
+Every function takes a 1-D series or a 2-D (dates x symbols) matrix and
+works along axis 0, so a whole universe is processed in one call. Results
+line up with the pandas helpers in app.py (calculate_sma, calculate_rsi,
+calculate_price_position): NaN until a full window is available, NaN again
+for any window that contains a missing bar.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _as_float(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def shift(values, periods=1):
+    """Shift along axis 0, padding with NaN"""
+    values = _as_float(values)
+    out = np.full_like(values, np.nan)
+    if periods > 0:
+        out[periods:] = values[:-periods]
+    elif periods < 0:
+        out[:periods] = values[-periods:]
+    else:
+        out[:] = values
+    return out
+
+
+def diff(values, periods=1):
+    values = _as_float(values)
+    return values - shift(values, periods)
+
+
+def rolling_sum(values, window):
+    """Rolling sum via cumulative sums - O(n) regardless of window"""
+    values = _as_float(values)
+    out = np.full_like(values, np.nan)
+    if window <= 0 or len(values) < window:
+        return out
+    missing = np.isnan(values)
+    zero_padding = np.zeros((1,) + values.shape[1:])
+    sums = np.concatenate([zero_padding, np.cumsum(np.where(missing, 0.0, values), axis=0)])
+    gaps = np.concatenate([zero_padding, np.cumsum(missing, axis=0)])
+    window_sums = sums[window:] - sums[:-window]
+    window_gaps = gaps[window:] - gaps[:-window]
+    out[window - 1:] = np.where(window_gaps > 0, np.nan, window_sums)
+    return out
+
+
+def rolling_mean(values, window):
+    return rolling_sum(values, window) / window
+
+
+def _rolling_reduce(values, window, reducer):
+    values = _as_float(values)
+    out = np.full_like(values, np.nan)
+    if window <= 0 or len(values) < window:
+        return out
+    windows = sliding_window_view(values, window, axis=0)
+    out[window - 1:] = reducer(windows, axis=-1)
+    return out
+
+
+def rolling_max(values, window):
+    return _rolling_reduce(values, window, np.max)
+
+
+def rolling_min(values, window):
+    return _rolling_reduce(values, window, np.min)
+
+
+def sma(close, period=20):
+    """Simple moving average"""
+    return rolling_mean(close, period)
+
+
+def rsi(close, period=14):
+    """RSI with simple rolling averages of gains and losses (matches app.calculate_rsi)"""
+    delta = diff(close)
+    # Like pandas .where(): the leading NaN delta counts as no gain and no loss
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = rolling_mean(gain, period) / rolling_mean(loss, period)
+        return 100 - (100 / (1 + rs))
+
+
+def price_position(close, period=20):
+    """Close within its rolling high/low range, 0-100 (NaN for a flat range)"""
+    close = _as_float(close)
+    high = rolling_max(close, period)
+    low = rolling_min(close, period)
+    span = high - low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(span != 0, (close - low) / span * 100, np.nan)
+
+
+def wma(values, period):
+    """Linearly weighted moving average (newest bar has the largest weight)"""
+    values = _as_float(values)
+    out = np.full_like(values, np.nan)
+    if period <= 0 or len(values) < period:
+        return out
+    weights = np.arange(1, period + 1, dtype=np.float64)
+    windows = sliding_window_view(values, period, axis=0)
+    out[period - 1:] = windows @ (weights / weights.sum())
+    return out
+
+
+def hma(values, period):
+    """Hull moving average: WMA(2 * WMA(n/2) - WMA(n), sqrt(n))"""
+    half = wma(values, max(period // 2, 1))
+    full = wma(values, period)
+    return wma(2 * half - full, max(int(np.sqrt(period)), 1))
+
+
+def ema(values, span):
+    """Exponential moving average (pandas ewm(span, adjust=False)); starts at each series' first value"""
+    values = _as_float(values)
+    alpha = 2 / (span + 1)
+    out = np.empty_like(values)
+    prev = np.full(values.shape[1:], np.nan)
+    for t in range(len(values)):
+        current = values[t]
+        blended = alpha * current + (1 - alpha) * prev
+        prev = np.where(np.isnan(prev), current, np.where(np.isnan(current), prev, blended))
+        out[t] = prev
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def run_length(mask):
+    """Number of consecutive True values ending at each position along axis 0"""
+    mask = np.asarray(mask, dtype=bool)
+    counts = np.cumsum(mask, axis=0)
+    last_reset = np.maximum.accumulate(np.where(mask, 0, counts), axis=0)
+    return counts - last_reset
@@ -0,0 +1,325 @@
+"""Intraday live mode for the qualified watchlist.
+
+Live prices replace the close of the current (today's) bar. The technical
+rules only change outcome when that price crosses one of a few levels, and
+with the completed bars fixed those levels can be solved for up front:
+
+    trend        price > SMA                  -> one price level
+    RSI bands    30 / 40 / 60 / 70            -> four price levels (RSI rises with price)
+    position     40-80% of the rolling range  -> two price levels
+
+So each tick is one vectorized "still inside the band?" check over the whole
+watchlist, and only symbols that left their band are rescored (exactly, with
+scoring.combine_technical_score). Rescored symbols whose score or
+recommendation changed are published to an EventLog for the dashboard to
+page through with a cursor.
+"""
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import scoring
+from eventlog import EventLog
+
+MARKET_TZ = ZoneInfo('Asia/Kolkata')
+
+# Rule thresholds of scoring.combine_technical_score
+RSI_LEVELS = (30, 40, 60, 70)
+POSITION_LEVELS = (40, 80)
+
+# Prices within this relative distance of a level are always rescored exactly
+LEVEL_TOLERANCE = 1e-9
+
+# NSE trading holidays on weekdays, from the exchange's yearly circulars
+NSE_HOLIDAYS = (
+    '2025-02-26', '2025-03-14', '2025-03-31', '2025-04-10', '2025-04-14', '2025-04-18', '2025-05-01',
+    '2025-08-15', '2025-08-27', '2025-10-02', '2025-10-21', '2025-10-22', '2025-11-05', '2025-12-25',
+    '2026-01-26', '2026-03-03', '2026-03-26', '2026-03-31', '2026-04-03', '2026-04-14', '2026-05-01',
+    '2026-05-28', '2026-06-26', '2026-09-14', '2026-10-02', '2026-10-20', '2026-11-10', '2026-11-24',
+    '2026-12-25',
+)
+
+
+def market_date():
+    return datetime.now(MARKET_TZ).date()
+
+
+def trading_session(day=None, holidays=NSE_HOLIDAYS):
+    """The session a date belongs to: the date itself on a trading day, else the last trading day before it"""
+    day = np.datetime64(day or market_date(), 'D')
+    return np.busday_offset(day, 0, roll='backward', holidays=list(holidays)).astype(object)
+
+
+def recommendation_for(score, buy_score=70):
+    return 'BUY' if score >= buy_score else 'HOLD' if score >= 50 else 'AVOID'
+
+
+class LiveWatchlist:
+    """Watchlist records plus the per-symbol state needed to rescore one new price"""
+
+    def __init__(self, sma_period=20, rsi_period=14, range_period=20, buy_score=70, threshold=40):
+        if min(sma_period, range_period) < 2 or rsi_period < 1:
+            raise ValueError("live mode needs sma_period and range_period >= 2")
+        self.sma_period = sma_period
+        self.rsi_period = rsi_period
+        self.range_period = range_period
+        self.buy_score = buy_score
+        self.threshold = threshold
+        self.window = max(sma_period - 1, range_period - 1, rsi_period)
+        self.symbols = []
+        self.records = []
+        self._index = {}
+
+    def load(self, records, closes):
+        """Records from final_results and completed daily closes per symbol.
+
+        Symbols with fewer completed bars than the rules need are left out;
+        returns the list of skipped symbols.
+        """
+        kept, windows, skipped = [], [], []
+        for record in records:
+            history = np.asarray(closes.get(record['symbol'], []), dtype=np.float64)
+            history = history[~np.isnan(history)]
+            if len(history) < self.window:
+                skipped.append(record['symbol'])
+                continue
+            kept.append(dict(record))
+            windows.append(history[-self.window:])
+
+        self.records = kept
+        self.symbols = [record['symbol'] for record in kept]
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._fundamental = np.array([record.get('score', 0) for record in kept], dtype=np.float64)
+        self._windows = np.array(windows).reshape(len(kept), self.window)
+        self.price = self._windows[:, -1].copy()
+        self._rebase()
+        self.score = np.full(len(kept), np.nan)
+        self.recommendation = np.array([record.get('recommendation', '') for record in kept], dtype=object)
+        self._rescore(np.arange(len(kept)))
+        return skipped
+
+    def _rebase(self):
+        """Sums, extremes and rule levels from the completed bars"""
+        windows = self._windows
+        self._sma_sum = windows[:, -(self.sma_period - 1):].sum(axis=1)
+        deltas = np.diff(windows[:, -self.rsi_period:], axis=1)
+        self._gains = np.where(deltas > 0, deltas, 0.0).sum(axis=1)
+        self._losses = np.where(deltas < 0, -deltas, 0.0).sum(axis=1)
+        self._prev = windows[:, -1]
+        self._high = windows[:, -(self.range_period - 1):].max(axis=1)
+        self._low = windows[:, -(self.range_period - 1):].min(axis=1)
+
+        span = self._high - self._low
+        levels = [self._sma_sum / (self.sma_period - 1), self._prev]
+        levels += [self._low + span * level / 100 for level in POSITION_LEVELS]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for level in RSI_LEVELS:
+                rs = level / (100 - level)
+                up = rs * self._losses - self._gains       # delta >= 0: rs = (G + d) / L
+                down = self._losses - self._gains / rs     # delta < 0:  rs = G / (L - d)
+                delta = np.where((up >= 0) & (self._losses > 0), up, np.where(down < 0, down, np.nan))
+                levels.append(self._prev + delta)
+        self._levels = np.column_stack(levels)
+        self.lower = np.full(len(self.symbols), np.nan)
+        self.upper = np.full(len(self.symbols), np.nan)
+
+    def score_at(self, indices, prices):
+        """Exact technical score and RSI with prices as the current bar's close"""
+        prices = np.asarray(prices, dtype=np.float64)
+        sma = (self._sma_sum[indices] + prices) / self.sma_period
+        delta = prices - self._prev[indices]
+        gains = self._gains[indices] + np.maximum(delta, 0)
+        losses = self._losses[indices] + np.maximum(-delta, 0)
+        high = np.maximum(self._high[indices], prices)
+        low = np.minimum(self._low[indices], prices)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - 100 / (1 + gains / losses)
+            position = np.where(high != low, (prices - low) / (high - low) * 100, np.nan)
+        return scoring.combine_technical_score(prices, sma, rsi, position), rsi
+
+    def _set_bands(self, indices):
+        """Price band around each current price inside which the score cannot change"""
+        prices = self.price[indices][:, np.newaxis]
+        levels = self._levels[indices]
+        lower = np.where(levels < prices, levels, -np.inf).max(axis=1)
+        upper = np.where(levels > prices, levels, np.inf).min(axis=1)
+        on_level = (np.abs(levels - prices) <= np.abs(prices) * LEVEL_TOLERANCE).any(axis=1)
+        self.lower[indices] = np.where(on_level, prices[:, 0], lower)
+        self.upper[indices] = np.where(on_level, prices[:, 0], upper)
+
+    def _rescore(self, indices):
+        """Rescore indices at their current prices; returns change dicts"""
+        score, rsi = self.score_at(indices, self.price[indices])
+        self._set_bands(indices)
+        changes = []
+        for i, new_score, new_rsi in zip(indices.tolist(), score.tolist(), rsi.tolist()):
+            if np.isnan(new_score):
+                continue
+            new_score = int(new_score)
+            recommendation = recommendation_for(new_score, self.buy_score)
+            previous = self.recommendation[i]
+            if new_score == self.score[i] and recommendation == previous:
+                continue
+            self.score[i] = new_score
+            self.recommendation[i] = recommendation
+            update = {
+                'technical_score': new_score,
+                'recommendation': recommendation,
+                'rsi': round(new_rsi, 1) if not np.isnan(new_rsi) else None,
+                'qualified': new_score >= self.threshold,
+                'current_price': round(float(self.price[i]), 2),
+                'final_score': round((self._fundamental[i] * 10 + new_score) / 2, 1)
+            }
+            self.records[i].update(update)
+            changes.append({'symbol': self.symbols[i], **update, 'previous_recommendation': previous})
+        return changes
+
+    def apply_quotes(self, quotes):
+        """New prices {symbol: price}; rescores only symbols that left their band"""
+        indices, prices = [], []
+        for symbol, price in quotes.items():
+            i = self._index.get(symbol)
+            if i is not None and price is not None and price > 0:
+                indices.append(i)
+                prices.append(price)
+        if not indices:
+            return [], 0
+        indices = np.array(indices)
+        prices = np.array(prices, dtype=np.float64)
+        self.price[indices] = prices
+        crossed = indices[~((prices > self.lower[indices]) & (prices < self.upper[indices]))]
+        if not crossed.size:
+            return [], 0
+        return self._rescore(crossed), len(crossed)
+
+    def roll(self):
+        """New session: the last live price becomes a completed bar"""
+        self._windows = np.column_stack([self._windows[:, 1:], self.price])
+        self._rebase()
+        return self._rescore(np.arange(len(self.symbols)))
+
+    def snapshot(self):
+        """Records with the latest prices"""
+        for record, price in zip(self.records, self.price.tolist()):
+            record['current_price'] = round(price, 2)
+        return [dict(record) for record in self.records]
+
+    def prices(self):
+        return {symbol: round(price, 2) for symbol, price in zip(self.symbols, self.price.tolist())}
+
+
+class SimulatedQuoteSource:
+    """Local stand-in for a quote feed: a random walk from the starting prices"""
+
+    def __init__(self, start_prices, volatility=0.001, seed=None):
+        self._prices = dict(start_prices)
+        self.volatility = volatility
+        self._rng = np.random.default_rng(seed)
+
+    def quotes(self, symbols):
+        steps = np.exp(self._rng.standard_normal(len(symbols)) * self.volatility)
+        for symbol, step in zip(symbols, steps.tolist()):
+            self._prices[symbol] = self._prices.get(symbol, 0) * step
+        return {symbol: self._prices[symbol] for symbol in symbols}
+
+
+class YahooQuoteSource:
+    """Latest one-minute closes for the whole watchlist in one batch download"""
+
+    def quotes(self, symbols):
+        import yfinance as yf
+        if not symbols:
+            return {}
+        tickers = [f"{symbol}.NS" for symbol in symbols]
+        frame = yf.download(tickers, period='1d', interval='1m', group_by='column', progress=False, threads=True)
+        closes = frame['Close']
+        if closes.ndim == 1:
+            closes = closes.to_frame(tickers[0])
+        latest = closes.ffill().iloc[-1] if len(closes) else {}
+        return {ticker.replace('.NS', ''): float(price) for ticker, price in latest.items() if price == price}
+
+
+class LiveSession:
+    """Polls a quote source on a background thread and publishes score changes.
+
+    With source=None nothing is polled and prices arrive through apply().
+    Quotes keep arriving on weekends and holidays; the watchlist only rolls
+    to a new bar when a new trading session starts.
+    """
+
+    def __init__(self, watchlist, source=None, interval=1.0, log_size=2000, on_tick=None, holidays=NSE_HOLIDAYS):
+        self.watchlist = watchlist
+        self.source = source
+        self.interval = interval
+        self.on_tick = on_tick
+        self.changes = EventLog(capacity=log_size)
+        self.ticks = 0
+        self.last_tick = None
+        self.last_error = None
+        self.holidays = tuple(holidays)
+        self._day = trading_session(holidays=self.holidays)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        if self.source is None:
+            return not self._stop.is_set()
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.source is not None:
+            self._thread = threading.Thread(target=self._run, name='live-quotes', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+
+    def apply(self, quotes):
+        """Apply a batch of prices; returns the published changes"""
+        start = time.perf_counter()
+        with self._lock:
+            session = trading_session(holidays=self.holidays)
+            if session != self._day:
+                self._day = session
+                self._publish(self.watchlist.roll())
+            changes, rescored = self.watchlist.apply_quotes(quotes)
+            self._publish(changes)
+            self.ticks += 1
+            self.last_tick = datetime.now().isoformat()
+        if self.on_tick:
+            self.on_tick(time.perf_counter() - start, quotes, rescored)
+        return changes
+
+    def _publish(self, changes):
+        for change in changes:
+            self.changes.info(f"{change['symbol']} {change['previous_recommendation']} → {change['recommendation']} "
+                              f"at ₹{change['current_price']}", symbol=change['symbol'], change=change)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.apply(self.source.quotes(self.watchlist.symbols))
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def status(self):
+        return {
+            'running': self.running,
+            'source': type(self.source).__name__ if self.source else 'push',
+            'symbols': len(self.watchlist.symbols),
+            'ticks': self.ticks,
+            'last_tick': self.last_tick,
+            'last_error': self.last_error,
+            'cursor': self.changes.last_seq
+        }
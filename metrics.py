@@ -0,0 +1,191 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keyed by label values. Everything is guarded
+by one lock because scans run in a background thread next to the API.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class holding name, help text and label names"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def reset(self):
+        with _lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels):
+        """Copy of count/sum/bucket counts for one label set"""
+        state = self._values.get(_label_key(self.labelnames, labels))
+        if state is None:
+            return {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        with _lock:
+            return {'counts': list(state['counts']), 'sum': state['sum'], 'count': state['count']}
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def render_prometheus():
+    """All registered metrics in Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Scan pipeline metrics
+FETCH_LATENCY = Histogram(
+    'stock_scanner_fetch_seconds', 'Per-symbol data fetch latency by data source', ['source'])
+FETCH_ERRORS = Counter(
+    'stock_scanner_fetch_errors_total', 'Failed per-symbol fetches by data source', ['source'])
+FETCH_THROTTLED = Counter(
+    'stock_scanner_fetch_throttled_total', 'Fetches refused by the upstream rate limit, by data source', ['source'])
+FETCH_RETRIES = Counter(
+    'stock_scanner_fetch_retries_total', 'Throttled symbols put back on the retry queue, by scan stage', ['stage'])
+REQUEST_PACING = Gauge(
+    'stock_scanner_request_pacing', 'Adaptive upstream pacing: delay (seconds) and concurrency window', ['setting'])
+CACHE_REQUESTS = Counter(
+    'stock_scanner_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ['cache', 'result'])
+STAGE_DURATION = Histogram(
+    'stock_scanner_stage_seconds', 'Wall time of each scan stage', ['stage'])
+SYMBOL_DURATION = Histogram(
+    'stock_scanner_symbol_seconds', 'Per-symbol processing time within a scan stage', ['stage'])
+QUEUE_DEPTH = Gauge(
+    'stock_scanner_queue_depth', 'Symbols still waiting in each scan stage', ['stage'])
+SCANS = Counter(
+    'stock_scanner_scans_total', 'Completed scans by outcome', ['outcome'])
+
+# API metrics
+API_LATENCY = Histogram(
+    'stock_scanner_http_request_seconds', 'API request latency', ['method', 'path', 'status'])
+
+# Live mode metrics
+LIVE_TICK_DURATION = Histogram(
+    'stock_scanner_live_tick_seconds', 'Time to apply one batch of live quotes to the watchlist',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+LIVE_QUOTES = Counter(
+    'stock_scanner_live_quotes_total', 'Live quotes applied, and how many needed a rescore', ['result'])
+
+# Alert metrics
+ALERTS = Counter(
+    'stock_scanner_alerts_total', 'Alert deliveries by sink type and result', ['sink', 'result'])
@@ -0,0 +1,279 @@
+"""Parallel parameter sweep for the scan's thresholds and indicator periods.
+
+Evaluates grid or random combinations of RSI period, SMA length, range
+window, HMA 30/44 band, MACD 3/21/9 variants and score cutoffs against a
+(dates x symbols) close matrix. The matrix is placed in shared memory once
+and every worker process maps it instead of receiving a pickled copy.
+
+    python optimizer.py --synthetic 500 --years 10 --mode random --samples 2000
+    python optimizer.py --symbols RELIANCE,TCS,INFY --mode grid --output sweep.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from functools import lru_cache
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import backtest
+import indicators
+import scoring
+
+# Each value list is swept; macd is (fast, slow, signal), macd_min_bars 0 disables
+# the MACD filter and hma_band False disables the HMA band filter.
+DEFAULT_SPACE = {
+    'rsi_period': [9, 14, 21],
+    'sma_period': [10, 20, 50],
+    'range_period': [20],
+    'buy_score': [65, 70, 75, 80],
+    'hma_band': [False, True],
+    'hma_fast': [30],
+    'hma_slow': [44],
+    'macd': [(3, 21, 9), (12, 26, 9), (5, 34, 9)],
+    'macd_min_bars': [0, 8],
+}
+
+METRICS = ('sharpe', 'mean_return', 'hit_rate')
+
+# Worker-process state, set by _init_worker
+_close = None
+_shm = None
+_settings = {}
+
+
+def grid_combinations(space):
+    """Every combination in the space, skipping redundant disabled-filter variants"""
+    names = list(space)
+    seen = set()
+    for values in itertools.product(*(space[name] for name in names)):
+        params = _normalize(dict(zip(names, values)))
+        key = _key(params)
+        if key not in seen:
+            seen.add(key)
+            yield params
+
+
+def random_combinations(space, samples, seed=0):
+    """Random draws from the space (without repeats)"""
+    rng = random.Random(seed)
+    names = list(space)
+    total = int(np.prod([len(space[name]) for name in names]))
+    seen = set()
+    attempts = 0
+    while len(seen) < samples and attempts < samples * 20 and len(seen) < total:
+        attempts += 1
+        params = _normalize({name: rng.choice(space[name]) for name in names})
+        key = _key(params)
+        if key not in seen:
+            seen.add(key)
+            yield params
+
+
+def _normalize(params):
+    params = dict(params)
+    params['macd'] = tuple(params['macd'])
+    if not params['hma_band']:
+        params['hma_fast'] = params['hma_slow'] = None
+    if not params['macd_min_bars']:
+        params['macd'] = None
+    return params
+
+
+def _key(params):
+    return tuple(sorted(params.items(), key=lambda item: item[0]))
+
+
+def _init_worker(shm_name, shape, dtype, settings):
+    """Attach to the shared close matrix (no copy)"""
+    global _close, _shm, _settings
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _close = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+    _settings = settings
+
+
+# Indicator caches - combinations are evaluated in sorted order, so neighbours
+# in a worker's chunk mostly reuse the same indicator matrices
+@lru_cache(maxsize=8)
+def _sma(period):
+    return indicators.sma(_close, period)
+
+
+@lru_cache(maxsize=8)
+def _rsi(period):
+    return indicators.rsi(_close, period)
+
+
+@lru_cache(maxsize=4)
+def _position(period):
+    return indicators.price_position(_close, period)
+
+
+@lru_cache(maxsize=4)
+def _hma_band(fast, slow):
+    fast_line = indicators.hma(_close, fast)
+    slow_line = indicators.hma(_close, slow)
+    with np.errstate(invalid='ignore'):
+        return (_close >= np.fmin(fast_line, slow_line)) & (_close <= np.fmax(fast_line, slow_line))
+
+
+@lru_cache(maxsize=4)
+def _macd_run(fast, slow, signal):
+    _, _, histogram = indicators.macd(_close, fast, slow, signal)
+    with np.errstate(invalid='ignore'):
+        return indicators.run_length(histogram > 0)
+
+
+@lru_cache(maxsize=1)
+def _forward(horizon):
+    return backtest.forward_returns(_close, horizon)
+
+
+def signal_mask(params):
+    """Entry mask for one parameter set, using the worker's cached indicators"""
+    score = scoring.combine_technical_score(_close, _sma(params['sma_period']), _rsi(params['rsi_period']),
+                                            _position(params['range_period']))
+    with np.errstate(invalid='ignore'):
+        mask = score >= params['buy_score']
+    if params['hma_band']:
+        mask &= _hma_band(params['hma_fast'], params['hma_slow'])
+    if params['macd_min_bars']:
+        mask &= _macd_run(*params['macd']) >= params['macd_min_bars']
+    return mask
+
+
+def evaluate(params):
+    """Forward-return statistics and portfolio quality for one parameter set"""
+    horizon = _settings['horizon']
+    mask = signal_mask(params)
+    forward = _forward(horizon)[mask]
+    forward = forward[~np.isnan(forward)]
+    equity, positions = backtest.portfolio_equity(_close, mask)
+    period_returns = np.diff(equity, prepend=1.0) / np.concatenate([[1.0], equity[:-1]])
+    active = period_returns[positions > 0]
+    sharpe = 0.0
+    if active.size > 1 and active.std() > 0:
+        sharpe = float(active.mean() / active.std() * np.sqrt(_settings['bars_per_year']))
+    return {
+        'params': params,
+        'signals': int(forward.size),
+        'mean_return': float(forward.mean()) if forward.size else None,
+        'hit_rate': float((forward > 0).mean()) if forward.size else None,
+        'sharpe': sharpe,
+        'max_drawdown': backtest.max_drawdown(equity),
+        'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+    }
+
+
+def _sort_key(params):
+    """Group combinations that share expensive indicators"""
+    return (params['rsi_period'], params['sma_period'], params['range_period'],
+            params['hma_fast'] or 0, params['hma_slow'] or 0, params['macd'] or (0, 0, 0),
+            params['macd_min_bars'], params['buy_score'])
+
+
+def run_sweep(close, combinations, horizon=20, bars_per_year=backtest.TRADING_DAYS, workers=None,
+              metric='sharpe', min_signals=100):
+    """Evaluate combinations in parallel; results sorted best-first by metric"""
+    combinations = sorted(combinations, key=_sort_key)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+    settings = {'horizon': horizon, 'bars_per_year': bars_per_year}
+
+    shm = shared_memory.SharedMemory(create=True, size=close.nbytes)
+    try:
+        np.ndarray(close.shape, dtype=close.dtype, buffer=shm.buf)[:] = close
+        # Contiguous chunks keep related combinations on one worker's caches
+        chunksize = max(1, len(combinations) // (workers * 4))
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(shm.name, close.shape, close.dtype.str, settings)) as pool:
+            results = pool.map(evaluate, combinations, chunksize=chunksize)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    def rank(result):
+        value = result.get(metric)
+        return value if value is not None and result['signals'] >= min_signals else float('-inf')
+    results.sort(key=rank, reverse=True)
+    return results
+
+
+def print_results(results, metric, top=20):
+    print(f"\n🏆 Top {min(top, len(results))} of {len(results)} by {metric}")
+    for result in results[:top]:
+        params = result['params']
+        filters = []
+        if params['hma_band']:
+            filters.append(f"HMA {params['hma_fast']}/{params['hma_slow']}")
+        if params['macd_min_bars']:
+            filters.append(f"MACD {'/'.join(map(str, params['macd']))} ≥{params['macd_min_bars']} bars")
+        mean = f"{result['mean_return']:+.2%}" if result['mean_return'] is not None else '-'
+        hit = f"{result['hit_rate']:.1%}" if result['hit_rate'] is not None else '-'
+        print(f"   sharpe {result['sharpe']:5.2f}  mean {mean:>7}  hit {hit:>6}  "
+              f"DD {result['max_drawdown']:5.1%}  n={result['signals']:<8} "
+              f"RSI {params['rsi_period']} SMA {params['sma_period']} range {params['range_period']} "
+              f"buy≥{params['buy_score']} {' '.join(filters)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep over the scan rules")
+    parser.add_argument('--synthetic', type=int, help="number of synthetic symbols instead of Yahoo data")
+    parser.add_argument('--symbols', help="comma separated NSE symbols")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--timeframe', choices=['daily', 'weekly'], default='daily')
+    parser.add_argument('--mode', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--samples', type=int, default=500, help="combinations for random search")
+    parser.add_argument('--space', help="JSON file overriding DEFAULT_SPACE entries")
+    parser.add_argument('--horizon', type=int, default=20, help="forward return horizon in bars")
+    parser.add_argument('--metric', choices=METRICS, default='sharpe')
+    parser.add_argument('--min-signals', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="write all results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        from synthetic import SyntheticMarket
+        dates, symbols, close = SyntheticMarket(args.synthetic, days=args.years * backtest.TRADING_DAYS,
+                                                seed=7).close_matrix()
+    else:
+        import app
+        symbols = args.symbols.split(',') if args.symbols else list(app.SAMPLE_STOCK_DATA.keys())
+        dates, symbols, close = backtest.load_close_matrix(symbols, args.years)
+    bars_per_year = backtest.TRADING_DAYS
+    if args.timeframe == 'weekly':
+        dates, close = backtest.to_weekly(dates, close)
+        bars_per_year = 52
+
+    space = dict(DEFAULT_SPACE)
+    if args.space:
+        with open(args.space) as f:
+            space.update(json.load(f))
+    if args.mode == 'grid':
+        combinations = list(grid_combinations(space))
+    else:
+        combinations = list(random_combinations(space, args.samples))
+
+    start = time.perf_counter()
+    results = run_sweep(close, combinations, args.horizon, bars_per_year, args.workers, args.metric,
+                        args.min_signals)
+    elapsed = time.perf_counter() - start
+    print_results(results, args.metric, args.top)
+    print(f"\n⏱️  {len(combinations)} combinations over {close.shape[1]} symbols x {close.shape[0]} bars "
+          f"in {elapsed:.1f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=list)
+        print(f"✅ Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,308 @@
+"""Portfolio tracking: trades, FIFO lots, P&L and sector exposure.
+
+Trades are persisted in a local SQLite file and are the only source of truth;
+open lots and realized P&L are rebuilt from them (FIFO) whenever the trade
+list changes, in any worker. Marking to market is one vectorized pass: every
+open position keeps a slot in the shared PriceCache, so revaluing the whole
+book is a single gather plus a few array operations.
+"""
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from state_store import Transaction
+
+SIDES = ('BUY', 'SELL')
+AVOID = 'AVOID'
+
+# Quantities below this are treated as fully closed (fractional units from splits etc.)
+QUANTITY_EPSILON = 1e-9
+
+
+class PortfolioError(ValueError):
+    """A trade that would leave the book inconsistent"""
+
+
+def normalize_time(value):
+    """ISO 8601 local time for a trade timestamp, so the TEXT column sorts trades in time order;
+    raises PortfolioError for anything datetime.fromisoformat does not accept"""
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise PortfolioError(f"traded_at must be an ISO 8601 date or time, got '{value}'")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat(timespec='seconds')
+
+
+def build_lots(trades):
+    """FIFO lots from trades in time order.
+
+    Returns (open_lots, realized) where open_lots maps symbol -> list of lot
+    dicts and realized maps symbol -> realized P&L net of fees.
+    """
+    lots = {}
+    realized = {}
+    for trade in trades:
+        symbol = trade['symbol']
+        queue = lots.setdefault(symbol, deque())
+        quantity = trade['quantity']
+        if trade['side'] == 'BUY':
+            queue.append({
+                'trade_id': trade['id'],
+                'quantity': quantity,
+                'unit_cost': (trade['price'] * quantity + trade['fees']) / quantity,
+                'opened_at': trade['traded_at']
+            })
+            continue
+
+        unit_proceeds = (trade['price'] * quantity - trade['fees']) / quantity
+        remaining = quantity
+        while remaining > QUANTITY_EPSILON and queue:
+            lot = queue[0]
+            matched = min(lot['quantity'], remaining)
+            realized[symbol] = realized.get(symbol, 0.0) + matched * (unit_proceeds - lot['unit_cost'])
+            lot['quantity'] -= matched
+            remaining -= matched
+            if lot['quantity'] <= QUANTITY_EPSILON:
+                queue.popleft()
+        if remaining > QUANTITY_EPSILON:
+            raise PortfolioError(f"Trade {trade['id']} sells {quantity} {symbol} but only "
+                                 f"{quantity - remaining:g} are held at {trade['traded_at']}")
+    open_lots = {symbol: list(queue) for symbol, queue in lots.items() if queue}
+    return open_lots, realized
+
+
+class Portfolio:
+    """Trade book in SQLite with cached positions for fast revaluation"""
+
+    def __init__(self, path, price_cache):
+        self.path = path
+        self.price_cache = price_cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._version = None
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "symbol TEXT NOT NULL, side TEXT NOT NULL, quantity REAL NOT NULL, price REAL NOT NULL, "
+                     "fees REAL NOT NULL DEFAULT 0, sector TEXT, traded_at TEXT NOT NULL, note TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS signals (symbol TEXT PRIMARY KEY, recommendation TEXT, "
+                     "previous TEXT, scan_id TEXT, updated_at TEXT, flagged INTEGER NOT NULL DEFAULT 0)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    def _conn(self):
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump_version(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    # Trades
+
+    def trades(self, symbol=None):
+        query = "SELECT * FROM trades"
+        params = ()
+        if symbol:
+            query += " WHERE symbol = ?"
+            params = (symbol,)
+        rows = self._conn().execute(query + " ORDER BY traded_at, id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_trade(self, symbol, side, quantity, price, fees=0.0, traded_at=None, sector=None, note=None):
+        """Record a trade; rejects sells of more than is held at that time"""
+        side = str(side).upper()
+        if side not in SIDES:
+            raise PortfolioError(f"Side must be one of {', '.join(SIDES)}")
+        if not quantity > 0 or not price > 0 or fees < 0:
+            raise PortfolioError("Quantity and price must be positive and fees non-negative")
+        trade = {
+            'symbol': symbol.upper().replace('.NS', ''),
+            'side': side,
+            'quantity': float(quantity),
+            'price': float(price),
+            'fees': float(fees),
+            'sector': sector,
+            'traded_at': normalize_time(traded_at) if traded_at else datetime.now().isoformat(timespec='seconds'),
+            'note': note
+        }
+        conn = self._conn()
+        with Transaction(conn):
+            cursor = conn.execute("INSERT INTO trades (symbol, side, quantity, price, fees, sector, traded_at, note) "
+                                  "VALUES (:symbol, :side, :quantity, :price, :fees, :sector, :traded_at, :note)", trade)
+            trade['id'] = cursor.lastrowid
+            # Validate the symbol's whole history with the new trade in place
+            build_lots([dict(row) for row in conn.execute(
+                "SELECT * FROM trades WHERE symbol = ? ORDER BY traded_at, id", (trade['symbol'],))])
+            self._bump_version(conn)
+        return trade
+
+    def delete_trade(self, trade_id):
+        """Remove a trade; rejected if a later sell would then exceed the holding"""
+        conn = self._conn()
+        with Transaction(conn):
+            row = conn.execute("SELECT symbol FROM trades WHERE id = ?", (trade_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM trades WHERE id = ?", (trade_id,))
+            build_lots([dict(r) for r in conn.execute(
+                "SELECT * FROM trades WHERE symbol = ? ORDER BY traded_at, id", (row['symbol'],))])
+            self._bump_version(conn)
+        return True
+
+    # Positions
+
+    def _ensure_positions(self):
+        """Rebuild position arrays if any worker changed the trades"""
+        version = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        with self._lock:
+            if version == self._version:
+                return
+            trades = self.trades()
+            open_lots, realized = build_lots(trades)
+            sectors = {}
+            for trade in trades:
+                if trade['sector']:
+                    sectors[trade['symbol']] = trade['sector']
+
+            symbols = sorted(open_lots)
+            self._symbols = symbols
+            self._lots = open_lots
+            self._realized = realized
+            self._sectors = np.array([sectors.get(symbol, 'Unknown') for symbol in symbols], dtype=object)
+            self._quantity = np.array([sum(lot['quantity'] for lot in open_lots[s]) for s in symbols])
+            self._cost = np.array([sum(lot['quantity'] * lot['unit_cost'] for lot in open_lots[s]) for s in symbols])
+            self._slots = self.price_cache.resolve(symbols)
+            self._version = version
+
+    def symbols(self):
+        """Symbols with an open position"""
+        self._ensure_positions()
+        return list(self._symbols)
+
+    def lots(self, symbol=None):
+        self._ensure_positions()
+        return {s: lots for s, lots in self._lots.items() if symbol is None or s == symbol}
+
+    def valuation(self):
+        """Mark every open position to the cached prices in one pass.
+
+        Positions without a cached price are carried at cost and listed under
+        totals.missing_prices.
+        """
+        self._ensure_positions()
+        with self._lock:
+            symbols, sectors, quantity, cost = self._symbols, self._sectors, self._quantity, self._cost
+            prices, updated, sources = self.price_cache.take(self._slots)
+            realized = dict(self._realized)
+            lot_counts = [len(self._lots[s]) for s in symbols]
+
+        missing = np.isnan(prices)
+        avg_cost = np.divide(cost, quantity, out=np.zeros_like(cost), where=quantity > 0)
+        marked = np.where(missing, avg_cost, prices)
+        value = quantity * marked
+        unrealized = value - cost
+        total_value = float(value.sum())
+        weight = value / total_value if total_value else np.zeros_like(value)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unrealized_pct = np.where(cost > 0, unrealized / cost * 100, 0.0)
+
+        exposure = {}
+        if symbols:
+            sector_names, sector_codes = np.unique(sectors.astype(str), return_inverse=True)
+            sector_value = np.bincount(sector_codes, weights=value, minlength=len(sector_names))
+            sector_pnl = np.bincount(sector_codes, weights=unrealized, minlength=len(sector_names))
+            for name, sector_total, pnl in zip(sector_names.tolist(), sector_value.tolist(), sector_pnl.tolist()):
+                exposure[name] = {
+                    'market_value': round(sector_total, 2),
+                    'weight': round(sector_total / total_value * 100, 2) if total_value else 0.0,
+                    'unrealized_pnl': round(pnl, 2)
+                }
+
+        signals = self.signals()
+        positions = []
+        for i, symbol in enumerate(symbols):
+            signal = signals.get(symbol, {})
+            positions.append({
+                'symbol': symbol,
+                'sector': sectors[i],
+                'quantity': float(quantity[i]),
+                'lots': lot_counts[i],
+                'avg_cost': round(float(avg_cost[i]), 2),
+                'cost_basis': round(float(cost[i]), 2),
+                'price': None if missing[i] else round(float(prices[i]), 2),
+                'price_source': sources[i],
+                'price_time': datetime.fromtimestamp(updated[i]).isoformat(timespec='seconds') if updated[i] else None,
+                'market_value': round(float(value[i]), 2),
+                'unrealized_pnl': round(float(unrealized[i]), 2),
+                'unrealized_pct': round(float(unrealized_pct[i]), 2),
+                'weight': round(float(weight[i]) * 100, 2),
+                'realized_pnl': round(realized.get(symbol, 0.0), 2),
+                'recommendation': signal.get('recommendation'),
+                'flagged': bool(signal.get('flagged'))
+            })
+
+        total_cost = float(cost.sum())
+        total_unrealized = float(unrealized.sum())
+        total_realized = float(sum(realized.values()))
+        return {
+            'positions': positions,
+            'exposure': exposure,
+            'totals': {
+                'positions': len(symbols),
+                'cost_basis': round(total_cost, 2),
+                'market_value': round(total_value, 2),
+                'unrealized_pnl': round(total_unrealized, 2),
+                'unrealized_pct': round(total_unrealized / total_cost * 100, 2) if total_cost else 0.0,
+                'realized_pnl': round(total_realized, 2),
+                'total_pnl': round(total_unrealized + total_realized, 2),
+                'missing_prices': [symbol for symbol, gap in zip(symbols, missing.tolist()) if gap]
+            },
+            'flags': [signal for signal in signals.values() if signal['flagged'] and signal['symbol'] in symbols]
+        }
+
+    # Scan signals
+
+    def signals(self):
+        rows = self._conn().execute("SELECT * FROM signals").fetchall()
+        return {row['symbol']: {**dict(row), 'flagged': bool(row['flagged'])} for row in rows}
+
+    def update_recommendations(self, recommendations, scan_id=None):
+        """Store the latest scan's recommendations; returns held symbols that flipped to AVOID"""
+        held = set(self.symbols())
+        now = datetime.now().isoformat(timespec='seconds')
+        flipped = []
+        conn = self._conn()
+        with Transaction(conn):
+            previous = {row['symbol']: row for row in conn.execute("SELECT * FROM signals")}
+            rows = []
+            for symbol, recommendation in recommendations.items():
+                before = previous.get(symbol)
+                old = before['recommendation'] if before else None
+                flagged = before['flagged'] if before and recommendation == AVOID else 0
+                if recommendation == AVOID and old != AVOID and symbol in held:
+                    flagged = 1
+                    flipped.append({'symbol': symbol, 'recommendation': recommendation, 'previous': old})
+                rows.append((symbol, recommendation, old, scan_id, now, flagged))
+            conn.executemany("INSERT INTO signals (symbol, recommendation, previous, scan_id, updated_at, flagged) "
+                             "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(symbol) DO UPDATE SET "
+                             "recommendation = excluded.recommendation, previous = excluded.previous, "
+                             "scan_id = excluded.scan_id, updated_at = excluded.updated_at, "
+                             "flagged = excluded.flagged", rows)
+        return flipped
+
+    def clear_flag(self, symbol):
+        conn = self._conn()
+        with Transaction(conn):
+            return conn.execute("UPDATE signals SET flagged = 0 WHERE symbol = ?", (symbol,)).rowcount > 0
+
@@ -0,0 +1,72 @@
+"""Latest known price per symbol, shared by scans, live mode and the portfolio.
+
+Prices live in flat numpy arrays with a stable slot per symbol, so a consumer
+that resolves its symbols to slots once can revalue everything with a single
+gather (cache.take(slots)) instead of a dict lookup or fetch per symbol.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class PriceCache:
+    """Symbol -> (price, updated_at, source) in growable arrays"""
+
+    def __init__(self, capacity=1024):
+        self._index = {}
+        self._prices = np.full(capacity, np.nan)
+        self._updated = np.zeros(capacity)
+        self._sources = [None] * capacity
+        self._lock = threading.Lock()
+
+    def _slot(self, symbol):
+        """Slot for symbol, allocating one (NaN price) if new - caller holds the lock"""
+        slot = self._index.get(symbol)
+        if slot is None:
+            slot = len(self._index)
+            if slot >= len(self._prices):
+                grow = len(self._prices)
+                self._prices = np.concatenate([self._prices, np.full(grow, np.nan)])
+                self._updated = np.concatenate([self._updated, np.zeros(grow)])
+                self._sources.extend([None] * grow)
+            self._index[symbol] = slot
+        return slot
+
+    def update(self, prices, source=None, updated_at=None):
+        """Record {symbol: price}; missing or non-positive prices are ignored"""
+        updated_at = updated_at or time.time()
+        with self._lock:
+            for symbol, price in prices.items():
+                if price is None or not price > 0:
+                    continue
+                slot = self._slot(symbol)
+                self._prices[slot] = price
+                self._updated[slot] = updated_at
+                self._sources[slot] = source
+
+    def resolve(self, symbols):
+        """Stable slots for symbols (unknown symbols get an empty slot)"""
+        with self._lock:
+            return np.array([self._slot(symbol) for symbol in symbols], dtype=np.intp)
+
+    def take(self, slots):
+        """Prices (NaN if unknown), update times (0 if never) and sources for resolved slots"""
+        with self._lock:
+            return self._prices[slots], self._updated[slots], [self._sources[slot] for slot in slots]
+
+    def get(self, symbol):
+        with self._lock:
+            slot = self._index.get(symbol)
+            if slot is None or np.isnan(self._prices[slot]):
+                return None
+            return float(self._prices[slot])
+
+    def stale(self, symbols, max_age):
+        """Symbols with no price or one older than max_age seconds"""
+        prices, updated, _ = self.take(self.resolve(symbols))
+        old = np.isnan(prices) | (updated < time.time() - max_age)
+        return [symbol for symbol, is_old in zip(symbols, old.tolist()) if is_old]
+
+    def __len__(self):
+        return int((~np.isnan(self._prices[:len(self._index)])).sum())
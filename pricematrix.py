@@ -0,0 +1,127 @@
+"""Memory-mapped price matrix shared by every process on the machine.
+
+A snapshot of the price store in one fixed-layout file:
+
+    magic 'PXMATRX1' | header length (uint64) | JSON header | padding
+    dates   int64[dates]                     days since 1970-01-01
+    bars    float32[symbols, dates, OHLCV]   NaN where a symbol has no bar
+
+Sections start on 64-byte boundaries. Readers map the file instead of
+loading it, so uvicorn workers, scan pools and the backtester share one copy
+in the page cache and opening it costs a header parse whatever its size.
+Snapshots are written to a temporary file and renamed into place, so a
+reader keeps a consistent view of the file it mapped until it refresh()es.
+
+    write_price_matrix('prices.pxm', symbols, dates, daily)   # daily: dates x symbols x OHLCV
+    matrix = PriceMatrix('prices.pxm')
+    matrix.data[matrix.index['TCS'], -20:, 3]                 # last 20 closes, zero-copy
+"""
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'PXMATRX1'
+ALIGN = 64
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def write_price_matrix(path, symbols, dates, daily, **meta):
+    """Write a (dates x symbols x OHLCV) array as a snapshot file, replacing path atomically"""
+    symbols = list(symbols)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    daily = np.asarray(daily)
+    if daily.shape != (len(dates), len(symbols), len(COLUMNS)):
+        raise ValueError(f"Expected {(len(dates), len(symbols), len(COLUMNS))} bars, got {daily.shape}")
+    header = json.dumps({'symbols': symbols, 'dates': len(dates), 'columns': list(COLUMNS),
+                         'dtype': 'float32', **meta}).encode()
+    dates_offset = _aligned(len(MAGIC) + 8 + len(header))
+    data_offset = _aligned(dates_offset + 8 * len(dates))
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        f.seek(dates_offset)
+        f.write(dates.astype('<i8').tobytes())
+        f.seek(data_offset)
+        # One symbol's history at a time, so the transposed copy never exists whole
+        for column in range(len(symbols)):
+            f.write(np.ascontiguousarray(daily[:, column], dtype='<f4').tobytes())
+    os.replace(temp, path)
+
+
+class PriceMatrix:
+    """A mapped snapshot: symbols, dates and a read-only (symbols x dates x OHLCV) float32 array"""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a price matrix snapshot")
+            length, = struct.unpack('<Q', f.read(8))
+            self.meta = json.loads(f.read(length))
+            self._stat = os.fstat(f.fileno())
+        self.symbols = self.meta['symbols']
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        n_dates = self.meta['dates']
+        dates_offset = _aligned(len(MAGIC) + 8 + length)
+        data_offset = _aligned(dates_offset + 8 * n_dates)
+        if n_dates:
+            self.dates = np.memmap(self.path, dtype='<i8', mode='r', offset=dates_offset,
+                                   shape=(n_dates,)).astype('datetime64[D]')
+        else:
+            self.dates = np.array([], dtype='datetime64[D]')
+        if n_dates and self.symbols:
+            self.data = np.memmap(self.path, dtype='<f4', mode='r', offset=data_offset,
+                                  shape=(len(self.symbols), n_dates, len(COLUMNS)))
+        else:
+            self.data = np.empty((len(self.symbols), n_dates, len(COLUMNS)), dtype=np.float32)
+
+    def changed(self):
+        """Whether a newer snapshot has replaced the file this one mapped"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def refresh(self):
+        """Map the latest snapshot if the file was replaced; True if it was"""
+        if not self.changed():
+            return False
+        self._open()
+        return True
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def window(self, symbol, bars=None):
+        """One symbol's bars as an OHLCV frame, like PriceStore.window()"""
+        values = self.data[self.index[symbol]]
+        dates = self.dates
+        present = ~np.isnan(values[:, 3])
+        dates, values = dates[present], values[present]
+        if bars is not None:
+            dates, values = dates[-bars:], values[-bars:]
+        return pd.DataFrame(values.astype(np.float64), index=pd.DatetimeIndex(dates, name='Date'),
+                            columns=list(COLUMNS))
+
+    def matrix(self, symbols=None, bars=None):
+        """(dates, dates x symbols x OHLCV) like PriceStore.matrix(); a transposed view (no copy) for every symbol"""
+        dates, data = self.dates, self.data
+        if bars is not None:
+            dates, data = dates[-bars:], data[:, -bars:]
+        if symbols is not None:
+            data = data[[self.index[symbol] for symbol in symbols]]
+        return dates, data.transpose(1, 0, 2)
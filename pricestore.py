@@ -0,0 +1,352 @@
+"""Daily bar store with corporate actions applied lazily on read.
+
+Bars are kept as fetched and never rewritten when a split, bonus or dividend
+happens; actions go in their own table with the price factor they imply for
+earlier bars. Reading a window applies every later action in one vectorized
+pass (searchsorted into the action dates plus a suffix product of factors),
+so RSI/SMA/HMA inputs stay continuous across a split without touching the
+stored history.
+
+Each bar carries a basis date: the date through which actions are already
+reflected in it. Bars from an adjusted source (yfinance history with
+auto_adjust) have the fetch's last date as basis, raw bars their own date,
+so re-fetching after an action never adjusts twice.
+
+Unlike PriceCache (latest price per symbol), this holds whole histories.
+write_snapshot() exports them as a memory-mapped matrix (pricematrix.py)
+that matrix() then reads from, in every process, until the store changes.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from pricematrix import PriceMatrix, write_price_matrix
+from state_store import Transaction
+
+ACTION_KINDS = ('split', 'bonus', 'dividend')
+
+PERIOD_BARS = {'5d': 5, '1mo': 22, '3mo': 66, '6mo': 130, '1y': 252, '2y': 504, '5y': 1260}
+
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+def _dates(index):
+    """Exchange-local calendar dates of a history index as datetime64[D]"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)  # yfinance stamps bars at local midnight
+    return index.values.astype('datetime64[D]')
+
+
+def action_factor(kind, value, previous_close=None):
+    """Multiplier for prices before the ex-date; None if it cannot be computed"""
+    if kind == 'split':
+        return 1.0 / value if value > 0 else None  # value = new shares per old share
+    if kind == 'bonus':
+        return 1.0 / (1.0 + value) if value > 0 else None  # value = bonus shares per share held
+    if kind == 'dividend':
+        if not previous_close or not 0 < value < previous_close:
+            return None
+        return 1.0 - value / previous_close
+    raise ValueError(f"Action kind must be one of {', '.join(ACTION_KINDS)}")
+
+
+class PriceStore:
+    """Raw daily bars plus a corporate-action table in SQLite"""
+
+    def __init__(self, path, snapshot_path=None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self._snapshot = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._version = None
+        self._symbols = {}  # symbol -> arrays, dropped whenever any worker writes
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS bars (symbol TEXT NOT NULL, date TEXT NOT NULL, open REAL, "
+                     "high REAL, low REAL, close REAL NOT NULL, volume REAL, basis TEXT NOT NULL, "
+                     "PRIMARY KEY (symbol, date))")
+        conn.execute("CREATE TABLE IF NOT EXISTS actions (symbol TEXT NOT NULL, ex_date TEXT NOT NULL, "
+                     "kind TEXT NOT NULL, value REAL NOT NULL, factor REAL NOT NULL, "
+                     "PRIMARY KEY (symbol, ex_date, kind))")
+        conn.execute("CREATE TABLE IF NOT EXISTS fetches (symbol TEXT PRIMARY KEY, fetched_at REAL NOT NULL, "
+                     "bars INTEGER NOT NULL DEFAULT 0)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    def _conn(self):
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump_version(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def _current_version(self, conn):
+        """Version of the store, dropping cached arrays if another writer moved it on"""
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        with self._lock:
+            if version != self._version:
+                self._symbols.clear()
+                self._version = version
+        return version
+
+    @staticmethod
+    def _build(rows, actions):
+        """(dates, ohlcv, basis, action dates, price factors, volume factors) from bar and action rows"""
+        dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        ohlcv = np.array([row[1:6] for row in rows], dtype=np.float64).reshape(len(rows), 5)
+        basis = np.array([row[6] for row in rows], dtype='datetime64[D]')
+        action_dates = np.array([row[0] for row in actions], dtype='datetime64[D]')
+        factors = np.array([row[2] for row in actions], dtype=np.float64)
+        share_factors = np.array([row[2] if row[1] != 'dividend' else 1.0 for row in actions], dtype=np.float64)
+        return dates, ohlcv, basis, action_dates, factors, share_factors
+
+    def _arrays(self, symbol):
+        """Cached arrays for symbol, see _build()"""
+        conn = self._conn()
+        version = self._current_version(conn)
+        with self._lock:
+            cached = self._symbols.get(symbol)
+        if cached is not None:
+            return cached
+        rows = conn.execute("SELECT date, open, high, low, close, volume, basis FROM bars "
+                            "WHERE symbol = ? ORDER BY date", (symbol,)).fetchall()
+        actions = conn.execute("SELECT ex_date, kind, factor FROM actions WHERE symbol = ? ORDER BY ex_date",
+                               (symbol,)).fetchall()
+        cached = self._build(rows, actions)
+        with self._lock:
+            if self._version == version:
+                self._symbols[symbol] = cached
+        return cached
+
+    def _load(self, conn, symbols, since=None, chunk=500):
+        """Arrays (see _build) for many symbols with a few queries, bars from `since` on"""
+        loaded = {}
+        for start in range(0, len(symbols), chunk):
+            batch = symbols[start:start + chunk]
+            marks = ','.join('?' * len(batch))
+            rows = conn.execute(f"SELECT symbol, date, open, high, low, close, volume, basis FROM bars "
+                                f"WHERE symbol IN ({marks}) AND date >= ? ORDER BY symbol, date",
+                                (*batch, str(since) if since is not None else '')).fetchall()
+            actions = conn.execute(f"SELECT symbol, ex_date, kind, factor FROM actions "
+                                   f"WHERE symbol IN ({marks}) ORDER BY symbol, ex_date", batch).fetchall()
+            action_rows = {}
+            for row in actions:
+                action_rows.setdefault(row[0], []).append(row[1:])
+            built = {symbol: self._build((), action_rows.get(symbol, ())) for symbol in batch}
+            if rows:
+                # Column-wise conversion, then split per symbol at the boundaries of the sorted result
+                names, dates, *values, basis = zip(*rows)
+                names = np.array(names)
+                dates = np.array(dates, dtype='datetime64[D]')
+                ohlcv = np.array(values, dtype=np.float64).T
+                basis = np.array(basis, dtype='datetime64[D]')
+                starts = np.flatnonzero(np.append(True, names[1:] != names[:-1]))
+                for first, last in zip(starts, np.append(starts[1:], len(names))):
+                    symbol = str(names[first])
+                    built[symbol] = (dates[first:last], ohlcv[first:last], basis[first:last]) + built[symbol][3:]
+            loaded.update(built)
+        return loaded
+
+    def preload(self, symbols):
+        """Cache many symbols' full histories with a few queries instead of two per symbol"""
+        conn = self._conn()
+        version = self._current_version(conn)
+        with self._lock:
+            missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._symbols]
+        loaded = self._load(conn, missing)
+        with self._lock:
+            if self._version == version:
+                self._symbols.update(loaded)
+
+    # Writes
+
+    def ingest(self, symbol, frame, adjusted=True, requested_bars=0):
+        """Store bars from a history frame that are newer than (or replace) the last stored bar,
+        or older than the first (backfill).
+
+        Dividends / Stock Splits columns, when present, are recorded as actions.
+        adjusted=True means the frame already reflects its own actions (yfinance's
+        default), so its bars get the frame's last date as basis. requested_bars is
+        the length of history the fetch asked for, see last_fetch().
+        Returns the number of bars written.
+        """
+        if frame is None or frame.empty:
+            self._record_fetch(self._conn(), symbol, requested_bars)
+            return 0
+        dates = _dates(frame.index)
+        values = frame.reindex(columns=list(COLUMNS)).to_numpy(dtype=np.float64)
+        closes = values[:, 3]
+        conn = self._conn()
+        with Transaction(conn):
+            first, last = conn.execute("SELECT MIN(date), MAX(date) FROM bars WHERE symbol = ?", (symbol,)).fetchone()
+            keep = ~np.isnan(closes)
+            if last is not None:
+                keep &= (dates >= np.datetime64(last)) | (dates < np.datetime64(first))
+            basis = np.full(len(dates), dates[-1]) if adjusted else dates
+            conn.executemany(
+                "INSERT OR REPLACE INTO bars (symbol, date, open, high, low, close, volume, basis) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(symbol, str(date), *(None if np.isnan(v) else float(v) for v in row), str(b))
+                 for date, row, b in zip(dates[keep], values[keep], basis[keep])])
+
+            for column, kind in (('Stock Splits', 'split'), ('Dividends', 'dividend')):
+                if column not in frame.columns:
+                    continue
+                amounts = frame[column].to_numpy(dtype=np.float64)
+                for i in np.flatnonzero(amounts > 0):
+                    previous_close = self._previous_close(conn, symbol, dates[i], dates[:i], closes[:i])
+                    factor = action_factor(kind, float(amounts[i]), previous_close)
+                    if factor is not None:
+                        conn.execute("INSERT OR IGNORE INTO actions (symbol, ex_date, kind, value, factor) "
+                                     "VALUES (?, ?, ?, ?, ?)", (symbol, str(dates[i]), kind, float(amounts[i]), factor))
+            self._record_fetch(conn, symbol, requested_bars)
+            self._bump_version(conn)
+        return int(keep.sum())
+
+    @staticmethod
+    def _record_fetch(conn, symbol, requested_bars):
+        conn.execute("INSERT INTO fetches (symbol, fetched_at, bars) VALUES (?, ?, ?) ON CONFLICT(symbol) DO UPDATE "
+                     "SET fetched_at = excluded.fetched_at, bars = MAX(bars, excluded.bars)",
+                     (symbol, time.time(), int(requested_bars)))
+
+    @staticmethod
+    def _previous_close(conn, symbol, ex_date, frame_dates, frame_closes):
+        """Close on the bar before ex_date, from the frame if it has one, else the store"""
+        before = np.flatnonzero(~np.isnan(frame_closes) & (frame_dates < ex_date))
+        if len(before):
+            return float(frame_closes[before[-1]])
+        row = conn.execute("SELECT close FROM bars WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT 1",
+                           (symbol, str(ex_date))).fetchone()
+        return row[0] if row else None
+
+    def add_action(self, symbol, ex_date, kind, value):
+        """Record a split (new shares per old), bonus (bonus shares per share) or dividend (per share)"""
+        ex_date = np.datetime64(pd.Timestamp(ex_date).date(), 'D')
+        conn = self._conn()
+        with Transaction(conn):
+            previous_close = None
+            if kind == 'dividend':
+                previous_close = self._previous_close(conn, symbol, ex_date, np.array([], dtype='datetime64[D]'),
+                                                      np.array([]))
+            factor = action_factor(kind, float(value), previous_close)
+            if factor is None:
+                raise ValueError(f"Cannot derive an adjustment for {kind} {value} on {ex_date}")
+            conn.execute("INSERT OR REPLACE INTO actions (symbol, ex_date, kind, value, factor) VALUES (?, ?, ?, ?, ?)",
+                         (symbol, str(ex_date), kind, float(value), factor))
+            self._bump_version(conn)
+        return factor
+
+    # Reads
+
+    @staticmethod
+    def _adjust(arrays, bars=None, adjusted=True):
+        """(dates, ohlcv) for the last `bars` bars of loaded arrays, adjusted for every later action"""
+        dates, ohlcv, basis, action_dates, factors, share_factors = arrays
+        if bars is not None:
+            dates, ohlcv, basis = dates[-bars:], ohlcv[-bars:], basis[-bars:]
+        ohlcv = ohlcv.copy()
+        if adjusted and len(action_dates):
+            # Actions dated after both the bar and its basis still apply to it
+            first = np.searchsorted(action_dates, np.maximum(dates, basis), side='right')
+            price = np.append(np.cumprod(factors[::-1])[::-1], 1.0)[first]
+            shares = np.append(np.cumprod(share_factors[::-1])[::-1], 1.0)[first]
+            ohlcv[:, :4] *= price[:, np.newaxis]
+            ohlcv[:, 4] /= shares
+        return dates, ohlcv
+
+    def window(self, symbol, bars=None, adjusted=True):
+        """Last `bars` daily bars (all if None) as an OHLCV frame, adjusted for every later action"""
+        dates, ohlcv = self._adjust(self._arrays(symbol), bars, adjusted)
+        return pd.DataFrame(ohlcv, index=pd.DatetimeIndex(dates, name='Date'), columns=list(COLUMNS))
+
+    def matrix(self, symbols, bars=None, adjusted=True):
+        """(dates, dates x symbols x OHLCV) for many symbols aligned on the union of their dates, NaN where
+        a symbol has no bar - the universe-wide counterpart of window(), reading only the bars it needs.
+
+        Served from the mapped snapshot when it is current and covers the request (float32 precision)."""
+        symbols = list(symbols)
+        snapshot = self._mapped(self._current_version(self._conn())) if adjusted else None
+        if snapshot is not None and all(symbol in snapshot for symbol in symbols) and \
+                (snapshot.meta.get('bars') is None or (bars is not None and bars <= snapshot.meta['bars'])):
+            dates, daily = snapshot.matrix(symbols)
+            present = ~np.all(np.isnan(daily[..., 3]), axis=1)  # dates on which none of these symbols traded
+            dates, daily = dates[present], daily[present]
+            if bars is not None:
+                dates, daily = dates[-bars:], daily[-bars:]
+            return dates, daily.astype(np.float64)
+        return self._stored_matrix(symbols, bars, adjusted)
+
+    def _stored_matrix(self, symbols, bars=None, adjusted=True):
+        """matrix() read from the database"""
+        symbols = list(symbols)
+        conn = self._conn()
+        since = None
+        if bars is not None:
+            latest = conn.execute("SELECT MAX(date) FROM bars").fetchone()[0]
+            if latest is not None:  # comfortably more than `bars` sessions back
+                since = np.datetime64(latest) - np.timedelta64(bars * 7 // 5 + 14, 'D')
+        loaded = self._load(conn, list(dict.fromkeys(symbols)), since)
+        windows = [self._adjust(loaded[symbol], bars, adjusted) for symbol in symbols]
+        dates = np.unique(np.concatenate([window[0] for window in windows])) if windows else \
+            np.array([], dtype='datetime64[D]')
+        if bars is not None:
+            dates = dates[-bars:]
+        daily = np.full((len(dates), len(symbols), 5), np.nan)
+        for column, (symbol_dates, ohlcv) in enumerate(windows):
+            inside = np.isin(symbol_dates, dates)
+            daily[np.searchsorted(dates, symbol_dates[inside]), column] = ohlcv[inside]
+        return dates, daily
+
+    # Shared snapshot
+
+    def write_snapshot(self, path=None, symbols=None, bars=None):
+        """Export adjusted bars of symbols (default every stored symbol), the last `bars` dates (default all),
+        as a memory-mapped matrix file. Returns (symbols, dates) written."""
+        path = path or self.snapshot_path
+        conn = self._conn()
+        version = self._current_version(conn)
+        if symbols is None:
+            symbols = [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM bars ORDER BY symbol")]
+        dates, daily = self._stored_matrix(list(symbols), bars)
+        write_price_matrix(path, symbols, dates, daily, store_version=version, bars=bars)
+        return len(symbols), len(dates)
+
+    def _mapped(self, version):
+        """The mapped snapshot if it was written at this version of the store, else None"""
+        if not self.snapshot_path:
+            return None
+        with self._lock:
+            try:
+                if self._snapshot is None and os.path.exists(self.snapshot_path):
+                    self._snapshot = PriceMatrix(self.snapshot_path)
+                elif self._snapshot is not None:
+                    self._snapshot.refresh()
+            except (OSError, ValueError):
+                self._snapshot = None
+            snapshot = self._snapshot
+        return snapshot if snapshot is not None and snapshot.meta.get('store_version') == version else None
+
+    def last_date(self, symbol):
+        dates = self._arrays(symbol)[0]
+        return dates[-1] if len(dates) else None
+
+    def last_fetch(self, symbol):
+        """(time of the last ingest, longest history requested so far) - (None, 0) if never fetched"""
+        row = self._conn().execute("SELECT fetched_at, bars FROM fetches WHERE symbol = ?", (symbol,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def actions(self, symbol):
+        rows = self._conn().execute("SELECT ex_date, kind, value, factor FROM actions WHERE symbol = ? "
+                                    "ORDER BY ex_date", (symbol,)).fetchall()
+        return [dict(zip(('ex_date', 'kind', 'value', 'factor'), row)) for row in rows]
@@ -0,0 +1,91 @@
+"""Where each field of a stock record came from, and how fresh it is.
+
+Every record the scan builds carries
+
+    provenance   {field: source}   'missing' where the source had no value
+                                   (the record then holds a 0 or 1.0 default)
+    as_of        {source: date}    the date the source's data describes
+
+Sources are the data_source labels: yfinance_info, yfinance_fast_info,
+yfinance_history and yfinance_technical are real; sample_data,
+generated_sample and generated_technical are made up. In strict mode
+(CONFIG['strict_real_data']) the scan never produces the made-up ones, and
+stages check provenance before spending work on a record: a record without
+enough real fields raises IncompleteData and is skipped, a symbol no source
+could fetch this time raises DataUnavailable and is retried later.
+"""
+MISSING = 'missing'
+SYNTHETIC_SOURCES = ('sample_data', 'generated_sample', 'generated_technical')
+
+# Fundamental fields and the yfinance info keys they are read from (see parse_yfinance_info)
+INFO_FIELDS = {
+    'current_price': ('currentPrice', 'regularMarketPrice'),
+    'market_cap_cr': ('marketCap',),
+    'pe_ratio': ('trailingPE',),
+    'pb_ratio': ('priceToBook',),
+    'roe': ('returnOnEquity',),
+    'roa': ('returnOnAssets',),
+    'debt_to_equity': ('debtToEquity',),
+    'current_ratio': ('currentRatio',),
+    'revenue_growth': ('revenueGrowth',),
+    'earnings_growth': ('earningsGrowth',),
+    'profit_margin': ('profitMargins',),
+    'operating_margin': ('operatingMargins',),
+    'dividend_yield': ('dividendYield',),
+    'beta': ('beta',),
+    'eps': ('trailingEps',),
+    'book_value': ('bookValue',),
+    '52_week_high': ('fiftyTwoWeekHigh',),
+    '52_week_low': ('fiftyTwoWeekLow',),
+}
+FIELDS = tuple(INFO_FIELDS)
+
+# What the fundamental score reads besides the price
+SCORE_FIELDS = ('pe_ratio', 'roe', 'debt_to_equity', 'current_ratio', 'revenue_growth', 'profit_margin')
+
+
+class IncompleteData(Exception):
+    """A record lacks real values a stage needs; the stage skips it instead of scoring defaults"""
+
+    def __init__(self, symbol, reason, fields=()):
+        super().__init__(f"{symbol}: {reason}")
+        self.symbol = symbol
+        self.reason = reason
+        self.fields = list(fields)
+
+
+class DataUnavailable(IncompleteData):
+    """Every source failed for the symbol this time; worth another attempt later"""
+
+
+def stamp(record, source, real=None, fields=FIELDS, as_of=None):
+    """Record that the real fields of record (default all of fields) came from source as of a date;
+    the rest of fields hold defaults and are marked missing"""
+    real = set(fields if real is None else real)
+    record['provenance'] = {**record.get('provenance', {}),
+                            **{field: source if field in real else MISSING for field in fields}}
+    record['as_of'] = {**record.get('as_of', {}), source: None if as_of is None else str(as_of)}
+    return record
+
+
+def info_fields(info):
+    """Fields parse_yfinance_info fills from a value yfinance actually returned"""
+    return [field for field, keys in INFO_FIELDS.items() if any(info.get(key) is not None for key in keys)]
+
+
+def is_real(source):
+    return source not in (MISSING, None) and source not in SYNTHETIC_SOURCES
+
+
+def real_fields(record, fields=FIELDS):
+    """Fields of record with a real source; a record without provenance has none"""
+    provenance = record.get('provenance', {})
+    return [field for field in fields if is_real(provenance.get(field))]
+
+
+def merge(*records):
+    """Provenance and as_of of several records combined, later records winning per field"""
+    return {
+        'provenance': {field: source for record in records for field, source in record.get('provenance', {}).items()},
+        'as_of': {source: date for record in records for source, date in record.get('as_of', {}).items()},
+    }
@@ -0,0 +1,71 @@
+"""Rank indexes over scan results for top-N queries.
+
+A RankIndex keeps, for every numeric column of the rows it holds, a sorted
+array of (-value, symbol) keys. Each row is inserted with one binary search
+per column as its symbol finishes scoring, so a top-N query on any column is
+a slice - available while a scan is still running, not only once it is
+sorted at the end. Ties rank by symbol.
+
+    index = RankIndex()
+    index.add({'symbol': 'TCS', 'final_score': 71.5, 'rsi': 54.2})
+    index.top('rsi', 20)
+"""
+import bisect
+import numbers
+import threading
+
+
+def _rankable(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and value == value  # not NaN
+
+
+class RankIndex:
+    """Rows keyed by symbol plus a sorted key array per numeric column"""
+
+    def __init__(self, key=None):
+        self._lock = threading.Lock()
+        self.reset(key)
+
+    def reset(self, key=None):
+        """Drop every row; key identifies what the index holds (e.g. a scan id)"""
+        with self._lock:
+            self.key = key
+            self._rows = {}
+            self._sorted = {}  # column -> sorted [(-value, symbol)]
+
+    def add(self, row):
+        """Insert a row, replacing any earlier row for the same symbol"""
+        symbol = row['symbol']
+        with self._lock:
+            previous = self._rows.get(symbol)
+            if previous is not None:
+                for column, value in previous.items():
+                    if _rankable(value):
+                        keys = self._sorted[column]
+                        del keys[bisect.bisect_left(keys, (-value, symbol))]
+            self._rows[symbol] = row
+            for column, value in row.items():
+                if _rankable(value):
+                    bisect.insort(self._sorted.setdefault(column, []), (-value, symbol))
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def top(self, column, n=20, ascending=False):
+        """The n rows with the highest (or lowest) value in column; KeyError for an unknown column"""
+        with self._lock:
+            keys = self._sorted.get(column)
+            if keys is None:
+                if self._rows:
+                    raise KeyError(column)
+                return []  # nothing scored yet
+            selected = keys[max(len(keys) - n, 0):][::-1] if ascending else keys[:n]
+            return [self._rows[symbol] for _, symbol in selected]
+
+    def columns(self):
+        with self._lock:
+            return sorted(self._sorted)
+
+    def __len__(self):
+        return len(self._rows)
@@ -0,0 +1,234 @@
+"""Adaptive pacing for upstream requests, and a retry queue for throttled work.
+
+A fixed sleep between Yahoo requests is too slow when Yahoo is idle and too
+fast once it starts answering 429. RateController learns the limit instead,
+AIMD-style: every quick success raises the request rate by a fixed step and
+opens the concurrency window a little (additive); a 429 halves both and
+pauses everyone for Retry-After or the new gap (multiplicative), at most once
+per burst of throttled responses. Responses slower than the target latency
+shrink the window gently before Yahoo starts refusing.
+
+run_with_retries() runs work over many items; items throttled upstream go on
+a RetryQueue and run again after a jittered exponential backoff. Items still
+throttled after the last attempt are reported as failures, never replaced.
+
+    controller = RateController(delay=0.3)
+    with controller.request():
+        info = ticker.info        # a 429 here raises RateLimited
+"""
+import heapq
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+
+_RATE_LIMIT_TEXT = re.compile(r'RateLimit|Rate limited|Too Many Requests|\b429\b')
+
+
+class RateLimited(Exception):
+    """The upstream refused a request for rate limiting; retry_after is its hint in seconds, if any"""
+
+    def __init__(self, message='rate limited', retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(exc):
+    """Whether an exception from requests/yfinance means HTTP 429 or Yahoo's rate-limit error"""
+    if isinstance(exc, RateLimited):
+        return True
+    if getattr(getattr(exc, 'response', None), 'status_code', None) == 429:
+        return True
+    return bool(_RATE_LIMIT_TEXT.search(f"{type(exc).__name__} {exc}"))
+
+
+def retry_after(exc):
+    """Seconds from a Retry-After header on the exception's response, None without one"""
+    if isinstance(exc, RateLimited):
+        return exc.retry_after
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return max(float(headers.get('Retry-After')), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, rng=random):
+    """Full-jitter exponential backoff: uniform over [0, min(cap, base * 2**attempt)]"""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateController:
+    """Shared request pacing: a concurrency window and a minimum gap between request starts"""
+
+    def __init__(self, delay=0.3, min_delay=0.01, max_delay=30.0, concurrency=2, max_concurrency=8,
+                 target_latency=2.0, rate_step=0.5, decrease=0.5):
+        self.min_delay, self.max_delay = min_delay, max_delay
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.rate_step = rate_step  # requests/second added per quick success
+        self.decrease = decrease
+        self._cond = threading.Condition()
+        self.reset(delay, concurrency)
+
+    def reset(self, delay=None, concurrency=None):
+        """Start learning again from delay seconds between requests and a concurrency window"""
+        with self._cond:
+            if delay is not None:
+                self.delay = min(delay, self.max_delay)  # 0 = unpaced until the first 429
+            if concurrency is not None:
+                self.concurrency = float(min(max(concurrency, 1), self.max_concurrency))
+            self._in_flight = getattr(self, '_in_flight', 0)
+            self._next_start = 0.0
+            self._paused_until = 0.0
+            self._last_decrease = float('-inf')
+            self.requests = self.throttled_requests = self.slow_requests = 0
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self):
+        """Wait for a slot, then time the request; a rate-limit error inside is re-raised as RateLimited"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait_for = max(self._next_start, self._paused_until) - now
+                if self._in_flight < int(self.concurrency) and wait_for <= 0:
+                    break
+                self._cond.wait(wait_for if wait_for > 0 else None)
+            self._in_flight += 1
+            self._next_start = now + self.delay
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limited(e):
+                self._throttled(retry_after(e))
+                if not isinstance(e, RateLimited):
+                    raise RateLimited(str(e), retry_after(e)) from e
+            raise
+        else:
+            self._succeeded(time.monotonic() - start)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self.requests += 1
+                self._cond.notify_all()
+
+    def _succeeded(self, latency):
+        with self._cond:
+            if latency > self.target_latency:
+                self.slow_requests += 1
+                if self._decrease_allowed():
+                    self.concurrency = max(1.0, self.concurrency * 0.75)
+                return
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            if self.delay > self.min_delay:
+                self.delay = max(self.min_delay, 1 / (1 / self.delay + self.rate_step))
+
+    def _throttled(self, hint=None):
+        with self._cond:
+            self.throttled_requests += 1
+            if self._decrease_allowed():
+                self.concurrency = max(1.0, self.concurrency * self.decrease)
+                self.delay = min(self.max_delay, max(self.delay / self.decrease, self.min_delay, 0.1))
+            pause = hint if hint is not None else self.delay
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def _decrease_allowed(self):
+        """One multiplicative decrease per burst: throttled requests already in flight don't compound it"""
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.delay, 1.0):
+            return False
+        self._last_decrease = now
+        return True
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'delay': round(self.delay, 3),
+                'concurrency': int(self.concurrency),
+                'in_flight': self._in_flight,
+                'paused_for': round(max(self._paused_until - time.monotonic(), 0.0), 3),
+                'requests': self.requests,
+                'throttled': self.throttled_requests,
+                'slow': self.slow_requests,
+            }
+
+
+class RetryQueue:
+    """Items waiting for another attempt, each ready after its own backoff"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def push(self, item, attempt, delay):
+        self._seq += 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, item, attempt))
+
+    def pop_ready(self):
+        """(item, attempt) pairs whose backoff has elapsed"""
+        now = time.monotonic()
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, item, attempt = heapq.heappop(self._heap)
+            ready.append((item, attempt))
+        return ready
+
+    def next_ready_in(self):
+        return max(self._heap[0][0] - time.monotonic(), 0.0) if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def run_with_retries(items, work, workers=8, retries=4, base_delay=1.0, max_delay=60.0,
+                     on_result=None, on_retry=None, on_failure=None, retry_on=(RateLimited,)):
+    """Run work(item) for every item on a thread pool, retrying items that raise RateLimited (or retry_on).
+
+    A throttled item goes back on a RetryQueue with a full-jitter backoff (at
+    least the upstream's Retry-After); after retries further attempts it is
+    passed to on_failure(item, error, attempts). Other exceptions fail the item
+    at once. on_result(item, value) and the other callbacks run on the calling
+    thread, in completion order. Returns ({item: value}, {item: error}).
+    """
+    results, failures = {}, {}
+    pending = [(item, 0) for item in items]
+    pending.reverse()
+    queue = RetryQueue()
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or queue or in_flight:
+            pending.extend(reversed(queue.pop_ready()))
+            while pending and len(in_flight) < workers:
+                item, attempt = pending.pop()
+                in_flight[pool.submit(work, item)] = (item, attempt)
+            if not in_flight:
+                time.sleep(queue.next_ready_in() or 0)
+                continue
+            done, _ = wait(in_flight, timeout=queue.next_ready_in(), return_when=FIRST_COMPLETED)
+            for future in done:
+                item, attempt = in_flight.pop(future)
+                try:
+                    value = future.result()
+                except retry_on as e:
+                    if attempt < retries:
+                        delay = max(backoff_delay(attempt, base_delay, max_delay), getattr(e, 'retry_after', None) or 0)
+                        queue.push(item, attempt + 1, delay)
+                        if on_retry:
+                            on_retry(item, e, attempt + 1, delay)
+                        continue
+                    failures[item] = e
+                except Exception as e:
+                    failures[item] = e
+                else:
+                    results[item] = value
+                    if on_result:
+                        on_result(item, value)
+                    continue
+                if on_failure:
+                    on_failure(item, failures[item], attempt + 1)
+    return results, failures
@@ -0,0 +1,282 @@
+"""Record yfinance responses once, replay them offline.
+
+RecordingSource wraps a ticker factory (yf.Ticker by default) and captures
+every info, fast_info and history(period, interval) response, including
+failures, into an Archive. ReplaySource serves an archive back as a ticker
+factory with no network, so a recorded scan can be rerun exactly and as
+fast as the scoring allows:
+
+    python replay.py record scan.npz --symbols A B C
+    SCAN_DATA_SOURCE=replay:scan.npz uvicorn app:app
+    python replay.py run scan.npz                    # time a full scan from the archive
+
+Archives are a single compressed .npz: a JSON index of responses plus all
+history bars packed into one float64 array, so loading is one read and no
+pickle is involved. Lookups missing from an archive raise ReplayMissError,
+which the scan treats like any other fetch failure. The archive also keeps
+the scanned universe, so a replay scans the same symbols - not the source
+test's probe symbol on top.
+"""
+import argparse
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+FAST_INFO_FIELDS = ('last_price', 'market_cap')
+
+
+class ReplayMissError(LookupError):
+    """Response was not recorded"""
+
+
+class RecordedError(Exception):
+    """A fetch failure captured while recording, raised again on replay"""
+
+
+def _scalar(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return value if isinstance(value, (int, float, str, bool)) or value is None else None
+
+
+class Archive:
+    """Recorded responses keyed by symbol and call"""
+
+    def __init__(self):
+        self.responses = {}  # key -> {'value': ...} or {'error': message}
+        self.histories = {}  # key -> DataFrame
+        self.universe = None  # symbols the recorded scan covered, None for archives without it
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(symbol, kind, *args):
+        return '|'.join((symbol, kind) + tuple(str(arg) for arg in args))
+
+    def put(self, key, value=None, error=None):
+        with self._lock:
+            if isinstance(value, pd.DataFrame):
+                self.histories[key] = value
+                self.responses[key] = {'history': True}
+            elif error is not None:
+                self.responses[key] = {'error': f"{type(error).__name__}: {error}"}
+            else:
+                self.responses[key] = {'value': value}
+
+    def get(self, key):
+        response = self.responses.get(key)
+        if response is None:
+            raise ReplayMissError(f"Not recorded: {key}")
+        if 'error' in response:
+            raise RecordedError(response['error'])
+        if 'history' in response:
+            return self.histories[key].copy()  # callers may add columns
+        return response['value']
+
+    def __len__(self):
+        return len(self.responses)
+
+    def symbols(self):
+        return sorted({key.split('|', 1)[0] for key in self.responses})
+
+    def save(self, path):
+        with self._lock:
+            index, blocks, offset = {}, [], 0
+            for key, frame in self.histories.items():
+                numeric = frame.select_dtypes(include='number')
+                values = numeric.to_numpy(dtype=np.float64)
+                stamps = frame.index
+                tz = str(stamps.tz) if getattr(stamps, 'tz', None) is not None else None
+                if tz:
+                    stamps = stamps.tz_convert('UTC').tz_localize(None)
+                index[key] = {
+                    'offset': offset, 'rows': values.shape[0], 'columns': list(numeric.columns),
+                    'dtypes': [str(dtype) for dtype in numeric.dtypes], 'tz': tz,
+                    'name': frame.index.name
+                }
+                blocks.append(np.column_stack([pd.DatetimeIndex(stamps).asi8.astype(np.float64), values]).ravel()
+                              if values.size else np.empty(0))
+                offset += values.shape[0] * (values.shape[1] + 1)
+            meta = json.dumps({'responses': self.responses, 'histories': index, 'universe': self.universe}).encode()
+            np.savez_compressed(path, meta=np.frombuffer(meta, dtype=np.uint8),
+                                bars=np.concatenate(blocks) if blocks else np.empty(0))
+
+    @classmethod
+    def load(cls, path):
+        archive = cls()
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes())
+            bars = data['bars']
+        archive.responses = meta['responses']
+        archive.universe = meta.get('universe')
+        for key, spec in meta['histories'].items():
+            width = len(spec['columns']) + 1
+            block = bars[spec['offset']:spec['offset'] + spec['rows'] * width].reshape(spec['rows'], width)
+            stamps = pd.DatetimeIndex(block[:, 0].astype(np.int64), name=spec['name'])
+            if spec['tz']:
+                stamps = stamps.tz_localize('UTC').tz_convert(spec['tz'])
+            frame = pd.DataFrame(block[:, 1:], index=stamps, columns=spec['columns'])
+            archive.histories[key] = frame.astype(dict(zip(spec['columns'], spec['dtypes'])))
+        return archive
+
+
+class RecordingTicker:
+    """Ticker wrapper that stores each response (or failure) in an archive"""
+
+    def __init__(self, ticker, symbol, archive):
+        self._ticker = ticker
+        self.symbol = symbol
+        self._archive = archive
+
+    def _record(self, key, fetch):
+        try:
+            value = fetch()
+        except Exception as e:
+            self._archive.put(key, error=e)
+            raise
+        self._archive.put(key, value)
+        return value
+
+    @property
+    def info(self):
+        info = self._record(Archive.key(self.symbol, 'info'),
+                            lambda: {k: v for k, v in self._ticker.info.items() if _scalar(v) is not None})
+        return dict(info)
+
+    @property
+    def fast_info(self):
+        def fetch():
+            fast_info = self._ticker.fast_info
+            fields = {}
+            for field in FAST_INFO_FIELDS:
+                try:
+                    fields[field] = _scalar(getattr(fast_info, field))
+                except Exception:
+                    fields[field] = None
+            return fields
+        return SimpleNamespace(**self._record(Archive.key(self.symbol, 'fast_info'), fetch))
+
+    def history(self, period='1mo', interval='1d'):
+        key = Archive.key(self.symbol, 'history', period, interval)
+        return self._record(key, lambda: self._ticker.history(period=period, interval=interval)).copy()
+
+
+class RecordingSource:
+    """Ticker factory that records everything fetched through it"""
+
+    def __init__(self, factory=None, archive=None, path=None):
+        if factory is None:
+            import yfinance as yf
+            factory = yf.Ticker
+        self.factory = factory
+        self.archive = archive if archive is not None else Archive()
+        self.path = path
+
+    def __call__(self, symbol):
+        return RecordingTicker(self.factory(symbol), symbol, self.archive)
+
+    def save(self, path=None, symbols=None):
+        """Write the archive; symbols is the universe the recorded scan covered"""
+        if symbols is not None:
+            self.archive.universe = [symbol.replace('.NS', '') for symbol in symbols]
+        self.archive.save(path or self.path)
+
+
+class ReplayTicker:
+    """yf.Ticker look-alike answering from an archive"""
+
+    def __init__(self, symbol, archive):
+        self.symbol = symbol
+        self._archive = archive
+
+    @property
+    def info(self):
+        return dict(self._archive.get(Archive.key(self.symbol, 'info')))
+
+    @property
+    def fast_info(self):
+        return SimpleNamespace(**self._archive.get(Archive.key(self.symbol, 'fast_info')))
+
+    def history(self, period='1mo', interval='1d'):
+        return self._archive.get(Archive.key(self.symbol, 'history', period, interval))
+
+
+class ReplaySource:
+    """Ticker factory serving a recorded archive"""
+
+    def __init__(self, path):
+        self.path = path
+        self.archive = Archive.load(path)
+        if self.archive.universe is not None:
+            self.symbols = list(self.archive.universe)
+        else:  # archive without a recorded universe: every symbol it holds responses for
+            self.symbols = [symbol.replace('.NS', '') for symbol in self.archive.symbols()
+                            if symbol.endswith('.NS')]
+
+    # Shard processes reload the archive from disk rather than receiving it pickled
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __call__(self, symbol):
+        return ReplayTicker(symbol, self.archive)
+
+
+def record_scan(symbols, path, factory=None):
+    """Run the scan's fetch paths for symbols through a recorder and save the archive; throttled symbols
+    are retried like in a scan, and symbols that still fail are logged and left out instead of aborting"""
+    import app
+    source = RecordingSource(factory)
+    app.set_ticker_factory(source)
+    try:
+        data_sources = app.test_data_sources()
+
+        def record(symbol):
+            app.get_stock_data_bulletproof(f"{symbol}.NS", data_sources)
+            app.calculate_technical_score_bulletproof(symbol)
+            return True
+        _, failures = app.run_with_retries(symbols, record, **app.retry_settings('record'))
+        for symbol, error in failures.items():
+            app.event_log.warning(f"Could not record {symbol}: {error}", stage='record', symbol=symbol)
+    finally:
+        app.set_ticker_factory(None)
+    source.save(path, symbols)
+    return source.archive
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay scan data")
+    sub = parser.add_subparsers(dest='command', required=True)
+    record = sub.add_parser('record', help="record yfinance responses for a scan")
+    record.add_argument('path')
+    record.add_argument('--symbols', nargs='+', required=True,
+                        help="symbols to record (the sample symbols are served from built-in data)")
+    run = sub.add_parser('run', help="run a full scan from an archive")
+    run.add_argument('path')
+    args = parser.parse_args(argv)
+
+    import app
+    if args.command == 'record':
+        symbols = args.symbols
+        start = time.perf_counter()
+        archive = record_scan(symbols, args.path)
+        print(f"✅ Recorded {len(archive)} responses for {len(symbols)} symbols to {args.path} "
+              f"in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    app.configure_data_source(f"replay:{args.path}")
+    symbols = app.default_universe()
+    start = time.perf_counter()
+    app.run_bulletproof_scan(symbols, f"replay_{int(time.time())}")
+    elapsed = time.perf_counter() - start
+    print(f"✅ Replayed scan of {len(symbols)} symbols in {elapsed:.2f}s ({len(symbols) / elapsed:.0f} symbols/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
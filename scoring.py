@@ -0,0 +1,85 @@
+"""Vectorized versions of the scan's scoring rules.
+
+fundamental_scores mirrors calculate_fundamental_score_bulletproof and
+technical_scores mirrors the real-data path of
+calculate_technical_score_bulletproof, but over arrays for a whole universe
+(and, for technicals, every date) at once. Keep the thresholds in step with
+app.py.
+"""
+import numpy as np
+
+import indicators
+
+GRADES = np.array(['A+', 'A', 'B+', 'B', 'C+', 'C', 'D'])
+
+
+def _field(fields, name, size):
+    """Field as float array with missing values as 0, like data.get(name, 0)"""
+    values = fields.get(name)
+    if values is None:
+        return np.zeros(size)
+    return np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+
+
+def fundamental_scores(fields, threshold=4):
+    """Score arrays of fundamentals; returns dict of score, grade and passed arrays"""
+    price = np.asarray(fields['current_price'], dtype=np.float64)
+    size = price.shape
+    pe = _field(fields, 'pe_ratio', size)
+    roe = _field(fields, 'roe', size)
+    debt_equity = _field(fields, 'debt_to_equity', size)
+    current_ratio = _field(fields, 'current_ratio', size)
+    revenue_growth = _field(fields, 'revenue_growth', size)
+    profit_margin = _field(fields, 'profit_margin', size)
+
+    score = np.full(size, 2.0)  # Base score for having data
+    score += np.select([(pe > 0) & (pe < 12), (pe >= 12) & (pe < 18), (pe >= 18) & (pe < 25),
+                        (pe >= 25) & (pe < 35), pe > 0], [2.0, 1.8, 1.4, 1.0, 0.5], 0.0)
+    score += np.select([roe > 20, roe > 15, roe > 10, roe > 5], [2.0, 1.5, 1.0, 0.5], 0.0)
+    score += np.select([debt_equity < 0.5, debt_equity < 1.0, debt_equity < 2.0], [1.0, 0.7, 0.4], 0.0)
+    score += np.select([current_ratio > 1.5, current_ratio > 1.0, current_ratio > 0.8], [1.0, 0.7, 0.4], 0.0)
+    score += np.select([revenue_growth > 15, revenue_growth > 10, revenue_growth > 5, revenue_growth > 0],
+                       [1.5, 1.0, 0.6, 0.3], 0.0)
+    score += np.select([profit_margin > 15, profit_margin > 10, profit_margin > 5], [0.5, 0.3, 0.2], 0.0)
+    score = np.minimum(score, 10)
+
+    has_data = np.nan_to_num(price, nan=0.0) != 0
+    score = np.where(has_data, score, 0.0)
+    grade_index = np.select([score >= 8.5, score >= 7.5, score >= 6.5, score >= 5.5, score >= 4.5, score >= 3.5],
+                            [0, 1, 2, 3, 4, 5], 6)
+    grade = np.where(has_data, GRADES[grade_index], 'F')
+    return {
+        'score': np.round(score, 1),
+        'grade': grade,
+        'passed': has_data & (score >= threshold)
+    }
+
+
+def combine_technical_score(close, trend, rsi, position):
+    """Technical score from precomputed SMA, RSI and price-position arrays"""
+    with np.errstate(invalid='ignore'):
+        score = np.full(np.shape(close), 50.0)  # Base score
+        score += np.where(close > trend, 15, 0)
+        score += np.select([(rsi >= 40) & (rsi <= 60), (rsi >= 30) & (rsi <= 70)], [20, 10], 0)
+        score += np.where((position >= 40) & (position <= 80), 15, 0)
+    return np.where(np.isnan(trend), np.nan, np.minimum(score, 100))
+
+
+def technical_scores(close, threshold=40, sma_period=20, rsi_period=14, range_period=20, buy_score=70):
+    """Technical score for every date and symbol of a close matrix.
+
+    Returns dict of float arrays: technical_score (NaN where fewer than
+    sma_period bars are available), rsi, and boolean buy / qualified masks.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    rsi = indicators.rsi(close, rsi_period)
+    score = combine_technical_score(close, indicators.sma(close, sma_period), rsi,
+                                    indicators.price_position(close, range_period))
+
+    with np.errstate(invalid='ignore'):
+        return {
+            'technical_score': score,
+            'rsi': rsi,
+            'buy': score >= buy_score,
+            'qualified': score >= threshold
+        }
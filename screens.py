@@ -0,0 +1,445 @@
+"""Screen expressions compiled to vectorized masks over the universe.
+
+    roe > 15 and pe_ratio < 25 and rsi between 40 and 60 and close > hma30
+
+An expression is parsed once into a tree of closures; running it evaluates
+each node as one NumPy operation over a ScreenTable (one array per column,
+one element per symbol), so a screen over thousands of symbols costs a few
+array passes. Missing values are NaN and never satisfy a comparison, not
+even != or 'not in'.
+
+Grammar (keywords are case-insensitive):
+
+    expr     := and ('or' and)*
+    and      := not ('and' not)*
+    not      := 'not' not | compare
+    compare  := sum [op sum | 'between' sum 'and' sum | ['not'] 'in' '(' value (',' value)* ')']
+    op       := '<' | '<=' | '>' | '>=' | '==' | '!='
+    sum      := product (('+' | '-') product)*
+    product  := unary (('*' | '/') unary)*
+    unary    := '-' unary | number | 'string' | true | false | name | '(' expr ')'
+
+Names are columns of the table - any numeric or text field of the scan
+results (roe, pe_ratio, rsi, final_score, sector, recommendation, ...) -
+plus columns computed from the daily close matrix when the table has one:
+close, sma<N>, ema<N>, hma<N>, rsi<N>, return<N> (percent over N bars),
+high<N> and low<N> (highest / lowest close over N bars).
+"""
+import json
+import os
+import re
+import threading
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+import indicators
+
+
+class ScreenError(ValueError):
+    """Invalid screen expression or screen"""
+
+
+KEYWORDS = ('and', 'or', 'not', 'between', 'in', 'true', 'false')
+COMPARISONS = {
+    '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+ARITHMETIC = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.true_divide}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><=|>=|==|!=|<|>|\+|-|\*|/|\(|\)|,)
+)""", re.VERBOSE)
+
+DERIVED = re.compile(r'^(sma|ema|hma|rsi|return|high|low)(\d+)$')
+
+
+def tokenize(expression):
+    tokens, position = [], 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None:
+            raise ScreenError(f"Unexpected character at {position}: {expression[position:position + 10]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'name' and text.lower() in KEYWORDS:
+            kind, text = 'keyword', text.lower()
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser producing closures table -> array (or scalar)"""
+
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = []
+
+    def peek(self, *texts):
+        if self.position < len(self.tokens) and self.tokens[self.position][1] in texts:
+            return self.tokens[self.position][1]
+        return None
+
+    def take(self, *texts):
+        text = self.peek(*texts)
+        if text is not None:
+            self.position += 1
+        return text
+
+    def expect(self, text):
+        if self.take(text) is None:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else 'end of expression'
+            raise ScreenError(f"Expected {text!r}, found {found!r}")
+
+    def parse(self):
+        if not self.tokens:
+            raise ScreenError("Empty screen expression")
+        node = self.logical_or()
+        if self.position < len(self.tokens):
+            raise ScreenError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return node
+
+    def logical_or(self):
+        node = self.logical_and()
+        while self.take('or'):
+            left, right = node, self.logical_and()
+            node = lambda table, left=left, right=right: np.logical_or(_mask(left(table)), _mask(right(table)))
+        return node
+
+    def logical_and(self):
+        node = self.logical_not()
+        while self.take('and'):
+            left, right = node, self.logical_not()
+            node = lambda table, left=left, right=right: np.logical_and(_mask(left(table)), _mask(right(table)))
+        return node
+
+    def logical_not(self):
+        if self.take('not'):
+            operand = self.logical_not()
+            return lambda table: np.logical_not(_mask(operand(table)))
+        return self.compare()
+
+    def compare(self):
+        left = self.arithmetic()
+        op = self.take(*COMPARISONS)
+        if op:
+            right = self.arithmetic()
+            return lambda table: _compare(COMPARISONS[op], left(table), right(table))
+        if self.take('between'):
+            low = self.arithmetic()
+            self.expect('and')
+            high = self.arithmetic()
+            return lambda table: np.logical_and(_compare(np.greater_equal, left(table), low(table)),
+                                                _compare(np.less_equal, left(table), high(table)))
+        negate = self.peek('not') and self.position + 1 < len(self.tokens) and self.tokens[self.position + 1][1] == 'in'
+        if negate:
+            self.take('not')
+        if self.take('in'):
+            self.expect('(')
+            values = [self.literal()]
+            while self.take(','):
+                values.append(self.literal())
+            self.expect(')')
+            if negate:  # like !=, a missing value is not "not in" anything
+                return lambda table: _present(left(table)) & ~np.isin(_filled(left(table)), values)
+            return lambda table: _present(left(table)) & np.isin(_filled(left(table)), values)
+        return left
+
+    def literal(self):
+        if self.position >= len(self.tokens):
+            raise ScreenError("Expected a value, found end of expression")
+        kind, text = self.tokens[self.position]
+        self.position += 1
+        if kind == 'number':
+            return float(text)
+        if kind == 'string':
+            return text[1:-1]
+        if text in ('true', 'false'):
+            return text == 'true'
+        if text == '-' and self.position < len(self.tokens) and self.tokens[self.position][0] == 'number':
+            self.position += 1
+            return -float(self.tokens[self.position - 1][1])
+        raise ScreenError(f"Expected a value, found {text!r}")
+
+    def arithmetic(self):
+        node = self.product()
+        while True:
+            op = self.take('+', '-')
+            if not op:
+                return node
+            left, right = node, self.product()
+            node = lambda table, op=op, left=left, right=right: _arithmetic(ARITHMETIC[op], left(table), right(table))
+
+    def product(self):
+        node = self.unary()
+        while True:
+            op = self.take('*', '/')
+            if not op:
+                return node
+            left, right = node, self.unary()
+            node = lambda table, op=op, left=left, right=right: _arithmetic(ARITHMETIC[op], left(table), right(table))
+
+    def unary(self):
+        if self.take('-'):
+            operand = self.unary()
+            return lambda table: _arithmetic(np.negative, operand(table))
+        if self.take('('):
+            node = self.logical_or()
+            self.expect(')')
+            return node
+        if self.position >= len(self.tokens):
+            raise ScreenError("Unexpected end of expression")
+        kind, text = self.tokens[self.position]
+        if kind == 'name':
+            self.position += 1
+            if text not in self.names:
+                self.names.append(text)
+            return lambda table: table.column(text)
+        value = self.literal()
+        return lambda table: value
+
+
+def _mask(value):
+    if isinstance(value, (bool, np.bool_)) or (isinstance(value, np.ndarray) and value.dtype == bool):
+        return value
+    raise ScreenError("'and', 'or' and 'not' need conditions, e.g. roe > 15")
+
+
+def _present(value):
+    """False where an operand is missing: NaN in a numeric column, None in a text column"""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return ~np.isnan(value)
+        if value.dtype == object:
+            return np.array([item is not None for item in value], dtype=bool)
+        return np.ones(value.shape, dtype=bool)
+    return value is not None and not (isinstance(value, float) and np.isnan(value))
+
+
+def _filled(value):
+    """Text column with missing entries as '', so NumPy can compare it; mask the result with _present"""
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        return np.where(_present(value), value, '')
+    return value
+
+
+def _compare(op, left, right):
+    try:
+        with np.errstate(invalid='ignore'):
+            result = op(_filled(left), _filled(right))
+    except TypeError:
+        raise ScreenError("Cannot compare text with numbers") from None
+    # NaN != x is True and '' compares like text, but a missing value satisfies no comparison
+    result = result & _present(left) & _present(right)
+    return result.astype(bool) if isinstance(result, np.ndarray) else bool(result)
+
+
+def _arithmetic(op, *operands):
+    try:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return op(*(np.asarray(operand, dtype=np.float64) if isinstance(operand, np.ndarray) else operand
+                        for operand in operands))
+    except (TypeError, ValueError):
+        raise ScreenError("Arithmetic needs numeric columns") from None
+
+
+class Screen:
+    """A compiled screen expression; call it with a ScreenTable for the boolean mask"""
+
+    def __init__(self, expression):
+        if not isinstance(expression, str):
+            raise ScreenError("Screen expression must be a string")
+        self.expression = expression
+        parser = _Parser(expression)
+        self._evaluate = parser.parse()
+        self.names = parser.names
+
+    def __call__(self, table):
+        mask = self._evaluate(table)
+        if isinstance(mask, (bool, np.bool_)):
+            return np.full(len(table), bool(mask))
+        return _mask(mask)
+
+
+class ScreenTable:
+    """The universe as columns: one array per field, one element per symbol.
+
+    close is an optional (dates x symbols) daily close matrix for the
+    price-derived columns, or a function returning one - called only when a
+    screen first uses such a column. Derived columns are cached.
+    """
+
+    def __init__(self, rows, close=None):
+        self.rows = list(rows)
+        self.symbols = [row['symbol'] for row in self.rows]
+        self.close = close
+        self._columns = {}
+        self._lock = threading.Lock()
+        names = dict.fromkeys(name for row in self.rows for name in row)
+        for name in names:
+            values = [row.get(name) for row in self.rows]
+            present = [value for value in values if value is not None]
+            if present and all(isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+                               for value in present):
+                self._columns[name] = np.array([np.nan if value is None else value for value in values],
+                                               dtype=np.float64)
+            elif present and all(isinstance(value, (bool, np.bool_)) for value in present):
+                self._columns[name] = np.array([bool(value) for value in values])
+            else:
+                self._columns[name] = np.array([None if value is None else str(value) for value in values],
+                                               dtype=object)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def column(self, name):
+        with self._lock:
+            if name not in self._columns:
+                self._columns[name] = self._derived(name)
+            return self._columns[name]
+
+    def _derived(self, name):
+        match = DERIVED.match(name)
+        if name != 'close' and match is None:
+            raise ScreenError(f"Unknown column: {name}")
+        if callable(self.close):
+            self.close = self.close()
+        close = self.close
+        if close is None or not len(close):
+            if name == 'close' and 'current_price' in self._columns:
+                return self._columns['current_price']
+            raise ScreenError(f"{name} needs daily price history (configure a price store)")
+        if name == 'close':
+            return close[-1]
+        kind, period = match.group(1), int(match.group(2))
+        if period < 1 or period >= len(close):
+            raise ScreenError(f"{name}: period must be between 1 and {len(close) - 1} bars")
+        tail = close[-min(len(close), period * 3 + 20):]
+        if kind == 'sma':
+            return indicators.sma(tail, period)[-1]
+        if kind == 'ema':
+            return indicators.ema(close, period)[-1]
+        if kind == 'hma':
+            return indicators.hma(tail, period)[-1]
+        if kind == 'rsi':
+            return indicators.rsi(close, period)[-1]
+        if kind == 'return':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return (close[-1] / close[-1 - period] - 1) * 100
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+            return np.nanmax(close[-period:], axis=0) if kind == 'high' else np.nanmin(close[-period:], axis=0)
+
+    def select(self, mask, sort=None, limit=None, columns=()):
+        """Rows where mask holds, best first by sort, each with the screen's columns filled in"""
+        matched = np.flatnonzero(mask)
+        if sort:
+            values = self.column(sort)
+            if values.dtype == object:  # alphabetical, missing text last
+                matched = matched[np.argsort(_filled(values[matched]), kind='stable')]
+                present = _present(values[matched])
+                matched = np.concatenate([matched[present], matched[~present]])
+            else:
+                matched = matched[np.argsort(-np.nan_to_num(values[matched], nan=-np.inf), kind='stable')]
+        if limit is not None:
+            matched = matched[:limit]
+        extra = {name: self.column(name) for name in columns}
+        results = []
+        for i in matched:
+            row = dict(self.rows[i])
+            for name, values in extra.items():
+                if name not in row:
+                    value = values[i]
+                    row[name] = None if isinstance(value, float) and np.isnan(value) else \
+                        round(float(value), 2) if isinstance(value, (float, np.floating)) else value
+            results.append(row)
+        return results
+
+
+class ScreenStore:
+    """Saved screens in a JSON file, compiled once; reloaded when another worker changes the file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._screens = {}
+        self._compiled = {}
+        self._mtime = None
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                self._screens = {screen['name']: screen for screen in json.load(f).get('screens', [])}
+            self._compiled = {}
+            self._mtime = mtime
+
+    def _save(self):
+        temp = f"{self.path}.tmp"
+        with open(temp, 'w') as f:
+            json.dump({'screens': list(self._screens.values())}, f)
+        os.replace(temp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def save(self, screen):
+        """Add or replace a screen: name, expression, optional description and owner"""
+        if not isinstance(screen, dict):
+            raise ScreenError("Screen must be an object with name and expression")
+        name = str(screen.get('name') or '').strip()
+        if not re.fullmatch(r'[A-Za-z0-9_.-]{1,64}', name):
+            raise ScreenError("name must be 1-64 letters, digits, '_', '.' or '-'")
+        compiled = Screen(screen.get('expression'))
+        saved = {
+            'name': name,
+            'expression': compiled.expression,
+            'description': screen.get('description', ''),
+            'owner': screen.get('owner'),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._reload()
+        with self._lock:
+            self._screens[name] = saved
+            self._compiled[name] = compiled
+            self._save()
+        return dict(saved)
+
+    def remove(self, name):
+        self._reload()
+        with self._lock:
+            if self._screens.pop(name, None) is None:
+                return False
+            self._compiled.pop(name, None)
+            self._save()
+        return True
+
+    def get(self, name):
+        """(saved screen, compiled Screen), or None"""
+        self._reload()
+        with self._lock:
+            screen = self._screens.get(name)
+            if screen is None:
+                return None
+            if name not in self._compiled:
+                self._compiled[name] = Screen(screen['expression'])
+            return dict(screen), self._compiled[name]
+
+    def screens(self, owner=None):
+        self._reload()
+        with self._lock:
+            return [dict(screen) for screen in self._screens.values() if owner is None or screen.get('owner') == owner]
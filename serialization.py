@@ -0,0 +1,140 @@
+"""Fast JSON encoding and gzip compression for API responses.
+
+JSONResponse here is a drop-in for FastAPI's: it encodes with orjson when it
+is installed (several times faster on the float-heavy result lists, and
+numpy arrays and scalars serialize natively) and falls back to the compact
+standard library encoder otherwise. CompressionMiddleware gzips responses
+for clients that accept it, flushing streamed bodies chunk by chunk.
+EncodedCache keeps the encoded (and gzipped) bytes of a response whose
+content cannot change, such as a completed scan's results.
+"""
+import json
+import threading
+import zlib
+
+from fastapi.responses import JSONResponse as _JSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+GZIP_WBITS = 31  # zlib wbits for a gzip container
+
+# Content types sent as they are: event streams must not be buffered, the rest is compressed already
+PASSTHROUGH_TYPES = ('text/event-stream', 'application/vnd.apache.parquet', 'application/zip', 'application/gzip',
+                     'application/x-gzip', 'application/zstd', 'image/', 'audio/', 'video/')
+
+
+def _default(value):
+    """Encode numpy scalars and anything else exotic"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def dumps(content):
+    """JSON bytes for content; NaN and infinity become null with orjson (the fallback rejects them, like Starlette)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+
+def gzip_bytes(body, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def accepts_gzip(headers):
+    return 'gzip' in headers.get('accept-encoding', '')
+
+
+class JSONResponse(_JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+class EncodedCache:
+    """Encoded and gzipped bytes of one response, reused while its key stays the same"""
+
+    def __init__(self):
+        self._key = None
+        self._body = None
+        self._gzipped = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return (self._body, self._gzipped) if key is not None and key == self._key else None
+
+    def put(self, key, body):
+        gzipped = gzip_bytes(body)
+        with self._lock:
+            self._key, self._body, self._gzipped = key, body, gzipped
+        return body, gzipped
+
+    @staticmethod
+    def response(request, encoded):
+        body, gzipped = encoded
+        if accepts_gzip(request.headers):
+            return Response(gzipped, media_type="application/json",
+                            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+        return Response(body, media_type="application/json", headers={"Vary": "Accept-Encoding"})
+
+
+class CompressionMiddleware:
+    """Gzip response bodies for clients that accept it.
+
+    Unlike Starlette's GZipMiddleware, streamed bodies are sync-flushed per
+    chunk so NDJSON and similar streams keep arriving as they are produced.
+    Server-sent events, small bodies, already-compressed formats (Parquet,
+    zip, images...) and responses that already set Content-Encoding pass
+    through untouched.
+    """
+
+    def __init__(self, app, minimum_size=1024, level=6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not accepts_gzip(Headers(scope=scope)):
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                start = message  # held back until the first body chunk decides the headers
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+            body, more_body = message.get('body', b''), message.get('more_body', False)
+            if start is not None:
+                headers = MutableHeaders(raw=start['headers'])
+                if not ('content-encoding' in headers
+                        or headers.get('content-type', '').startswith(PASSTHROUGH_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+                    headers['Content-Encoding'] = 'gzip'
+                    headers.add_vary_header('Accept-Encoding')
+                    if 'content-length' in headers:
+                        del headers['content-length']
+                    if not more_body:  # whole body in one message
+                        body, compressor = compressor.compress(body) + compressor.flush(), None
+                        headers['Content-Length'] = str(len(body))
+                        message = {**message, 'body': body}
+                await send(start)
+                start = None
+            if compressor is not None:
+                flush = zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH
+                message = {**message, 'body': compressor.compress(body) + compressor.flush(flush)}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,163 @@
+"""Sharded scans - the coordinator side.
+
+The symbol list is split into shards; each shard is fetched and scored by a
+worker with app.score_shard (the same fundamental and technical scoring as a
+normal scan) and the partial results are merged and ranked by final_score.
+
+Workers are either local processes (CONFIG['scan_shards'] > 1) or remote
+app instances reached through POST /shard/score (CONFIG['shard_workers']).
+
+Try it locally with synthetic fixtures:
+
+    python sharding.py --shards 4 --symbols 400
+"""
+import argparse
+import heapq
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import requests
+
+import app
+
+
+def partition_symbols(symbols, shard_count):
+    """Round-robin split, so each shard gets a similar mix of the universe"""
+    shard_count = max(1, min(shard_count, len(symbols)))
+    return [symbols[i::shard_count] for i in range(shard_count)]
+
+
+def merge_shard_results(symbols, partials):
+    """Fundamental passes in universe order, final results ranked by final_score"""
+    order = {symbol: i for i, symbol in enumerate(symbols)}
+    fundamental = [row for partial in partials for row in partial['fundamental_results']]
+    fundamental.sort(key=lambda row: order.get(row['symbol'], len(order)))
+    # Shards are sorted by final_score with ties in universe order (as in a
+    # single-process scan), so a k-way merge on that key gives the full ranking
+    final = list(heapq.merge(*(partial['final_results'] for partial in partials),
+                             key=lambda row: (-row.get('final_score', 0), order.get(row['symbol'], len(order)))))
+    return fundamental, final
+
+
+def _init_local_worker(config, ticker_factory):
+    """Process pool initializer: use the coordinator's config and data source"""
+    app.CONFIG.update(config)
+    app.rate_controller.reset(delay=app.CONFIG['request_delay'])
+    if ticker_factory is not None:
+        app.set_ticker_factory(ticker_factory)
+
+
+def _picklable_ticker_factory():
+    """The active ticker factory if it can be sent to worker processes"""
+    try:
+        pickle.dumps(app.ticker_factory)
+        return app.ticker_factory
+    except Exception:
+        app.event_log.warning("Ticker factory cannot be pickled, shard processes use yfinance", stage='sharded_scan')
+        return None
+
+
+def _score_remote(url, symbols, data_sources):
+    response = requests.post(f"{url.rstrip('/')}/shard/score",
+                             json={'symbols': symbols, 'data_sources': data_sources},
+                             timeout=app.CONFIG['shard_timeout'])
+    response.raise_for_status()
+    return response.json()
+
+
+def _submit_shards(executor, shards, data_sources, workers):
+    if workers:
+        return {executor.submit(_score_remote, url, shard, data_sources): (i, url)
+                for i, (url, shard) in enumerate(zip(workers, shards))}
+    return {executor.submit(app.score_shard, shard, data_sources): (i, 'local')
+            for i, shard in enumerate(shards)}
+
+
+def run_sharded_scan(symbols, data_sources, shard_count=None, workers=None):
+    """Score symbols across shard workers; returns (fundamental_results, final_results, recommendations)"""
+    workers = app.CONFIG['shard_workers'] if workers is None else workers
+    shard_count = len(workers) if workers else (shard_count or app.CONFIG['scan_shards'])
+    shards = partition_symbols(list(symbols), shard_count)
+
+    app.scan_data.update({'stage': 'sharded_scan', 'shards': len(shards)})
+    app.event_log.info(f"🧩 Sharded scan: {len(symbols)} symbols in {len(shards)} shards "
+                       f"({'remote' if workers else 'local processes'})", stage='sharded_scan')
+
+    if workers:
+        executor = ThreadPoolExecutor(max_workers=len(shards))
+    else:
+        executor = ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_local_worker, initargs=(dict(app.CONFIG), _picklable_ticker_factory()))
+
+    partials = []
+    processed = 0
+    fundamental_passed = 0
+    stage_start = time.perf_counter()
+    with executor:
+        futures = _submit_shards(executor, shards, data_sources, workers)
+        app.QUEUE_DEPTH.set(len(futures), stage='shard')
+        for future in as_completed(futures):
+            index, worker = futures[future]
+            try:
+                partial = future.result()
+            except Exception as e:
+                # A lost shard is rescored here rather than dropped from the ranking
+                app.event_log.warning(f"❌ Shard {index} on {worker} failed ({e}), scoring locally",
+                                      stage='sharded_scan')
+                partial = app.score_shard(shards[index], data_sources)
+            partials.append(partial)
+            app.rank_indexes['fundamental'].add_many(partial['fundamental_results'])
+            app.rank_indexes['final'].add_many(partial['final_results'])
+            processed += partial['processed']
+            fundamental_passed += len(partial['fundamental_results'])
+            app.QUEUE_DEPTH.dec(stage='shard')
+            app.scan_data.update({
+                'progress': int(processed / max(len(symbols), 1) * 99),
+                'fundamental_passed': fundamental_passed
+            })
+            app.event_log.info(f"✅ Shard {index} done on {worker}: {partial['processed']} symbols, "
+                               f"{len(partial['final_results'])} qualified", stage='sharded_scan')
+    app.STAGE_DURATION.observe(time.perf_counter() - stage_start, stage='sharded')
+
+    fundamental, final = merge_shard_results(symbols, partials)
+    failed = [failure for partial in partials for failure in partial.get('errors', [])]
+    recommendations = {symbol: recommendation for partial in partials
+                       for symbol, recommendation in partial.get('recommendations', {}).items()}
+    app.scan_data.update({'fundamental_passed': len(fundamental), 'fundamental_results': fundamental,
+                          'failed_symbols': failed})
+    if failed:
+        app.event_log.warning(f"⚠️ {len(failed)} symbols skipped or failed, missing from the results",
+                              stage='sharded_scan')
+    return fundamental, final, recommendations
+
+
+def main(argv=None):
+    import benchmark
+
+    parser = argparse.ArgumentParser(description="Run a sharded scan locally against synthetic fixtures")
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--symbols', type=int, default=400)
+    args = parser.parse_args(argv)
+
+    symbols = benchmark.fixture_symbols(args.symbols)
+    with benchmark.offline_fixtures({}), benchmark.quiet():
+        start = time.perf_counter()
+        app.run_bulletproof_scan(symbols)
+        single_time = time.perf_counter() - start
+        single = [row['symbol'] for row in app.scan_data['final_results']]
+
+        app.CONFIG['scan_shards'] = args.shards
+        start = time.perf_counter()
+        app.run_bulletproof_scan(symbols)
+        sharded_time = time.perf_counter() - start
+        sharded = [row['symbol'] for row in app.scan_data['final_results']]
+
+    print(f"📊 {args.symbols} symbols: single process {single_time:.2f}s, {args.shards} shards {sharded_time:.2f}s")
+    print(f"{'✅' if single == sharded else '❌'} Ranking identical: {single == sharded} ({len(sharded)} qualified)")
+    return 0 if single == sharded else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
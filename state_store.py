@@ -0,0 +1,374 @@
+"""Scan state shared between API workers.
+
+scan_data used to be a module-level dict, which breaks as soon as uvicorn runs
+more than one worker. The state now lives in a backend selected by URL:
+
+    memory                      single process (default)
+    sqlite:///path/to/state.db  all workers on one machine
+
+Other backends plug in through register_state_backend(). Each backend also
+provides leased named locks, used for the scan lock (exactly one scan across
+workers) and for leader election.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _json_default(value):
+    """Encode numpy scalars and anything else exotic"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _encode(value):
+    return json.dumps(value, default=_json_default)
+
+
+class MemoryStateBackend:
+    """Process-local backend, the old behaviour"""
+
+    def __init__(self):
+        self._data = {}
+        self._locks = {}
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set_many(self, mapping):
+        with self._lock:
+            self._data.update(mapping)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._data)
+
+    def iter_list(self, key):
+        # Values are replaced, never mutated, so the list can be walked outside the lock
+        with self._lock:
+            value = self._data.get(key) or []
+        return iter(value)
+
+    def initialize(self, defaults):
+        with self._lock:
+            for key, value in defaults.items():
+                self._data.setdefault(key, value)
+
+    def acquire_lock(self, name, owner, ttl):
+        now = time.time()
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder and holder['owner'] != owner and holder['expires_at'] > now:
+                return False
+            self._locks[name] = {'owner': owner, 'expires_at': now + ttl}
+            return True
+
+    def release_lock(self, name, owner):
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder and holder['owner'] == owner:
+                del self._locks[name]
+
+    def lock_holder(self, name):
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder and holder['expires_at'] > time.time():
+                return holder['owner']
+            return None
+
+
+class SQLiteStateBackend:
+    """SQLite file shared by every worker process on the machine"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS scan_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS locks "
+                         "(name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _conn(self):
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return Transaction(self._conn())
+
+    def get(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM scan_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_many(self, mapping):
+        rows = [(key, _encode(value)) for key, value in mapping.items()]
+        with self._transaction() as conn:
+            conn.executemany("INSERT INTO scan_state (key, value) VALUES (?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET value = excluded.value", rows)
+
+    def delete(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM scan_state WHERE key = ?", (key,))
+
+    def keys(self):
+        return [row[0] for row in self._conn().execute("SELECT key FROM scan_state")]
+
+    def snapshot(self):
+        rows = self._conn().execute("SELECT key, value FROM scan_state").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def iter_list(self, key):
+        """Items of a stored list one by one, split out by SQLite's json_each rather than parsed whole.
+
+        The cursor lives on its own connection: a streaming response advances
+        the generator from whichever thread-pool worker is free, and the
+        per-thread connections may only be used by the thread that opened them.
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        try:
+            cursor = conn.execute("SELECT json_quote(item.value) FROM scan_state, json_each(scan_state.value) AS item "
+                                  "WHERE scan_state.key = ?", (key,))
+            for (value,) in cursor:
+                yield json.loads(value)
+        finally:
+            conn.close()
+
+    def initialize(self, defaults):
+        rows = [(key, _encode(value)) for key, value in defaults.items()]
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO scan_state (key, value) VALUES (?, ?)", rows)
+
+    def acquire_lock(self, name, owner, ttl):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM locks WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                         (name, owner, now + ttl))
+            return True
+
+    def release_lock(self, name, owner):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def lock_holder(self, name):
+        row = self._conn().execute("SELECT owner FROM locks WHERE name = ? AND expires_at > ?",
+                                   (name, time.time())).fetchone()
+        return row[0] if row else None
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT around a block, so lock checks are atomic across processes;
+    also used by the other SQLite stores (portfolio, price store, fundamentals)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+STATE_BACKENDS = {
+    'memory': lambda location: MemoryStateBackend(),
+    'sqlite': lambda location: SQLiteStateBackend(location or 'scan_state.db'),
+}
+
+
+def register_state_backend(scheme, factory):
+    """Register factory(location) for URLs like '<scheme>://<location>'"""
+    STATE_BACKENDS[scheme] = factory
+
+
+def create_state_backend(url=None):
+    """Backend for a URL such as 'memory' or 'sqlite:///tmp/scan_state.db'"""
+    url = url or 'memory'
+    scheme, _, location = url.partition('://')
+    if scheme not in STATE_BACKENDS:
+        raise ValueError(f"Unknown state backend '{scheme}', expected one of {sorted(STATE_BACKENDS)}")
+    return STATE_BACKENDS[scheme](location)
+
+
+class SharedScanState(MutableMapping):
+    """Dict-like view over a state backend, so scan_data[...] code keeps working.
+
+    Treat values as snapshots; mutate by assignment, not in place, or other
+    workers will not see the change.
+    """
+
+    def __init__(self, backend, defaults=None):
+        self.backend = backend
+        if defaults:
+            backend.initialize(defaults)
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.backend.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return self.backend.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.backend.set_many({key: value})
+
+    def update(self, other=(), **kwargs):
+        mapping = dict(other, **kwargs)
+        if mapping:
+            self.backend.set_many(mapping)
+
+    def __delitem__(self, key):
+        self.backend.delete(key)
+
+    def __iter__(self):
+        return iter(self.backend.keys())
+
+    def __len__(self):
+        return len(self.backend.keys())
+
+    def snapshot(self):
+        """Plain dict copy of the whole state, read in one go"""
+        return self.backend.snapshot()
+
+    def iter_list(self, key):
+        """Iterate a list value item by item, without materialising it where the backend allows"""
+        if hasattr(self.backend, 'iter_list'):
+            return self.backend.iter_list(key)
+        return iter(self.backend.get(key) or [])
+
+
+class LeaseLost(Exception):
+    """A LeasedLock could not be renewed; another worker may hold it now"""
+
+
+class LeasedLock:
+    """Backend lock held for the duration of a block, renewed in the background.
+
+    If a renewal is refused, or renewals keep failing until the lease has
+    expired, lost is set; work done under the lock calls check() and stops.
+    """
+
+    def __init__(self, backend, name, owner=WORKER_ID, ttl=60.0, log=print):
+        self.backend = backend
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.log = log
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self):
+        if not self.backend.acquire_lock(self.name, self.owner, self.ttl):
+            return False
+        self._stop.clear()
+        self.lost.clear()
+        self._thread = threading.Thread(target=self._renew, name=f'lease-{self.name}', daemon=True)
+        self._thread.start()
+        return True
+
+    def _renew(self):
+        renewed = time.monotonic()
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not self.backend.acquire_lock(self.name, self.owner, self.ttl):
+                    self.lost.set()
+                    self.log(f"❌ Lost lock '{self.name}' held by {self.owner}")
+                    return
+                renewed = time.monotonic()
+            except Exception as e:
+                self.log(f"❌ Lock renewal failed for '{self.name}': {e}")
+                if time.monotonic() - renewed >= self.ttl:
+                    self.lost.set()
+                    self.log(f"❌ Lost lock '{self.name}' held by {self.owner}, lease expired")
+                    return
+
+    def check(self):
+        """Raise LeaseLost once the lock is no longer held"""
+        if self.lost.is_set():
+            raise LeaseLost(f"lock '{self.name}' lost by {self.owner}")
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.backend.release_lock(self.name, self.owner)
+
+
+class LeaderElector:
+    """Lease-based leader election over a backend lock.
+
+    Every worker runs one of these; whichever holds the lease is leader and
+    runs on_leader() on each heartbeat. A crashed leader's lease expires
+    after ttl seconds and another worker takes over.
+    """
+
+    def __init__(self, backend, name='leader', owner=WORKER_ID, ttl=15.0, on_leader=None):
+        self.backend = backend
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.on_leader = on_leader
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def heartbeat(self):
+        self.is_leader = self.backend.acquire_lock(self.name, self.owner, self.ttl)
+        if self.is_leader and self.on_leader:
+            self.on_leader()
+        return self.is_leader
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.heartbeat()
+            except Exception as e:
+                self.is_leader = False
+                print(f"❌ Leader heartbeat failed: {e}")
+            self._stop.wait(self.ttl / 3)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.ttl)
+            self._thread = None
+        if self.is_leader:
+            self.backend.release_lock(self.name, self.owner)
+            self.is_leader = False
@@ -0,0 +1,187 @@
+"""Deterministic synthetic market for offline load tests.
+
+SyntheticMarket(n_symbols, seed) generates a whole universe at once with
+NumPy: daily returns from a one-factor market model plus sector factors and
+idiosyncratic noise (so symbols in a sector move together), OHLCV bars
+around those closes, and yfinance-style fundamentals that are consistent
+with the prices. The same (n_symbols, days, seed, end) always gives the same
+market.
+
+The market is a ticker factory, so it plugs in wherever yf.Ticker is used:
+
+    app.set_ticker_factory(SyntheticMarket(10000, seed=1))
+
+or for the server, SCAN_DATA_SOURCE=synthetic:10000:1 uvicorn app:app.
+Symbols outside the universe (e.g. the RELIANCE.NS source test) are mapped
+onto a stable member of it.
+"""
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+SECTORS = ['IT', 'Banking', 'FMCG', 'Auto', 'Pharma', 'Energy', 'Metals', 'Telecom']
+
+PERIOD_DAYS = {'1d': 1, '5d': 5, '1mo': 22, '3mo': 66, '6mo': 130, '1y': 252, '2y': 504, '5y': 1260}
+
+
+class SyntheticMarket:
+    """N symbols x days of correlated OHLCV plus fundamentals, generated lazily on first use"""
+
+    def __init__(self, n_symbols=1000, days=260, seed=0, end='2024-12-31', prefix='SYN'):
+        self.n_symbols = n_symbols
+        self.days = days
+        self.seed = seed
+        self.end = end
+        self.prefix = prefix
+        width = max(5, len(str(n_symbols - 1)))
+        self.symbols = [f"{prefix}{i:0{width}d}" for i in range(n_symbols)]
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._data = None
+
+    # Ship only the parameters to shard processes; they regenerate the same market
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in ('n_symbols', 'days', 'seed', 'end', 'prefix')}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __call__(self, symbol):
+        return SyntheticTicker(self, symbol)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._generate()
+        return self._data
+
+    def _generate(self):
+        rng = np.random.default_rng(self.seed)
+        n, days, n_sectors = self.n_symbols, self.days, len(SECTORS)
+
+        sector = rng.integers(0, n_sectors, n)
+        beta = rng.normal(1.0, 0.25, n).clip(0.3, 2.0)
+        sector_loading = rng.uniform(0.4, 1.2, n)
+        volatility = rng.uniform(0.008, 0.025, n)
+        quality = rng.standard_normal(n)  # drives fundamentals and a small drift
+        drift = 0.0002 + 0.0002 * quality
+
+        market = rng.normal(0.0003, 0.011, days)
+        sector_returns = rng.normal(0.0, 0.007, (days, n_sectors))
+        noise = rng.standard_normal((days, n), dtype=np.float32)
+        returns = (drift + beta * market[:, np.newaxis] + sector_loading * sector_returns[:, sector]
+                   + noise * volatility.astype(np.float32))
+
+        start = np.exp(rng.uniform(np.log(50), np.log(5000), n))
+        close = start * np.exp(np.cumsum(returns, axis=0, dtype=np.float64))
+        previous = np.vstack([start[np.newaxis, :], close[:-1]])
+        gap = rng.standard_normal((days, n), dtype=np.float32) * (0.3 * volatility).astype(np.float32)
+        open_ = previous * np.exp(gap)
+        wick = np.abs(rng.standard_normal((2, days, n), dtype=np.float32)) * (0.5 * volatility).astype(np.float32)
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        base_volume = np.exp(rng.uniform(np.log(5e4), np.log(5e6), n))
+        volume = base_volume * np.exp(rng.normal(0, 0.4, (days, n)).astype(np.float32)) * (1 + 20 * np.abs(returns))
+
+        shares = np.exp(rng.uniform(np.log(2e7), np.log(5e9), n))
+        pe = np.exp(rng.normal(np.log(22), 0.35, n) - 0.1 * quality)
+        pb = np.exp(rng.normal(np.log(3), 0.45, n) + 0.15 * quality).clip(0.5, 15)
+        last = close[-1]
+        year = close[-min(days, 252):]
+        fundamentals = {
+            'sector': sector,
+            'marketCap': last * shares,
+            'trailingPE': pe,
+            'priceToBook': pb,
+            'returnOnEquity': (0.13 + 0.06 * quality + rng.normal(0, 0.03, n)).clip(-0.2, 0.6),
+            'returnOnAssets': (0.06 + 0.03 * quality + rng.normal(0, 0.015, n)).clip(-0.1, 0.3),
+            'debtToEquity': np.exp(rng.normal(np.log(0.6), 0.7, n) - 0.2 * quality),
+            'currentRatio': np.exp(rng.normal(np.log(1.4), 0.3, n) + 0.1 * quality),
+            'revenueGrowth': 0.08 + 0.05 * quality + rng.normal(0, 0.06, n),
+            'earningsGrowth': 0.1 + 0.08 * quality + rng.normal(0, 0.1, n),
+            'profitMargins': (0.11 + 0.05 * quality + rng.normal(0, 0.03, n)).clip(-0.1, 0.5),
+            'operatingMargins': (0.16 + 0.05 * quality + rng.normal(0, 0.04, n)).clip(-0.05, 0.6),
+            'dividendYield': rng.uniform(0, 0.04, n),
+            'beta': beta,
+            'trailingEps': last / pe,
+            'bookValue': last / pb,
+            'fiftyTwoWeekHigh': year.max(axis=0),
+            'fiftyTwoWeekLow': year.min(axis=0),
+        }
+        return {
+            'dates': pd.bdate_range(end=pd.Timestamp(self.end), periods=days),
+            'open': open_.astype(np.float32),
+            'high': high.astype(np.float32),
+            'low': low.astype(np.float32),
+            'close': close,
+            'volume': volume.astype(np.int64),
+            'fundamentals': fundamentals
+        }
+
+    def position(self, symbol):
+        """Column of symbol; symbols outside the universe map onto a stable member"""
+        clean = symbol.replace('.NS', '')
+        i = self._index.get(clean)
+        return i if i is not None else zlib.crc32(clean.encode()) % self.n_symbols
+
+    def history(self, symbol, period='1mo'):
+        data = self.data
+        i = self.position(symbol)
+        bars = slice(-min(PERIOD_DAYS.get(period, self.days), self.days), None)
+        return pd.DataFrame({
+            'Open': data['open'][bars, i].astype(np.float64),
+            'High': data['high'][bars, i].astype(np.float64),
+            'Low': data['low'][bars, i].astype(np.float64),
+            'Close': data['close'][bars, i],
+            'Volume': data['volume'][bars, i],
+        }, index=data['dates'][bars])
+
+    def info(self, symbol):
+        data = self.data
+        i = self.position(symbol)
+        clean = symbol.replace('.NS', '')
+        info = {key: float(values[i]) for key, values in data['fundamentals'].items() if key != 'sector'}
+        info.update({
+            'longName': f'{clean} Limited',
+            'sector': SECTORS[data['fundamentals']['sector'][i]],
+            'industry': 'Mixed Industry',
+            'currentPrice': round(float(data['close'][-1, i]), 2),
+        })
+        return info
+
+    def close_matrix(self):
+        """(dates, symbols, close) for backtest.run_backtest and optimizer.run_sweep"""
+        data = self.data
+        return data['dates'].values.astype('datetime64[D]'), list(self.symbols), data['close']
+
+
+class SyntheticTicker:
+    """yf.Ticker look-alike backed by a SyntheticMarket"""
+
+    def __init__(self, market, symbol):
+        self.market = market
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        return self.market.info(self.symbol)
+
+    @property
+    def fast_info(self):
+        info = self.market.info(self.symbol)
+        return SimpleNamespace(last_price=info['currentPrice'], market_cap=info['marketCap'])
+
+    def history(self, period='1mo', interval='1d'):
+        return self.market.history(self.symbol, period)
+
+
+def parse_spec(spec):
+    """SyntheticMarket for 'synthetic:<symbols>[:<seed>[:<days>]]'"""
+    parts = spec.split(':')
+    if parts[0] != 'synthetic':
+        raise ValueError(f"Not a synthetic data source: {spec}")
+    n_symbols = int(parts[1]) if len(parts) > 1 and parts[1] else 1000
+    seed = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+    days = int(parts[3]) if len(parts) > 3 and parts[3] else 260
+    return SyntheticMarket(n_symbols, days=days, seed=seed)
@@ -0,0 +1,158 @@
+"""Weekly and monthly bars resampled from daily bars for a whole universe.
+
+resample() turns a (dates x symbols x OHLCV) daily array into weekly or
+monthly bars in one pass (reduceat over period boundaries, NaN-aware so
+symbols with gaps or late listings come out right). TimeframeCache keeps
+each timeframe built and, when new daily bars arrive, rebuilds only the
+periods they touch - normally just the current partial week and month.
+
+    cache = TimeframeCache(symbols)
+    cache.update(dates, daily)           # initial history, then each new day's bars
+    dates, weekly = cache.bars('weekly')
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+TIMEFRAMES = ('daily', 'weekly', 'monthly')
+
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+
+def period_keys(dates, timeframe):
+    """Integer period id per date; weeks run Monday-Sunday"""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if timeframe == 'weekly':
+        # numpy weeks start on Thursday (1970-01-01); shift so they run Monday-Sunday
+        return (dates - np.timedelta64(4, 'D')).astype('datetime64[W]').astype(np.int64)
+    if timeframe == 'monthly':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    if timeframe == 'daily':
+        return dates.astype(np.int64)
+    raise ValueError(f"Timeframe must be one of {', '.join(TIMEFRAMES)}")
+
+
+def period_starts(keys):
+    return np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+
+
+def resample(dates, daily, timeframe):
+    """(period dates, bars) from daily (dates x symbols x 5) bars; a period is dated by its last day"""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    daily = np.asarray(daily, dtype=np.float64)
+    if timeframe == 'daily' or not len(dates):
+        return dates, daily
+    starts = period_starts(period_keys(dates, timeframe))
+    ends = np.append(starts[1:], len(dates)) - 1
+    n_days, n_symbols = daily.shape[:2]
+
+    valid = ~np.isnan(daily[..., CLOSE])
+    rows = np.arange(n_days)[:, np.newaxis]
+    first = np.minimum.reduceat(np.where(valid, rows, n_days), starts, axis=0)
+    last = np.maximum.reduceat(np.where(valid, rows, -1), starts, axis=0)
+    empty = last < 0
+    columns = np.arange(n_symbols)
+
+    bars = np.empty((len(starts), n_symbols, 5))
+    bars[..., OPEN] = daily[np.minimum(first, n_days - 1), columns, OPEN]
+    bars[..., CLOSE] = daily[np.maximum(last, 0), columns, CLOSE]
+    with np.errstate(invalid='ignore'):
+        bars[..., HIGH] = np.fmax.reduceat(daily[..., HIGH], starts, axis=0)
+        bars[..., LOW] = np.fmin.reduceat(daily[..., LOW], starts, axis=0)
+    bars[..., VOLUME] = np.add.reduceat(np.nan_to_num(daily[..., VOLUME]), starts, axis=0)
+    bars[empty] = np.nan
+    return dates[ends], bars
+
+
+def stack_frames(frames, symbols):
+    """(dates, daily) aligned on the union of dates from per-symbol OHLCV frames"""
+    indexes = {symbol: pd.DatetimeIndex(frames[symbol].index) for symbol in symbols if symbol in frames}
+    indexes = {symbol: (index.tz_localize(None) if index.tz is not None else index).values.astype('datetime64[D]')
+               for symbol, index in indexes.items()}
+    dates = np.unique(np.concatenate(list(indexes.values()))) if indexes else np.array([], dtype='datetime64[D]')
+    daily = np.full((len(dates), len(symbols), 5), np.nan)
+    for column, symbol in enumerate(symbols):
+        if symbol in indexes:
+            rows = np.searchsorted(dates, indexes[symbol])
+            daily[rows, column] = frames[symbol].reindex(columns=list(COLUMNS)).to_numpy(dtype=np.float64)
+    return dates, daily
+
+
+def _write(buffer, count, at, rows):
+    """Write rows into buffer from index at (dropping anything after), doubling capacity if needed"""
+    end = at + len(rows)
+    if end > len(buffer):
+        grown = np.empty((max(end, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:at] = buffer[:at]
+        buffer = grown
+    buffer[at:end] = rows
+    return buffer, end
+
+
+class TimeframeCache:
+    """Daily bars for a fixed universe plus their weekly and monthly resamples, updated incrementally"""
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self._dates = np.array([], dtype='datetime64[D]')
+        self._daily = np.empty((0, len(self.symbols), 5))
+        self._days = 0
+        self._built = {}  # timeframe -> [period dates, bars, periods]
+        self._lock = threading.Lock()
+
+    @property
+    def dates(self):
+        return self._dates[:self._days]
+
+    @property
+    def daily(self):
+        return self._daily[:self._days]
+
+    def update(self, dates, daily):
+        """Merge daily bars (replacing any stored from dates[0] on) and refresh each cached timeframe.
+
+        Returns {timeframe: periods rebuilt}.
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        daily = np.asarray(daily, dtype=np.float64)
+        if not len(dates):
+            return {}
+        with self._lock:
+            kept = int(np.searchsorted(self.dates, dates[0]))
+            self._dates, _ = _write(self._dates, self._days, kept, dates)
+            self._daily, self._days = _write(self._daily, self._days, kept, daily)
+            rebuilt = {}
+            for timeframe, built in self._built.items():
+                period_dates, bars, periods = built
+                keys = period_keys(self.dates, timeframe)
+                # Periods ending before the first changed day are final; redo the rest
+                start = int(np.searchsorted(keys, keys[kept]))
+                final = int(np.searchsorted(period_keys(period_dates[:periods], timeframe), keys[kept]))
+                new_dates, new_bars = resample(self.dates[start:], self.daily[start:], timeframe)
+                built[0], _ = _write(period_dates, periods, final, new_dates)
+                built[1], built[2] = _write(bars, periods, final, new_bars)
+                rebuilt[timeframe] = len(new_dates)
+            return rebuilt
+
+    def bars(self, timeframe='weekly'):
+        """(period dates, bars) for every symbol, built on first request - views, updated in place"""
+        if timeframe == 'daily':
+            return self.dates, self.daily
+        with self._lock:
+            if timeframe not in self._built:
+                period_dates, bars = resample(self.dates, self.daily, timeframe)
+                self._built[timeframe] = [period_dates, bars, len(period_dates)]
+            period_dates, bars, periods = self._built[timeframe]
+            return period_dates[:periods], bars[:periods]
+
+    def frame(self, symbol, timeframe='weekly', bars=None):
+        """One symbol's bars as an OHLCV DataFrame, like ticker.history()"""
+        dates, values = self.bars(timeframe)
+        values = values[:, self.symbols.index(symbol)]
+        present = ~np.isnan(values[:, CLOSE])
+        dates, values = dates[present], values[present]
+        if bars is not None:
+            dates, values = dates[-bars:], values[-bars:]
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name='Date'), columns=list(COLUMNS))